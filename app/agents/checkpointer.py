@@ -0,0 +1,441 @@
+"""
+Persistent agent conversation state in SQLite
+
+Stock checkpointers write the whole conversation again at every step, so a
+thread's storage grows with the square of its length. This store keeps each
+message once, addressed by a digest of its content, and a checkpoint only
+lists the digests it holds: a step writes the messages it added plus a small
+checkpoint row. Only the latest checkpoint of a thread is kept (the agent
+never rewinds), and threads idle for longer than a TTL are deleted by gc().
+
+The tables differ from the stock saver's, so every method of the parent that
+touches storage is overridden here.
+"""
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+import aiosqlite
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+from langgraph.checkpoint.sqlite.utils import search_where
+
+MESSAGES = "messages"
+
+# WAL lets readers run alongside the writer; NORMAL sync is durable across app
+# crashes (not power loss) and skips an fsync per commit. The WAL is folded back
+# every 2000 pages and truncated afterwards so it does not stay at its peak size.
+PRAGMAS = """
+PRAGMA auto_vacuum=INCREMENTAL;
+PRAGMA journal_mode=WAL;
+PRAGMA synchronous=NORMAL;
+PRAGMA wal_autocheckpoint=2000;
+PRAGMA journal_size_limit=67108864;
+PRAGMA busy_timeout=5000;
+PRAGMA temp_store=MEMORY;
+"""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS thread_checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    type TEXT,
+    checkpoint BLOB,
+    metadata BLOB,
+    message_refs TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS thread_messages (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    digest TEXT NOT NULL,
+    type TEXT,
+    value BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, digest)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT,
+    value BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+"""
+
+
+# Tables holding a thread's rows
+THREAD_TABLES = ("thread_checkpoints", "thread_messages", "writes")
+
+
+def message_digest(type_: str, value: bytes) -> str:
+    return hashlib.blake2b(value, digest_size=12, person=type_.encode()[:16]).hexdigest()
+
+
+class ConversationStore(AsyncSqliteSaver):
+    """Checkpointer storing message deltas and only the latest checkpoint of each thread"""
+
+    # Threads whose message digests are remembered, so a run only serializes new messages
+    cached_threads = 256
+
+    def __init__(self, conn: aiosqlite.Connection, path: str = ""):
+        super().__init__(conn)
+        self.path = path
+        # (thread_id, checkpoint_ns) -> {id(message): (message, digest)} of its latest checkpoint
+        self._digests: OrderedDict = OrderedDict()
+        self.puts = 0
+        self.put_seconds = 0.0
+        self.gets = 0
+        self.get_seconds = 0.0
+        self.messages_written = 0
+        self.bytes_written = 0
+        self.threads_collected = 0
+
+    @classmethod
+    async def open(cls, path: str) -> "ConversationStore":
+        """Store on the SQLite file at `path`, created if needed"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = await aiosqlite.connect(path)
+        await conn.executescript(PRAGMAS)
+        store = cls(conn, path)
+        await store.setup()
+        return store
+
+    async def close(self):
+        await self.conn.close()
+
+    async def setup(self) -> None:
+        async with self.lock:
+            if self.is_setup:
+                return
+            await self.conn.executescript(SCHEMA)
+            await self.conn.commit()
+            self.is_setup = True
+
+    def _remember(self, key: Tuple[str, str], messages: List[Any], refs: List[str]):
+        self._digests[key] = {id(message): (message, digest) for message, digest in zip(messages, refs)}
+        self._digests.move_to_end(key)
+        while len(self._digests) > self.cached_threads:
+            self._digests.popitem(last=False)
+
+    def _forget(self, thread_ids: Sequence[str]):
+        for key in [key for key in self._digests if key[0] in thread_ids]:
+            del self._digests[key]
+
+    async def _load_messages(self, cur: aiosqlite.Cursor, thread_id: str, checkpoint_ns: str, refs: List[str]) -> List[Any]:
+        await cur.execute(
+            "SELECT digest, type, value FROM thread_messages WHERE thread_id = ? AND checkpoint_ns = ?",
+            (thread_id, checkpoint_ns)
+        )
+        stored = {digest: (type_, value) for digest, type_, value in await cur.fetchall()}
+        messages = [self.serde.loads_typed(stored[digest]) for digest in refs]
+        self._remember((thread_id, checkpoint_ns), messages, refs)
+        return messages
+
+    async def _tuple(self, cur: aiosqlite.Cursor, row: Tuple) -> CheckpointTuple:
+        thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type_, checkpoint, metadata, refs = row
+        checkpoint = self.serde.loads_typed((type_, checkpoint))
+        if refs is not None:
+            checkpoint["channel_values"][MESSAGES] = await self._load_messages(
+                cur, thread_id, checkpoint_ns, json.loads(refs)
+            )
+
+        await cur.execute(
+            "SELECT task_id, channel, type, value FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id)
+        )
+        pending_writes = [
+            (task_id, channel, self.serde.loads_typed((type_, value)))
+            for task_id, channel, type_, value in await cur.fetchall()
+        ]
+        return CheckpointTuple(
+            {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}},
+            checkpoint,
+            self.jsonplus_serde.loads(metadata) if metadata is not None else {},
+            (
+                {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": parent_checkpoint_id}}
+                if parent_checkpoint_id
+                else None
+            ),
+            pending_writes,
+        )
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        await self.setup()
+        started = time.perf_counter()
+        thread_id = str(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        query = (
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata, message_refs "
+            "FROM thread_checkpoints WHERE thread_id = ? AND checkpoint_ns = ?"
+        )
+        if checkpoint_id := get_checkpoint_id(config):
+            params = (thread_id, checkpoint_ns, checkpoint_id)
+            query += " AND checkpoint_id = ?"
+        else:
+            params = (thread_id, checkpoint_ns)
+            query += " ORDER BY checkpoint_id DESC LIMIT 1"
+
+        async with self.lock, self.conn.cursor() as cur:
+            await cur.execute(query, params)
+            row = await cur.fetchone()
+            result = await self._tuple(cur, row) if row else None
+        self.gets += 1
+        self.get_seconds += time.perf_counter() - started
+        return result
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None
+    ) -> AsyncIterator[CheckpointTuple]:
+        await self.setup()
+        where, params = search_where(config, filter, before)
+        query = (
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata, message_refs "
+            f"FROM thread_checkpoints {where} ORDER BY checkpoint_id DESC"
+        )
+        if limit:
+            query += f" LIMIT {int(limit)}"
+        async with self.lock, self.conn.cursor() as cur:
+            await cur.execute(query, params)
+            rows = await cur.fetchall()
+            tuples = [await self._tuple(cur, row) for row in rows]
+        for checkpoint_tuple in tuples:
+            yield checkpoint_tuple
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions
+    ) -> RunnableConfig:
+        """Store the checkpoint, writing only messages the thread does not hold yet"""
+        await self.setup()
+        started = time.perf_counter()
+        thread_id = str(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        values = checkpoint["channel_values"]
+
+        messages = values.get(MESSAGES)
+        if messages is not None:
+            values = {channel: value for channel, value in values.items() if channel != MESSAGES}
+        type_, serialized_checkpoint = self.serde.dumps_typed({**checkpoint, "channel_values": values})
+        serialized_metadata = self.jsonplus_serde.dumps(get_checkpoint_metadata(config, metadata))
+
+        async with self.lock, self.conn.cursor() as cur:
+            await cur.execute(
+                "SELECT message_refs FROM thread_checkpoints WHERE thread_id = ? AND checkpoint_ns = ?",
+                (thread_id, checkpoint_ns)
+            )
+            held = set()
+            for (stored_refs,) in await cur.fetchall():
+                if stored_refs is not None:
+                    held.update(json.loads(stored_refs))
+
+            # Messages seen at the last read or write of the thread keep their digest
+            # (state updates replace message objects rather than mutate them)
+            refs, rows = None, {}
+            if messages is not None:
+                known = self._digests.get((thread_id, checkpoint_ns), {})
+                refs = []
+                for message in messages:
+                    cached = known.get(id(message))
+                    if cached is not None and cached[0] is message and cached[1] in held:
+                        refs.append(cached[1])
+                        continue
+                    message_type, value = self.serde.dumps_typed(message)
+                    digest = message_digest(message_type, value)
+                    refs.append(digest)
+                    rows[digest] = (message_type, value)
+                self._remember((thread_id, checkpoint_ns), messages, refs)
+
+            new_rows = [
+                (thread_id, checkpoint_ns, digest, message_type, value)
+                for digest, (message_type, value) in rows.items()
+                if digest not in held
+            ]
+            if new_rows:
+                await cur.executemany(
+                    "INSERT OR IGNORE INTO thread_messages (thread_id, checkpoint_ns, digest, type, value) VALUES (?, ?, ?, ?, ?)",
+                    new_rows
+                )
+            await cur.execute(
+                "INSERT OR REPLACE INTO thread_checkpoints (thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata, message_refs, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    thread_id,
+                    checkpoint_ns,
+                    checkpoint["id"],
+                    config["configurable"].get("checkpoint_id"),
+                    type_,
+                    serialized_checkpoint,
+                    serialized_metadata,
+                    json.dumps(refs) if refs is not None else None,
+                    time.time(),
+                )
+            )
+
+            # Older checkpoints (and their pending writes) are never read again
+            await cur.execute(
+                "DELETE FROM thread_checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id != ?",
+                (thread_id, checkpoint_ns, checkpoint["id"])
+            )
+            await cur.execute(
+                "DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id != ?",
+                (thread_id, checkpoint_ns, checkpoint["id"])
+            )
+            # Messages dropped from the history, e.g. by trimming
+            dropped = held - set(refs or ())
+            if dropped:
+                await cur.executemany(
+                    "DELETE FROM thread_messages WHERE thread_id = ? AND checkpoint_ns = ? AND digest = ?",
+                    [(thread_id, checkpoint_ns, digest) for digest in dropped]
+                )
+            await self.conn.commit()
+
+        self.puts += 1
+        self.put_seconds += time.perf_counter() - started
+        self.messages_written += len(new_rows)
+        self.bytes_written += len(serialized_checkpoint) + sum(len(row[4]) for row in new_rows)
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    async def _delete_threads(self, cur: aiosqlite.Cursor, thread_ids: Sequence[str]):
+        params = [(thread_id,) for thread_id in thread_ids]
+        for table in THREAD_TABLES:
+            await cur.executemany(f"DELETE FROM {table} WHERE thread_id = ?", params)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await self.aprune([thread_id], strategy="delete")
+
+    async def aprune(self, thread_ids: Sequence[str], *, strategy: str = "keep_latest") -> None:
+        """Only the latest checkpoint of a thread is ever stored, so "keep_latest"
+        has nothing to do; "delete" removes the threads"""
+        if strategy == "keep_latest":
+            return
+        if strategy != "delete":
+            raise ValueError(f"Unknown prune strategy: {strategy!r}")
+        await self.setup()
+        thread_ids = [str(thread_id) for thread_id in thread_ids]
+        self._forget(thread_ids)
+        async with self.lock, self.conn.cursor() as cur:
+            await self._delete_threads(cur, thread_ids)
+            await self.conn.commit()
+
+    async def acopy_thread(self, source_thread_id: str, target_thread_id: str) -> None:
+        """Replace the target thread with a copy of the source (checkpoint, messages, pending writes)"""
+        await self.setup()
+        source, target = str(source_thread_id), str(target_thread_id)
+        self._forget([target])
+        async with self.lock, self.conn.cursor() as cur:
+            await self._delete_threads(cur, [target])
+            # The copy is a new conversation: its TTL starts now
+            await cur.execute(
+                "INSERT INTO thread_checkpoints (thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata, message_refs, updated_at) "
+                "SELECT ?, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata, message_refs, ? "
+                "FROM thread_checkpoints WHERE thread_id = ?",
+                (target, time.time(), source)
+            )
+            await cur.execute(
+                "INSERT INTO thread_messages (thread_id, checkpoint_ns, digest, type, value) "
+                "SELECT ?, checkpoint_ns, digest, type, value FROM thread_messages WHERE thread_id = ?",
+                (target, source)
+            )
+            await cur.execute(
+                "INSERT INTO writes (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value) "
+                "SELECT ?, checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value FROM writes WHERE thread_id = ?",
+                (target, source)
+            )
+            await self.conn.commit()
+
+    async def adelete_for_runs(self, run_ids: Sequence[str]) -> None:
+        """Delete the checkpoints written by the given runs
+
+        A thread keeps only its latest checkpoint, so this removes the state of
+        every (thread, namespace) whose last step belonged to one of the runs.
+        """
+        await self.setup()
+        run_ids = {str(run_id) for run_id in run_ids}
+        async with self.lock, self.conn.cursor() as cur:
+            await cur.execute("SELECT thread_id, checkpoint_ns, metadata FROM thread_checkpoints")
+            matched = [
+                (thread_id, checkpoint_ns)
+                for thread_id, checkpoint_ns, metadata in await cur.fetchall()
+                if metadata is not None and str(self.jsonplus_serde.loads(metadata).get("run_id")) in run_ids
+            ]
+            if not matched:
+                return
+            for table in THREAD_TABLES:
+                await cur.executemany(f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ?", matched)
+            await self.conn.commit()
+        for key in matched:
+            self._digests.pop(key, None)
+
+    async def gc(self, ttl: float) -> int:
+        """Delete threads without a checkpoint in the last `ttl` seconds; returns how many"""
+        await self.setup()
+        async with self.lock, self.conn.cursor() as cur:
+            await cur.execute(
+                "SELECT thread_id FROM thread_checkpoints GROUP BY thread_id HAVING MAX(updated_at) < ?",
+                (time.time() - ttl,)
+            )
+            thread_ids = [thread_id for (thread_id,) in await cur.fetchall()]
+            if thread_ids:
+                self._forget(set(thread_ids))
+                await self._delete_threads(cur, thread_ids)
+                await self.conn.commit()
+                # Hand freed pages back to the filesystem and reset the WAL
+                await cur.execute("PRAGMA incremental_vacuum")
+                await cur.fetchall()  # frees one page per row stepped
+                await cur.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self.threads_collected += len(thread_ids)
+        return len(thread_ids)
+
+    def size_bytes(self) -> int:
+        """Database plus WAL size on disk"""
+        return sum(
+            os.path.getsize(path)
+            for path in (self.path, f"{self.path}-wal")
+            if self.path and os.path.exists(path)
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "size_bytes": self.size_bytes(),
+            "puts": self.puts,
+            "avg_put_ms": round(self.put_seconds / self.puts * 1000, 3) if self.puts else None,
+            "gets": self.gets,
+            "avg_get_ms": round(self.get_seconds / self.gets * 1000, 3) if self.gets else None,
+            "messages_written": self.messages_written,
+            "bytes_written": self.bytes_written,
+            "threads_collected": self.threads_collected,
+        }
@@ -1,73 +1,198 @@
 """
 LangGraph Agent with MCP Integration for Expense Tracker
 """
-from typing import Dict, Any, List
+import asyncio
+import time
+from contextlib import AsyncExitStack
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+import httpx
+from fastmcp import Client
 from langchain_openai import ChatOpenAI
 from langchain_mcp_adapters.client import MultiServerMCPClient
-from langchain.agents import create_react_agent
+from langchain_mcp_adapters.tools import load_mcp_tools
+from langchain.agents import create_agent
+from langchain.agents.middleware import AgentMiddleware
+from langgraph.types import Checkpointer
+from app.agents.fake_model import FAKE_MODEL, FakeExpenseChatModel
+from app.agents.limits import AgentBusy
+from app.core.logging import get_logger
+from app.core.metrics import observe_agent_turn
+from app.agents.tool_cache import tool_cache
+from app.mcp import mcp
 from config import settings
 
+SYSTEM_PROMPT = (
+    "You are an assistant for a personal expense tracker. Use the tools to record, "
+    "list, search and summarize expenses; never invent data the tools did not return."
+)
+
+def final_text(response: Dict[str, Any]) -> str:
+    """Text of the last message of an agent run"""
+    messages = response.get("messages") if isinstance(response, dict) else None
+    if not messages:
+        return ""
+    return str(messages[-1].text)
+
+logger = get_logger(__name__)
+
 class ExpenseTrackerAgent:
     """LangGraph agent that uses MCP tools for expense tracking"""
-    
-    def __init__(self, openai_api_key: str = None):
+
+    def __init__(
+        self,
+        http_client: Optional[httpx.AsyncClient] = None,
+        middleware: Sequence[AgentMiddleware] = (),
+        checkpointer: Optional[Checkpointer] = None,
+        openai_api_key: str = None
+    ):
         self.openai_api_key = openai_api_key or settings.openai_api_key
-        self.model = ChatOpenAI(
-            model="gpt-4o-mini",
-            api_key=self.openai_api_key,
-            temperature=0.1
-        )
+        if settings.agent_model == FAKE_MODEL:
+            self.model = FakeExpenseChatModel()
+        else:
+            # Model calls reuse the caller's connection pool instead of one per client
+            self.model = ChatOpenAI(
+                model=settings.agent_model,
+                api_key=self.openai_api_key,
+                temperature=settings.agent_temperature,
+                timeout=settings.agent_request_timeout,
+                max_retries=settings.agent_max_retries,
+                streaming=True,
+                http_async_client=http_client
+            )
+        self.middleware = list(middleware)
+        self.checkpointer = checkpointer
         self.agent = None
         self.tools = None
-        
-    async def initialize(self):
-        """Initialize the MCP client and create the agent"""
-        # Configure MCP client to connect to your FastAPI MCP server
-        client = MultiServerMCPClient(
-            {
-                "expense_tracker": {
-                    "transport": "streamable_http",
-                    "url": "http://localhost:8000/mcp",  # Your FastAPI MCP endpoint
-                    "headers": {
-                        "Content-Type": "application/json"
+        self._mcp_stack = AsyncExitStack()
+
+    async def load_tools(self) -> List[Any]:
+        """MCP tools on one long-lived session: in-process unless settings.mcp_server_url is set"""
+        if settings.mcp_server_url:
+            client = MultiServerMCPClient(
+                {
+                    "expense_tracker": {
+                        "transport": "streamable_http",
+                        "url": settings.mcp_server_url,
                     }
                 }
-            }
+            )
+            # Without a session every tool call would reconnect and re-initialize
+            session = await self._mcp_stack.enter_async_context(client.session("expense_tracker"))
+            return await load_mcp_tools(session)
+
+        # One in-memory session to the server in this process, kept for the agent's lifetime
+        client = await self._mcp_stack.enter_async_context(Client(mcp))
+        return await load_mcp_tools(client.session)
+
+    async def initialize(self):
+        """Initialize the MCP client and create the agent"""
+        # Get tools from MCP server; read-only ones answer repeated calls from the cache
+        self.tools = await self.load_tools()
+        if settings.agent_tool_cache_enabled:
+            self.tools = tool_cache.wrap(self.tools)
+
+        # Conversation state lives in the checkpointer, keyed by thread id
+        self.agent = create_agent(
+            self.model,
+            self.tools,
+            system_prompt=SYSTEM_PROMPT,
+            middleware=self.middleware,
+            checkpointer=self.checkpointer
         )
-        
-        # Get tools from MCP server
-        self.tools = await client.get_tools()
-        
-        # Create LangChain agent
-        self.agent = create_react_agent(self.model, self.tools)
-        
+
         return self.agent
-    
-    async def chat(self, message: str) -> str:
-        """Process a user message and return AI response"""
+
+    async def chat(self, message: str, thread_id: str) -> str:
+        """Process a user message in a conversation and return AI response"""
         if not self.agent:
             await self.initialize()
-        
+
         try:
-            # Process the message with LangChain agent
-            response = await self.agent.ainvoke({"input": message})
-            
-            # Extract the output
-            if isinstance(response, dict) and "output" in response:
-                return response["output"]
-            elif isinstance(response, str):
-                return response
-            
-            return "I'm sorry, I couldn't process your request properly."
-            
+            response = await self.agent.ainvoke(
+                {"messages": [{"role": "user", "content": message}]},
+                {"configurable": {"thread_id": thread_id}}
+            )
+            return final_text(response) or "I'm sorry, I couldn't process your request properly."
+
+        except AgentBusy:
+            raise
         except Exception as e:
             return f"Error processing request: {str(e)}"
-    
+
+    async def stream(self, message: str, thread_id: str) -> AsyncIterator[Dict[str, Any]]:
+        """Agent events as they happen: answer tokens, tool calls, then the final answer
+
+        Cancelling the consumer cancels the in-flight model or tool call.
+        """
+        if not self.agent:
+            await self.initialize()
+
+        started = time.perf_counter()
+        first_token: Optional[float] = None
+        tool_started: Dict[str, float] = {}
+        response, outcome = "", "error"
+        try:
+            async for event in self.agent.astream_events(
+                {"messages": [{"role": "user", "content": message}]},
+                {"configurable": {"thread_id": thread_id}},
+                version="v2"
+            ):
+                kind = event["event"]
+                if kind == "on_chat_model_stream":
+                    text = str(event["data"]["chunk"].text)
+                    if not text:
+                        continue  # tool-call deltas
+                    if first_token is None:
+                        first_token = time.perf_counter() - started
+                    yield {"event": "token", "data": {"text": text}}
+                elif kind == "on_tool_start":
+                    tool_started[event["run_id"]] = time.perf_counter()
+                    yield {"event": "tool_start", "data": {"name": event["name"], "input": event["data"].get("input")}}
+                elif kind in ("on_tool_end", "on_tool_error"):
+                    elapsed = time.perf_counter() - tool_started.pop(event["run_id"], started)
+                    data = {"name": event["name"], "duration_ms": round(elapsed * 1000, 1)}
+                    if kind == "on_tool_error":
+                        data["error"] = str(event["data"].get("error"))
+                    yield {"event": "tool_end", "data": data}
+                elif kind == "on_chain_end" and not event["parent_ids"]:
+                    # End of the whole graph run
+                    response = final_text(event["data"].get("output"))
+
+            outcome = "completed"
+            yield {
+                "event": "done",
+                "data": {
+                    "response": response,
+                    "ttft_ms": round(first_token * 1000, 1) if first_token is not None else None,
+                    "total_ms": round((time.perf_counter() - started) * 1000, 1),
+                },
+            }
+        except (asyncio.CancelledError, GeneratorExit):
+            outcome = "cancelled"
+            raise
+        except AgentBusy as e:
+            yield {"event": "error", "data": {"message": str(e), "retry_after": e.retry_after}}
+        except Exception as e:
+            yield {"event": "error", "data": {"message": f"Error processing request: {str(e)}"}}
+        finally:
+            observe_agent_turn(outcome, first_token)
+            logger.info(
+                "agent_turn",
+                thread_id=thread_id,
+                outcome=outcome,
+                ttft_ms=round(first_token * 1000, 1) if first_token is not None else None,
+                total_ms=round((time.perf_counter() - started) * 1000, 1),
+            )
+
+    async def close(self):
+        """Close the MCP session"""
+        await self._mcp_stack.aclose()
+
     async def get_available_tools(self) -> List[Dict[str, Any]]:
         """Get list of available MCP tools"""
         if not self.tools:
             await self.initialize()
-        
+
         return [
             {
                 "name": tool.name,
@@ -76,14 +201,3 @@ class ExpenseTrackerAgent:
             }
             for tool in self.tools
         ]
-
-# Global agent instance
-agent_instance = None
-
-async def get_agent():
-    """Get or create the agent instance"""
-    global agent_instance
-    if agent_instance is None:
-        agent_instance = ExpenseTrackerAgent()
-        await agent_instance.initialize()
-    return agent_instance
@@ -0,0 +1,75 @@
+"""
+Offline stand-in for the chat model (AGENT_MODEL=fake)
+
+Behaves like a tool-calling model without a provider: the first turn after a
+user message calls one expense tool, the next streams a short answer word by
+word, so the agent loop, tool calls and token streaming can be exercised
+without an API key.
+"""
+import asyncio
+import json
+import uuid
+from datetime import date
+from typing import Any, AsyncIterator, List, Optional
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+FAKE_MODEL = "fake"
+
+
+def plan(messages: List[BaseMessage]) -> AIMessage:
+    """Tool call for a fresh user message, or an answer built from the tool result"""
+    last = messages[-1]
+    if last.type == "tool":
+        text = str(last.content)
+        preview = text if len(text) <= 200 else f"{text[:200]}..."
+        return AIMessage(content=f"Here is what the {last.name} tool returned: {preview}")
+
+    question = str(last.content).lower()
+    if any(word in question for word in ("summary", "summarize", "breakdown", "total")):
+        today = date.today()
+        call = {"name": "summarize_expenses", "args": {"start_date": str(today.replace(day=1)), "end_date": str(today)}}
+    else:
+        call = {"name": "list_expenses", "args": {"size": 5}}
+    return AIMessage(content="", tool_calls=[{**call, "id": f"call_{uuid.uuid4().hex[:12]}"}])
+
+
+class FakeExpenseChatModel(BaseChatModel):
+    """Deterministic tool-calling chat model that streams its answers"""
+
+    token_delay: float = 0.02  # seconds between streamed words
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-expense"
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> "FakeExpenseChatModel":
+        return self
+
+    def _generate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=plan(messages))])
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager=None,
+        **kwargs: Any
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        message = plan(messages)
+        if message.tool_calls:
+            call = message.tool_calls[0]
+            yield ChatGenerationChunk(message=AIMessageChunk(content="", tool_call_chunks=[{
+                "name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": 0,
+            }]))
+            return
+
+        words = message.content.split(" ")
+        for index, word in enumerate(words):
+            await asyncio.sleep(self.token_delay)
+            token = word if index == len(words) - 1 else f"{word} "
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
@@ -0,0 +1,114 @@
+"""
+Keeping a conversation's stored history valid and within its token budget
+"""
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from langchain.agents.middleware import AgentMiddleware
+from langchain_core.messages import AnyMessage, RemoveMessage, ToolMessage
+from langchain_core.messages.utils import count_tokens_approximately, trim_messages
+from langgraph.graph.message import REMOVE_ALL_MESSAGES
+
+
+class HistoryBudget(AgentMiddleware):
+    """Drops the oldest turns once a conversation passes `max_tokens`
+
+    Runs once per user message, before the agent starts. Earlier turns are
+    dropped whole, oldest first, until the history fits in `target_tokens`;
+    the current turn is never cut, so tool calls keep their results. Trimming
+    below the budget leaves room for several turns before the next trim, and
+    the trimmed history is what the checkpointer stores.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int,
+        target_tokens: Optional[int] = None,
+        token_counter: Callable[[Iterable[AnyMessage]], int] = count_tokens_approximately
+    ):
+        super().__init__()
+        self.max_tokens = max_tokens
+        self.target_tokens = target_tokens if target_tokens is not None else max_tokens // 2
+        self.token_counter = token_counter
+        self.trims = 0
+        self.messages_dropped = 0
+
+    def trim(self, messages: List[AnyMessage]) -> Optional[List[AnyMessage]]:
+        """Messages to keep, or None while the history is within budget"""
+        if self.token_counter(messages) <= self.max_tokens:
+            return None
+
+        current = next((i for i in range(len(messages) - 1, -1, -1) if messages[i].type == "human"), 0)
+        earlier, turn = messages[:current], messages[current:]
+        budget = self.target_tokens - self.token_counter(turn)
+        kept = trim_messages(
+            earlier,
+            max_tokens=budget,
+            token_counter=self.token_counter,
+            strategy="last",
+            start_on="human",
+        ) if budget > 0 else []
+        if len(kept) == len(earlier):
+            return None
+        return kept + turn
+
+    def before_agent(self, state: Dict[str, Any], runtime) -> Optional[Dict[str, Any]]:
+        messages = state["messages"]
+        kept = self.trim(messages)
+        if kept is None:
+            return None
+        self.trims += 1
+        self.messages_dropped += len(messages) - len(kept)
+        return {"messages": [RemoveMessage(id=REMOVE_ALL_MESSAGES), *kept]}
+
+    async def abefore_agent(self, state: Dict[str, Any], runtime) -> Optional[Dict[str, Any]]:
+        return self.before_agent(state, runtime)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_tokens": self.max_tokens,
+            "target_tokens": self.target_tokens,
+            "trims": self.trims,
+            "messages_dropped": self.messages_dropped,
+        }
+
+
+class RepairToolCalls(AgentMiddleware):
+    """Answers tool calls that an interrupted run left without a result
+
+    A run cancelled between the model's tool call and the tool's result (the
+    client disconnected) leaves an AI message with `tool_calls` and no tool
+    message in the checkpoint, and providers reject every later turn of such
+    a history. Before the agent starts, each missing result is filled in with
+    an error tool message right after its call.
+    """
+
+    CANCELLED = "Tool call cancelled: the request ended before the tool returned."
+
+    def __init__(self):
+        super().__init__()
+        self.repaired = 0
+
+    def repair(self, messages: List[AnyMessage]) -> Optional[List[AnyMessage]]:
+        """Messages with every tool call answered, or None if none is missing"""
+        answered = {message.tool_call_id for message in messages if message.type == "tool"}
+        if all(call["id"] in answered for message in messages if message.type == "ai" for call in message.tool_calls):
+            return None
+
+        repaired = []
+        for message in messages:
+            repaired.append(message)
+            if message.type != "ai":
+                continue
+            for call in message.tool_calls:
+                if call["id"] not in answered:
+                    repaired.append(ToolMessage(self.CANCELLED, tool_call_id=call["id"], name=call["name"], status="error"))
+                    self.repaired += 1
+        return repaired
+
+    def before_agent(self, state: Dict[str, Any], runtime) -> Optional[Dict[str, Any]]:
+        repaired = self.repair(state["messages"])
+        if repaired is None:
+            return None
+        return {"messages": [RemoveMessage(id=REMOVE_ALL_MESSAGES), *repaired]}
+
+    async def abefore_agent(self, state: Dict[str, Any], runtime) -> Optional[Dict[str, Any]]:
+        return self.before_agent(state, runtime)
@@ -0,0 +1,64 @@
+"""
+Concurrency limit for model calls across all conversations of this process
+"""
+import asyncio
+from langchain.agents.middleware import AgentMiddleware
+
+
+class AgentBusy(Exception):
+    """Too many model calls are already waiting for the provider"""
+
+    def __init__(self, retry_after: float):
+        super().__init__("The assistant is busy, try again shortly")
+        self.retry_after = retry_after
+
+
+class LLMConcurrencyLimit(AgentMiddleware):
+    """Runs at most `max_concurrency` model calls at once; the rest wait in a bounded queue
+
+    The agent loop calls the model several times per message, so the limit is
+    applied to each model call rather than to whole conversations: a run
+    waiting on a tool does not hold a slot.
+    """
+
+    def __init__(self, max_concurrency: int, max_waiting: int, wait_timeout: float):
+        super().__init__()
+        self.max_concurrency = max_concurrency
+        self.max_waiting = max_waiting
+        self.wait_timeout = wait_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.waiting = 0
+        self.running = 0
+        self.rejected = 0
+
+    def check_capacity(self):
+        """Refuse new conversation turns while the queue is full"""
+        if self.waiting >= self.max_waiting:
+            self.rejected += 1
+            raise AgentBusy(self.wait_timeout)
+
+    async def awrap_model_call(self, request, handler):
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.wait_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise AgentBusy(self.wait_timeout)
+        finally:
+            self.waiting -= 1
+
+        self.running += 1
+        try:
+            return await handler(request)
+        finally:
+            self.running -= 1
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "running": self.running,
+            "waiting": self.waiting,
+            "max_waiting": self.max_waiting,
+            "rejected": self.rejected,
+        }
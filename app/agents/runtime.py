@@ -0,0 +1,132 @@
+"""
+Process-wide agent runtime
+
+The agent graph, its tools and the HTTP connection pool to the model provider
+are built once per process (at startup, or by the first request if that
+failed) and shared by every conversation. Conversations are isolated by
+thread id in the checkpointer (a SQLite file unless AGENT_MEMORY_PATH is
+empty), and model calls from all of them share one concurrency limit.
+"""
+import asyncio
+import uuid
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+import httpx
+from langgraph.checkpoint.memory import InMemorySaver
+from app.agents.checkpointer import ConversationStore
+from app.agents.expense_agent import ExpenseTrackerAgent
+from app.agents.history import HistoryBudget, RepairToolCalls
+from app.agents.limits import LLMConcurrencyLimit
+from config import settings
+
+
+class AgentRuntime:
+    """One ExpenseTrackerAgent per process, initialized exactly once"""
+
+    def __init__(self):
+        self._lock = asyncio.Lock()
+        self._agent: Optional[ExpenseTrackerAgent] = None
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self._memory: Optional[ConversationStore] = None
+        self._gc_task: Optional[asyncio.Task] = None
+        # Repair runs first, so the budget only ever trims a consistent history
+        self.repair = RepairToolCalls()
+        self.history = HistoryBudget(settings.agent_history_max_tokens, settings.agent_history_target_tokens)
+        self.llm_limit = LLMConcurrencyLimit(
+            settings.agent_max_concurrency,
+            settings.agent_queue_size,
+            settings.agent_queue_timeout
+        )
+
+    async def start(self) -> ExpenseTrackerAgent:
+        """The shared agent, building it on first use; concurrent callers wait for one build"""
+        if self._agent is not None:
+            return self._agent
+        async with self._lock:
+            if self._agent is None:
+                http_client = httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=settings.agent_http_max_connections,
+                        max_keepalive_connections=settings.agent_http_max_connections
+                    ),
+                    timeout=settings.agent_request_timeout
+                )
+                memory = agent = None
+                try:
+                    if settings.agent_memory_path:
+                        memory = await ConversationStore.open(settings.agent_memory_path)
+                    agent = ExpenseTrackerAgent(
+                        http_client,
+                        [self.repair, self.history, self.llm_limit],
+                        memory or InMemorySaver()
+                    )
+                    await agent.initialize()
+                except BaseException:
+                    if agent is not None:
+                        await agent.close()
+                    if memory is not None:
+                        await memory.close()
+                    await http_client.aclose()
+                    raise
+                self._http_client, self._memory, self._agent = http_client, memory, agent
+                if memory is not None:
+                    self._gc_task = asyncio.create_task(self._collect_expired())
+        return self._agent
+
+    async def _collect_expired(self):
+        while True:
+            await asyncio.sleep(settings.agent_memory_gc_interval)
+            try:
+                await self._memory.gc(settings.agent_memory_ttl)
+            except Exception as e:
+                print(f"⚠️ Conversation cleanup failed: {e}")
+
+    async def stop(self):
+        async with self._lock:
+            if self._gc_task is not None:
+                self._gc_task.cancel()
+                try:
+                    await self._gc_task
+                except asyncio.CancelledError:
+                    pass
+                self._gc_task = None
+            if self._agent is not None:
+                await self._agent.close()
+                self._agent = None
+            if self._http_client is not None:
+                await self._http_client.aclose()
+                self._http_client = None
+            if self._memory is not None:
+                await self._memory.close()
+                self._memory = None
+
+    async def chat(self, message: str, thread_id: Optional[str] = None) -> Dict[str, str]:
+        """Answer one message; without a thread id a new conversation is started"""
+        agent = await self.start()
+        self.llm_limit.check_capacity()
+        thread_id = thread_id or uuid.uuid4().hex
+        return {"thread_id": thread_id, "response": await agent.chat(message, thread_id)}
+
+    async def open_stream(
+        self,
+        message: str,
+        thread_id: Optional[str] = None
+    ) -> Tuple[str, AsyncIterator[Dict[str, Any]]]:
+        """Thread id and event stream of one message; capacity is checked before streaming starts"""
+        agent = await self.start()
+        self.llm_limit.check_capacity()
+        thread_id = thread_id or uuid.uuid4().hex
+        return thread_id, agent.stream(message, thread_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "initialized": self._agent is not None,
+            "llm": self.llm_limit.stats(),
+            "history": {**self.history.stats(), "tool_calls_repaired": self.repair.repaired},
+            "memory": self._memory.stats() if self._memory is not None else None,
+        }
+
+agent_runtime = AgentRuntime()
+
+async def get_agent() -> ExpenseTrackerAgent:
+    """Get the process-wide agent instance"""
+    return await agent_runtime.start()
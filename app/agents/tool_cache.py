@@ -0,0 +1,121 @@
+"""
+Result cache for the agent's MCP tools
+
+Agents repeat the same read calls (summaries, pages) with identical arguments
+within a conversation and across users. Results of read-only tools are cached
+in Redis under the normalized call and the global data version, which every
+expense write bumps (REST routes and the add_expense tool alike), so a write
+makes all cached results unreachable without tracking which ones it affects.
+Identical calls in flight share one execution. The MCP server may answer from a
+replica in another process, so results are not cached while a write is recent.
+"""
+import hashlib
+import json
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+from langchain_core.tools import BaseTool, StructuredTool
+from app.db.redis_cache import redis_cache, replica_read, get_agent_tool_key, get_global_version_key
+from config import settings
+
+
+def normalize_arguments(arguments: Dict[str, Any], schema: Optional[Dict[str, Any]] = None) -> str:
+    """Canonical JSON of a call: sorted keys, trimmed strings, omitted and default values dropped"""
+    defaults = {
+        name: prop["default"]
+        for name, prop in ((schema or {}).get("properties") or {}).items()
+        if "default" in prop
+    }
+    normalized = {}
+    for name, value in arguments.items():
+        if isinstance(value, str):
+            value = value.strip()
+        if value is None or (name in defaults and value == defaults[name]):
+            continue
+        normalized[name] = value
+    return json.dumps(normalized, sort_keys=True, separators=(",", ":"), default=str)
+
+
+class ToolResultCache:
+    """Wraps read-only LangChain tools with a version-keyed, single-flight Redis cache"""
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        self._stats: Dict[str, Dict[str, float]] = defaultdict(
+            lambda: {"calls": 0, "executed": 0, "tool_seconds": 0.0, "cached_seconds": 0.0}
+        )
+
+    def cacheable(self, tool: BaseTool) -> bool:
+        """Tools the MCP server declares read-only (readOnlyHint annotation)"""
+        return bool((tool.metadata or {}).get("readOnlyHint"))
+
+    def wrap(self, tools: List[BaseTool]) -> List[BaseTool]:
+        """The tools, with read-only ones answering from the cache"""
+        return [self._wrap(tool) if self.cacheable(tool) else tool for tool in tools]
+
+    def _wrap(self, tool: StructuredTool) -> StructuredTool:
+        call_tool = tool.coroutine
+        schema = tool.args_schema if isinstance(tool.args_schema, dict) else None
+
+        async def cached_call(**arguments):
+            stats = self._stats[tool.name]
+            stats["calls"] += 1
+            started = time.perf_counter()
+            executed = False
+
+            async def load():
+                nonlocal executed
+                executed = True
+                # MCP results are (text content, non-text artifacts); only text is returned by these tools
+                content, _ = await call_tool(**arguments)
+                # The server's session routing isn't visible here: treat every result as a
+                # replica read so the cache skips the fill while a write may not have replicated
+                replica_read.set(True)
+                return content
+
+            versions = await redis_cache.get_versions([get_global_version_key()])
+            if versions is None:
+                # No version, no safe key: call through
+                content = await load()
+            else:
+                digest = hashlib.sha1(normalize_arguments(arguments, schema).encode()).hexdigest()
+                key = get_agent_tool_key(tool.name, str(versions[0]), digest)
+                content = await redis_cache.get_or_set(key, load, self.ttl)
+
+            elapsed = time.perf_counter() - started
+            if executed:
+                stats["executed"] += 1
+                stats["tool_seconds"] += elapsed
+            else:
+                stats["cached_seconds"] += elapsed
+            return content, None
+
+        return StructuredTool(
+            name=tool.name,
+            description=tool.description,
+            args_schema=tool.args_schema,
+            coroutine=cached_call,
+            response_format=tool.response_format,
+            metadata=tool.metadata,
+        )
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per-tool hit rate and the latency saved by answering from the cache"""
+        report = {}
+        for name, stats in self._stats.items():
+            calls, executed = stats["calls"], stats["executed"]
+            served = calls - executed
+            tool_ms = stats["tool_seconds"] * 1000 / executed if executed else None
+            cached_ms = stats["cached_seconds"] * 1000 / served if served else None
+            report[name] = {
+                "calls": calls,
+                "executed": executed,
+                "hit_rate": round(served / calls, 4) if calls else 0.0,
+                "avg_tool_ms": round(tool_ms, 2) if tool_ms is not None else None,
+                "avg_cached_ms": round(cached_ms, 2) if cached_ms is not None else None,
+                # Served calls would each have cost an average execution
+                "saved_ms": round(served * (tool_ms - cached_ms), 2) if tool_ms is not None and served else 0.0,
+            }
+        return report
+
+tool_cache = ToolResultCache(settings.agent_tool_cache_ttl)
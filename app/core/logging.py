@@ -1,46 +1,171 @@
 """
 Structured logging configuration using structlog
 """
+import atexit
 import logging
+import logging.handlers
+import queue
+import random
+import threading
+import time
 import structlog
-from typing import Any
+from typing import Any, Optional, TextIO
 import sys
 
 
-def setup_logging(log_level: str = "INFO", json_logs: bool = True) -> None:
+class BatchedLogWriter(threading.Thread):
+    """
+    Background thread draining the log queue and writing records in batches
+
+    The event loop only builds the event dict and puts the record on the queue;
+    rendering to JSON/text and the (blocking) stream write happen here, one
+    write per batch. The queue is bounded: when the writer falls behind,
+    new records are dropped and counted instead of growing memory.
+    """
+
+    _STOP = object()
+
+    def __init__(
+        self,
+        log_queue: queue.Queue,
+        stream: TextIO,
+        formatter: logging.Formatter,
+        batch_size: int = 256,
+        flush_interval: float = 0.5
+    ):
+        super().__init__(name="log-writer", daemon=True)
+        self.queue = log_queue
+        self.stream = stream
+        self.formatter = formatter
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.dropped = 0
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            # Wait up to flush_interval for the batch to fill, but no longer than it takes
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and batch[-1] is not self._STOP:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stopping = any(item is self._STOP for item in batch)
+            records = [item for item in batch if item is not self._STOP]
+            if records:
+                self._write(records)
+            if stopping:
+                return
+
+    def _write(self, records):
+        try:
+            self.stream.write("".join(self.formatter.format(record) + "\n" for record in records))
+            self.stream.flush()
+            self.written += len(records)
+        except Exception:
+            # Never let a broken stream kill the writer
+            pass
+
+    def stop(self, timeout: float = 5.0):
+        """Flush queued records and stop the thread"""
+        try:
+            self.queue.put(self._STOP, timeout=timeout)
+        except queue.Full:
+            return
+        self.join(timeout)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves formatting to the writer thread and never blocks"""
+
+    def __init__(self, writer: BatchedLogWriter):
+        super().__init__(writer.queue)
+        self.writer = writer
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The stock prepare() formats and copies the record on the caller's thread
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.writer.dropped += 1
+
+
+_writer: Optional[BatchedLogWriter] = None
+
+
+def setup_logging(
+    log_level: str = "INFO",
+    json_logs: bool = True,
+    stream: Optional[TextIO] = None,
+    batch_size: int = 256,
+    flush_interval: float = 0.5,
+    queue_size: int = 10000
+) -> None:
     """
     Setup structured logging with structlog
-    
+
     Args:
         log_level: Logging level (DEBUG, INFO, WARNING, ERROR, CRITICAL)
         json_logs: Whether to output logs in JSON format
+        stream: Destination stream (defaults to stdout)
+        batch_size: Maximum records written per batch by the writer thread
+        flush_interval: Seconds the writer waits to fill a batch
+        queue_size: Records waiting for the writer; further records are dropped
     """
-    # Configure standard library logging
-    logging.basicConfig(
-        format="%(message)s",
-        stream=sys.stdout,
-        level=getattr(logging, log_level.upper()),
-    )
-    
-    # Configure processors
+    global _writer
+
+    # Processors that need the caller's context run on the event loop
     processors = [
         structlog.contextvars.merge_contextvars,
         structlog.stdlib.filter_by_level,
         structlog.processors.TimeStamper(fmt="iso"),
-        structlog.stdlib.add_logger_name,
         structlog.stdlib.add_log_level,
+        # exc_info=True must be resolved on the thread handling the exception
         structlog.processors.StackInfoRenderer(),
         structlog.processors.format_exc_info,
-        structlog.processors.UnicodeDecoder(),
+        structlog.stdlib.ProcessorFormatter.wrap_for_formatter,
     ]
-    
+
     if json_logs:
         # JSON output for production
-        processors.append(structlog.processors.JSONRenderer())
+        renderer = structlog.processors.JSONRenderer()
     else:
         # Pretty console output for development
-        processors.append(structlog.dev.ConsoleRenderer())
-    
+        renderer = structlog.dev.ConsoleRenderer()
+
+    # Everything else, including rendering, runs on the writer thread
+    formatter = structlog.stdlib.ProcessorFormatter(
+        foreign_pre_chain=[
+            structlog.stdlib.add_log_level,
+            structlog.processors.TimeStamper(fmt="iso"),
+        ],
+        processors=[
+            structlog.stdlib.add_logger_name,
+            structlog.processors.format_exc_info,
+            structlog.processors.UnicodeDecoder(),
+            structlog.stdlib.ProcessorFormatter.remove_processors_meta,
+            renderer,
+        ],
+    )
+
+    # Stdlib logging only enqueues; the writer thread owns the stream
+    shutdown_logging()
+    log_queue = queue.Queue(maxsize=queue_size)
+    _writer = BatchedLogWriter(log_queue, stream or sys.stdout, formatter, batch_size, flush_interval)
+    _writer.start()
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(DeferredQueueHandler(_writer))
+    root.setLevel(getattr(logging, log_level.upper()))
+
     structlog.configure(
         processors=processors,
         wrapper_class=structlog.stdlib.BoundLogger,
@@ -50,13 +175,23 @@ def setup_logging(log_level: str = "INFO", json_logs: bool = True) -> None:
     )
 
 
+def shutdown_logging() -> None:
+    """Flush and stop the background log writer"""
+    global _writer
+    if _writer is not None:
+        _writer.stop()
+        _writer = None
+
+atexit.register(shutdown_logging)
+
+
 def get_logger(name: str = None) -> Any:
     """
     Get a structured logger instance
-    
+
     Args:
         name: Logger name (defaults to calling module)
-    
+
     Returns:
         structlog logger instance
     """
@@ -65,38 +200,35 @@ def get_logger(name: str = None) -> Any:
 
 # Logging middleware for FastAPI
 class LoggingMiddleware:
-    """Middleware to log all requests and responses"""
-    
-    def __init__(self, app):
+    """
+    Access log: one record per request with status, duration and response size
+
+    Successful (2xx/3xx) requests faster than `slow_ms` are sampled at
+    `sample_rate`; errors, slow requests and exceptions are always logged.
+    """
+
+    def __init__(self, app, sample_rate: float = 1.0, slow_ms: float = 1000.0):
         self.app = app
         self.logger = get_logger("api")
-    
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+
     async def __call__(self, scope, receive, send):
         if scope["type"] != "http":
             return await self.app(scope, receive, send)
-        
-        request_id = scope.get("headers", {}).get(b"x-request-id", b"").decode()
-        
-        # Log request
-        self.logger.info(
-            "request_started",
-            method=scope["method"],
-            path=scope["path"],
-            request_id=request_id,
-        )
-        
+
+        started = time.perf_counter()
+        status_code = 500
+        response_bytes = 0
+
         async def send_wrapper(message):
+            nonlocal status_code, response_bytes
             if message["type"] == "http.response.start":
-                # Log response
-                self.logger.info(
-                    "request_completed",
-                    method=scope["method"],
-                    path=scope["path"],
-                    status_code=message["status"],
-                    request_id=request_id,
-                )
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
             await send(message)
-        
+
         try:
             await self.app(scope, receive, send_wrapper)
         except Exception as e:
@@ -105,7 +237,36 @@ class LoggingMiddleware:
                 method=scope["method"],
                 path=scope["path"],
                 error=str(e),
-                request_id=request_id,
+                duration_ms=round((time.perf_counter() - started) * 1000, 3),
+                request_id=_request_id(scope),
             )
             raise
 
+        duration_ms = (time.perf_counter() - started) * 1000
+        if status_code < 400 and duration_ms < self.slow_ms:
+            if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+                return
+            sample_rate = self.sample_rate
+        else:
+            sample_rate = 1.0
+
+        route = scope.get("route")
+        self.logger.info(
+            "request_completed",
+            method=scope["method"],
+            path=scope["path"],
+            route=getattr(route, "path", None),
+            status_code=status_code,
+            duration_ms=round(duration_ms, 3),
+            response_bytes=response_bytes,
+            request_id=_request_id(scope),
+            sample_rate=sample_rate,
+        )
+
+
+def _request_id(scope) -> str:
+    """x-request-id from the ASGI headers (a list of (name, value) byte pairs)"""
+    for name, value in scope.get("headers", ()):
+        if name == b"x-request-id":
+            return value.decode("latin-1")
+    return ""
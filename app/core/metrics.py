@@ -0,0 +1,237 @@
+"""
+Prometheus metrics: request latency, cache and SQL timing, rate limiting
+
+With PROMETHEUS_MULTIPROC_DIR set, every uvicorn worker writes its samples to
+that directory and /metrics aggregates all of them.
+"""
+import functools
+import inspect
+import os
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional, Tuple
+from config import settings
+
+def process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def reset_multiprocess_dir():
+    """Remove samples of processes that are gone (earlier runs, dead workers) and of this one
+
+    Runs when this module is imported, so every uvicorn worker clears stale files
+    before it records anything, however the server was started; files of sibling
+    workers that are still running are kept.
+    """
+    directory = settings.prometheus_multiproc_dir
+    if not directory or not os.path.isdir(directory):
+        return
+    for name in os.listdir(directory):
+        # counter_<pid>.db, histogram_<pid>.db, gauge_livesum_<pid>.db, ...
+        stem, _, pid = name.removesuffix(".db").rpartition("_")
+        if not stem or not pid.isdigit():
+            continue
+        if int(pid) == os.getpid() or not process_alive(int(pid)):
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass  # removed by a sibling worker starting at the same time
+
+# prometheus_client picks its value storage at import time, so the directory
+# has to be in the environment before the first import
+if settings.prometheus_multiproc_dir:
+    os.makedirs(settings.prometheus_multiproc_dir, exist_ok=True)
+    os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", settings.prometheus_multiproc_dir)
+    reset_multiprocess_dir()
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client import multiprocess
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+# Sub-millisecond buckets for cache round trips, up to seconds for requests
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+    buckets=REQUEST_BUCKETS,
+)
+CACHE_LATENCY = Histogram(
+    "cache_operation_duration_seconds",
+    "Redis round-trip latency by operation and key family",
+    ["operation", "family"],
+    buckets=FAST_BUCKETS,
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total",
+    "Cache lookups by key family and result (l1_hit, l2_hit, miss, error)",
+    ["family", "result"],
+)
+SQL_LATENCY = Histogram(
+    "db_statement_duration_seconds",
+    "SQL statement latency by service method",
+    ["operation"],
+    buckets=FAST_BUCKETS,
+)
+RATE_LIMIT_REJECTIONS = Counter(
+    "rate_limit_rejections_total",
+    "Requests rejected by the rate limiter",
+    ["route"],
+)
+AGENT_TIME_TO_FIRST_TOKEN = Histogram(
+    "agent_time_to_first_token_seconds",
+    "Time from the start of a streamed chat turn to its first answer token",
+    buckets=REQUEST_BUCKETS,
+)
+AGENT_TURNS = Counter(
+    "agent_turns_total",
+    "Streamed chat turns by outcome (completed, cancelled, error)",
+    ["outcome"],
+)
+
+# Service method issuing the current SQL statements
+_db_operation: ContextVar[str] = ContextVar("db_operation", default="other")
+
+
+# ---------------------------------------------------------------------------
+# Labels
+# ---------------------------------------------------------------------------
+
+@functools.lru_cache(maxsize=4096)
+def key_family(key: str) -> str:
+    """Low-cardinality family of a cache key: expense:42 -> expense, expenses:list:... -> expenses:list"""
+    parts = key.split(":", 2)
+    if len(parts) > 2 and parts[1].isidentifier():
+        return f"{parts[0]}:{parts[1]}"
+    return parts[0]
+
+def route_template(scope: Dict[str, Any]) -> str:
+    """Path template of the matched route (FastAPI stores the route in the scope)"""
+    route = scope.get("route")
+    return getattr(route, "path", None) or UNMATCHED_ROUTE
+
+
+# ---------------------------------------------------------------------------
+# Recording helpers
+# ---------------------------------------------------------------------------
+
+def observe_cache(operation: str, key: str, seconds: float):
+    CACHE_LATENCY.labels(operation, key_family(key)).observe(seconds)
+
+def count_cache(key: str, result: str):
+    CACHE_REQUESTS.labels(key_family(key), result).inc()
+
+def record_rate_limit_rejection(scope: Dict[str, Any], route: Optional[str] = None):
+    RATE_LIMIT_REJECTIONS.labels(route or route_template(scope)).inc()
+
+def observe_agent_turn(outcome: str, time_to_first_token: Optional[float] = None):
+    AGENT_TURNS.labels(outcome).inc()
+    if time_to_first_token is not None:
+        AGENT_TIME_TO_FIRST_TOKEN.observe(time_to_first_token)
+
+def db_operation(func: Callable) -> Callable:
+    """Attribute the SQL statements a service method issues to that method"""
+    name = func.__name__
+
+    if inspect.isasyncgenfunction(func):
+        @functools.wraps(func)
+        async def generator_wrapper(*args, **kwargs):
+            # Set per step: the consumer's code between items must not be attributed
+            iterator = func(*args, **kwargs)
+            try:
+                while True:
+                    token = _db_operation.set(name)
+                    try:
+                        item = await iterator.__anext__()
+                    except StopAsyncIteration:
+                        return
+                    finally:
+                        _db_operation.reset(token)
+                    yield item
+            finally:
+                await iterator.aclose()
+        return generator_wrapper
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        token = _db_operation.set(name)
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            _db_operation.reset(token)
+    return wrapper
+
+def instrument_sql(engine: AsyncEngine):
+    """Time every statement executed through an engine"""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        # SQLAlchemy copies the task's context into its greenlet, so the label is visible here
+        SQL_LATENCY.labels(_db_operation.get()).observe(time.perf_counter() - started)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def handle_error(exception_context):
+        stack = exception_context.connection.info.get("query_started") if exception_context.connection else None
+        if stack:
+            stack.pop()
+
+
+# ---------------------------------------------------------------------------
+# Middleware and exposition
+# ---------------------------------------------------------------------------
+
+class MetricsMiddleware:
+    """Record request latency per route template"""
+
+    def __init__(self, app):
+        self.app = app
+        # Label lookups cost more than the observation itself, keep the children
+        self._children: Dict[Tuple[str, str, int], Any] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            key = (scope["method"], route_template(scope), status)
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = REQUEST_LATENCY.labels(key[0], key[1], str(status))
+            child.observe(elapsed)
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Exposition body for this worker, or for all workers in multiprocess mode"""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
@@ -0,0 +1,185 @@
+"""
+Distributed rate limiting backed by Redis
+
+Counters live in Redis (the `redis_cache` connection pool), so a limit holds
+across uvicorn workers and nodes instead of per process. Each check runs one
+Lua script that tests and updates every limit of a route atomically: a single
+round trip per request.
+"""
+import functools
+import ipaddress
+import re
+from typing import Callable, List, NamedTuple, Optional, Tuple
+from fastapi import Request
+from app.core.tracing import span
+from app.db.redis_cache import redis_cache
+from config import settings
+
+# Sliding window counter: per limit, one hash holding the current window index
+# and the hit counts of the current and previous window. The previous window is
+# weighted by how much of it still overlaps the sliding window.
+# KEYS: one per limit; ARGV: limit, window in ms (pairs, in KEYS order).
+# Returns {allowed, remaining, retry_after_ms}. Uses the Redis clock, so
+# nodes with skewed clocks still share windows (needs Redis >= 5 for TIME
+# before writes).
+SLIDING_WINDOW_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+local windows = {}
+local remaining = -1
+local retry_after = 0
+for i = 1, #KEYS do
+    local limit = tonumber(ARGV[2 * i - 1])
+    local window = tonumber(ARGV[2 * i])
+    local current = math.floor(now / window)
+    local elapsed = now - current * window
+    local state = redis.call('HMGET', KEYS[i], 'w', 'c', 'p')
+    local index, count, previous = tonumber(state[1]), tonumber(state[2]) or 0, tonumber(state[3]) or 0
+    if index ~= current then
+        if index == current - 1 then previous = count else previous = 0 end
+        count = 0
+    end
+    local used = previous * (window - elapsed) / window + count
+    if used + 1 > limit then
+        local wait = window - elapsed
+        if count + 1 <= limit and previous > 0 then
+            -- until enough of the previous window has slid out
+            wait = math.ceil(window * (1 - (limit - count - 1) / previous)) - elapsed
+        end
+        retry_after = math.max(retry_after, wait, 1)
+    end
+    windows[i] = {current, count, previous, window}
+    local left = math.floor(limit - used - 1)
+    if remaining < 0 or left < remaining then remaining = left end
+end
+if retry_after > 0 then
+    return {0, 0, retry_after}
+end
+for i = 1, #KEYS do
+    local w = windows[i]
+    redis.call('HSET', KEYS[i], 'w', w[1], 'c', w[2] + 1, 'p', w[3])
+    redis.call('PEXPIRE', KEYS[i], w[4] * 2)
+end
+return {1, math.max(remaining, 0), 0}
+"""
+
+LIMIT_RE = re.compile(r"^\s*(\d+)\s*(?:/|per)\s*(\d+)?\s*(second|minute|hour|day)s?\s*$", re.IGNORECASE)
+
+UNIT_MS = {"second": 1000, "minute": 60 * 1000, "hour": 60 * 60 * 1000, "day": 24 * 60 * 60 * 1000}
+
+
+class RateLimit(NamedTuple):
+    """`amount` requests per `window_ms`"""
+    amount: int
+    window_ms: int
+    text: str
+
+
+class RateLimitExceeded(Exception):
+    """Raised by a rate-limited endpoint; answered with 429 and Retry-After"""
+
+    def __init__(self, limit: str, retry_after: float):
+        super().__init__(f"Rate limit exceeded: {limit}")
+        self.limit = limit
+        self.retry_after = retry_after
+
+
+def parse_limits(value: str) -> List[RateLimit]:
+    """Parse "4/minute", "10 per second" or "2/5 minutes"; several separated by ';'"""
+    limits = []
+    for text in filter(str.strip, value.split(";")):
+        match = LIMIT_RE.match(text)
+        if not match:
+            raise ValueError(f"Invalid rate limit: {text!r}")
+        amount, multiple, unit = match.groups()
+        limits.append(RateLimit(int(amount), int(multiple or 1) * UNIT_MS[unit.lower()], text.strip()))
+    return limits
+
+@functools.lru_cache(maxsize=8)
+def trusted_networks(proxies: Tuple[str, ...]) -> Tuple[ipaddress._BaseNetwork, ...]:
+    """Parsed network list (`rate_limit_trusted_proxies`, `metrics_allowed_networks`)"""
+    return tuple(ipaddress.ip_network(proxy.strip(), strict=False) for proxy in proxies)
+
+
+def is_trusted(address: str, networks: Tuple[ipaddress._BaseNetwork, ...]) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in networks)
+
+
+def client_address(request: Request) -> str:
+    """Rate limit identity: the client IP
+
+    The socket peer, unless it is one of `rate_limit_trusted_proxies`: then
+    X-Forwarded-For is read right to left and the first hop that is not a
+    trusted proxy is the client. Hops left of it could be forged by the
+    client, so they are never used.
+    """
+    peer = request.client.host if request.client else "127.0.0.1"
+    networks = trusted_networks(tuple(settings.rate_limit_trusted_proxies))
+    if not networks or not is_trusted(peer, networks):
+        return peer
+    hops = [hop.strip() for header in request.headers.getlist("x-forwarded-for") for hop in header.split(",")]
+    for hop in reversed([hop for hop in hops if hop]):
+        if not is_trusted(hop, networks):
+            return hop
+    return peer
+
+
+class RateLimiter:
+    """Per-route limits from Settings, enforced with shared Redis counters"""
+
+    def __init__(self, key_func: Callable[[Request], str] = client_address, prefix: str = "ratelimit"):
+        self.key_func = key_func
+        self.prefix = prefix
+
+    def limits_for(self, route: str) -> List[RateLimit]:
+        """Configured limits of a route (`rate_limit_routes`, else `rate_limit_default`)"""
+        return parse_limits(settings.rate_limit_routes.get(route, settings.rate_limit_default))
+
+    async def hit(self, route: str, identity: str, limits: List[RateLimit]) -> Tuple[bool, int, float]:
+        """Count one request: (allowed, remaining, retry_after seconds)"""
+        client = redis_cache.client
+        if not limits or client is None:
+            return True, -1, 0.0
+
+        keys = [f"{self.prefix}:{route}:{limit.amount}/{limit.window_ms}:{identity}" for limit in limits]
+        args = [value for limit in limits for value in (limit.amount, limit.window_ms)]
+        try:
+            with span("redis.rate_limit", "redis", **{"rate_limit.route": route}):
+                allowed, remaining, retry_after_ms = await client.eval(SLIDING_WINDOW_SCRIPT, len(keys), *keys, *args)
+        except Exception as e:
+            # Fail open: an unavailable Redis must not take the API down with it
+            print(f"Redis RATE LIMIT error for route {route}: {e}")
+            return True, -1, 0.0
+        return bool(allowed), int(remaining), int(retry_after_ms) / 1000
+
+    def limit(self, route: Optional[str] = None) -> Callable:
+        """Rate-limit an endpoint taking a `request: Request` argument
+
+        The route name (default: the endpoint function name) selects the limits
+        in `settings.rate_limit_routes`.
+        """
+        def decorator(func: Callable) -> Callable:
+            name = route or func.__name__
+            limits = self.limits_for(name)
+            description = "; ".join(limit.text for limit in limits)
+
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                request = kwargs.get("request")
+                if request is None:
+                    request = next((arg for arg in args if isinstance(arg, Request)), None)
+                if settings.rate_limit_enabled and request is not None:
+                    allowed, _, retry_after = await self.hit(name, self.key_func(request), limits)
+                    if not allowed:
+                        raise RateLimitExceeded(description, retry_after)
+                return await func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+
+# Shared limiter used by the routers
+limiter = RateLimiter()
@@ -0,0 +1,35 @@
+"""
+Lightweight stage timing for request hot paths
+"""
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+
+class StageTimer:
+    """Accumulate wall time per named stage of a request"""
+
+    def __init__(self):
+        self._started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Time a block and add it to the named stage (milliseconds)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed
+
+    @property
+    def total_ms(self) -> float:
+        """Milliseconds since the timer was created"""
+        return (time.perf_counter() - self._started) * 1000
+
+    def as_log_fields(self) -> Dict[str, float]:
+        """Stage durations as `<stage>_ms` log fields"""
+        fields = {f"{name}_ms": round(elapsed, 3) for name, elapsed in self.stages.items()}
+        fields["total_ms"] = round(self.total_ms, 3)
+        return fields
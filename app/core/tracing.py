@@ -0,0 +1,382 @@
+"""
+Request tracing with W3C trace context and Server-Timing
+
+Spans follow the OpenTelemetry data model (trace/span ids, parent, start/end
+in unix nanoseconds, attributes, status) and are exported as OTLP-style JSON,
+so they can be loaded into any OTel-compatible backend. Stage durations are
+accumulated for every request; span records are only kept for sampled ones.
+"""
+import atexit
+import functools
+import inspect
+import json
+import os
+import queue
+import random
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional
+import structlog
+from sqlalchemy import event
+from config import settings
+
+TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+# String and numeric literals inlined into SQL (text() queries, literal binds)
+SQL_LITERAL_RE = re.compile(r"'(?:[^'\\]|\\.|'')*'|\b\d+(?:\.\d+)?\b")
+
+# Leaf stages reported in Server-Timing; everything else is "app"
+TIMED_STAGES = ("redis", "db", "s3", "serialize")
+
+
+class Span:
+    """One timed operation inside a trace"""
+
+    __slots__ = ("trace_id", "span_id", "parent_span_id", "name", "start_ns", "end_ns", "attributes", "status")
+
+    def __init__(self, trace_id: str, parent_span_id: Optional[str], name: str, attributes: Dict[str, Any]):
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_span_id = parent_span_id
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes
+        self.status = "ok"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_span_id,
+            "name": self.name,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "status": self.status,
+        }
+
+
+class TraceContext:
+    """Per-request trace state: sampling decision, span stack and stage totals"""
+
+    __slots__ = ("trace_id", "request_id", "sampled", "spans", "stack", "stages")
+
+    def __init__(self, trace_id: str, request_id: str, sampled: bool):
+        self.trace_id = trace_id
+        self.request_id = request_id
+        self.sampled = sampled
+        self.spans: List[Span] = []
+        self.stack: List[Span] = []
+        self.stages: Dict[str, float] = {}
+
+    def add_stage(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def start_span(self, name: str, attributes: Dict[str, Any]) -> Span:
+        parent = self.stack[-1].span_id if self.stack else None
+        span = Span(self.trace_id, parent, name, attributes)
+        self.spans.append(span)
+        self.stack.append(span)
+        return span
+
+    def end_span(self, span: Span):
+        span.end_ns = time.time_ns()
+        if self.stack and self.stack[-1] is span:
+            self.stack.pop()
+        elif span in self.stack:
+            self.stack.remove(span)
+
+    def record_span(self, name: str, start_ns: int, end_ns: int, attributes: Dict[str, Any]):
+        """Add an already finished span (e.g. from SQLAlchemy events) under the current one"""
+        parent = self.stack[-1].span_id if self.stack else None
+        span = Span(self.trace_id, parent, name, attributes)
+        span.start_ns, span.end_ns = start_ns, end_ns
+        self.spans.append(span)
+
+    def server_timing(self, total: float) -> str:
+        """Server-Timing header value: leaf stages, the remainder as app, and total"""
+        entries = []
+        accounted = 0.0
+        for stage in TIMED_STAGES:
+            seconds = self.stages.get(stage)
+            if seconds:
+                accounted += seconds
+                entries.append(f"{stage};dur={seconds * 1000:.2f}")
+        entries.append(f"app;dur={max(total - accounted, 0.0) * 1000:.2f}")
+        entries.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(entries)
+
+
+_current: ContextVar[Optional[TraceContext]] = ContextVar("trace_context", default=None)
+
+
+# ---------------------------------------------------------------------------
+# Exporters
+# ---------------------------------------------------------------------------
+
+class InMemoryExporter:
+    """Keep the most recent spans in memory (tests, /metrics/traces)"""
+
+    def __init__(self, max_spans: int = 10000):
+        self.spans: Deque[Dict[str, Any]] = deque(maxlen=max_spans)
+
+    def export(self, spans: List[Span]):
+        self.spans.extend(span.to_dict() for span in spans)
+
+    def recent(self, limit: int = 100, trace_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        spans = [span for span in self.spans if trace_id is None or span["trace_id"] == trace_id]
+        return spans[-limit:]
+
+    def clear(self):
+        self.spans.clear()
+
+
+class FileExporter(threading.Thread):
+    """Append spans as JSON lines from a background thread
+
+    export() only puts the finished trace on a bounded queue, the event loop
+    never blocks on the file. Traces arriving while the queue is full are
+    dropped and counted.
+    """
+
+    _STOP = object()
+
+    def __init__(self, path: str, queue_size: int = 1000, batch_size: int = 64):
+        super().__init__(name="trace-writer", daemon=True)
+        self.path = path
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.batch_size = batch_size
+        self.exported = 0
+        self.dropped = 0
+        self.start()
+
+    def export(self, spans: List[Span]):
+        try:
+            self.queue.put_nowait(spans)
+        except queue.Full:
+            self.dropped += 1
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            traces = [spans for spans in batch if spans is not self._STOP]
+            if traces:
+                self._write(traces)
+            if len(traces) < len(batch):
+                return
+
+    def _write(self, traces: List[List[Span]]):
+        try:
+            lines = "".join(
+                json.dumps(span.to_dict(), default=str) + "\n" for spans in traces for span in spans
+            )
+            with open(self.path, "a", encoding="utf-8") as file:
+                file.write(lines)
+            self.exported += len(traces)
+        except Exception as e:
+            # Never let a bad span or a full disk kill the writer
+            print(f"Trace export error: {e}")
+
+    def stop(self, timeout: float = 5.0):
+        """Write queued traces and stop the thread"""
+        self.queue.put(self._STOP)
+        self.join(timeout)
+
+
+def _create_exporter():
+    if settings.tracing_exporter == "file":
+        file_exporter = FileExporter(settings.tracing_file_path, settings.tracing_file_queue_size)
+        atexit.register(file_exporter.stop)
+        return file_exporter
+    if settings.tracing_exporter == "memory":
+        return InMemoryExporter(settings.tracing_memory_max_spans)
+    return None
+
+exporter = _create_exporter()
+
+
+# ---------------------------------------------------------------------------
+# Instrumentation API
+# ---------------------------------------------------------------------------
+
+def current_trace() -> Optional[TraceContext]:
+    return _current.get()
+
+def redact_sql(statement: str) -> str:
+    """SQL with inlined literals replaced by ?; bound parameters never reach spans"""
+    return SQL_LITERAL_RE.sub("?", statement)
+
+@contextmanager
+def span(name: str, stage: Optional[str] = None, **attributes: Any) -> Iterator[Optional[Span]]:
+    """Time a block as a child span; a no-op outside a traced request"""
+    context = _current.get()
+    if context is None:
+        yield None
+        return
+
+    started = time.perf_counter()
+    current = context.start_span(name, attributes) if context.sampled else None
+    try:
+        yield current
+    except BaseException as e:
+        if current is not None:
+            current.status = "error"
+            current.attributes["error"] = repr(e)
+        raise
+    finally:
+        if stage:
+            context.add_stage(stage, time.perf_counter() - started)
+        if current is not None:
+            context.end_span(current)
+
+def traced(name: Optional[str] = None, stage: Optional[str] = None) -> Callable:
+    """Trace every call of an async function or async generator"""
+    def decorator(func: Callable) -> Callable:
+        span_name = name or func.__qualname__
+
+        if inspect.isasyncgenfunction(func):
+            @functools.wraps(func)
+            async def generator_wrapper(*args, **kwargs):
+                with span(span_name, stage):
+                    async for item in func(*args, **kwargs):
+                        yield item
+            return generator_wrapper
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with span(span_name, stage):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def trace_sql(engine):
+    """Record each SQL statement as a db span"""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if _current.get() is not None:
+            conn.info.setdefault("trace_started", []).append((time.perf_counter(), time.time_ns()))
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        trace = _current.get()
+        stack = conn.info.get("trace_started")
+        if trace is None or not stack:
+            return
+        started, start_ns = stack.pop()
+        trace.add_stage("db", time.perf_counter() - started)
+        if trace.sampled:
+            trace.record_span("db.query", start_ns, time.time_ns(), {
+                "db.system": "mysql",
+                "db.statement": redact_sql(statement[:2000])[:500],
+                "db.executemany": executemany,
+                "db.rows": cursor.rowcount,
+            })
+
+    @event.listens_for(sync_engine, "handle_error")
+    def handle_error(exception_context):
+        connection = exception_context.connection
+        stack = connection.info.get("trace_started") if connection is not None else None
+        if stack:
+            stack.pop()
+
+
+# ---------------------------------------------------------------------------
+# Middleware
+# ---------------------------------------------------------------------------
+
+def parse_traceparent(value: str):
+    """(trace_id, parent_span_id, sampled) from a W3C traceparent header"""
+    match = TRACEPARENT_RE.match(value.strip().lower()) if value else None
+    if not match or match.group(1) == "0" * 32:
+        return None
+    return match.group(1), match.group(2), bool(int(match.group(3), 16) & 0x01)
+
+
+class TracingMiddleware:
+    """Start a trace per request, propagate trace/request ids and add Server-Timing"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.tracing_enabled:
+            return await self.app(scope, receive, send)
+
+        traceparent = request_id = None
+        for name, value in scope["headers"]:
+            if name == b"traceparent":
+                traceparent = value.decode("latin-1")
+            elif name == b"x-request-id":
+                request_id = value.decode("latin-1")
+
+        parent = parse_traceparent(traceparent)
+        if parent:
+            # Head sampling: follow the caller's decision
+            trace_id, parent_span_id, sampled = parent
+        else:
+            trace_id, parent_span_id = os.urandom(16).hex(), None
+            sampled = random.random() < settings.tracing_sample_rate
+        if request_id is None:
+            # Downstream middleware (request logging) sees the same id
+            request_id = uuid.uuid4().hex
+            scope["headers"] = [*scope["headers"], (b"x-request-id", request_id.encode())]
+
+        context = TraceContext(trace_id, request_id, sampled and exporter is not None)
+        root = None
+        if context.sampled:
+            root = context.start_span(f"{scope['method']} {scope['path']}", {
+                "http.method": scope["method"],
+                "http.target": scope["path"],
+                "request.id": request_id,
+            })
+            root.parent_span_id = parent_span_id
+        token = _current.set(context)
+        structlog.contextvars.bind_contextvars(request_id=request_id, trace_id=trace_id)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                span_id = root.span_id if root is not None else os.urandom(8).hex()
+                headers = list(message.get("headers", []))
+                headers.append((b"x-request-id", request_id.encode()))
+                headers.append((b"traceparent", f"00-{trace_id}-{span_id}-{'01' if context.sampled else '00'}".encode()))
+                if settings.tracing_server_timing:
+                    headers.append((b"server-timing", context.server_timing(time.perf_counter() - started).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            structlog.contextvars.unbind_contextvars("request_id", "trace_id")
+            _current.reset(token)
+            if root is not None:
+                route = scope.get("route")
+                if route is not None:
+                    # Name by route template so traces group like the metrics do
+                    root.name = f"{scope['method']} {route.path}"
+                    root.attributes["http.route"] = route.path
+                root.attributes["http.status_code"] = status
+                if status >= 500:
+                    root.status = "error"
+                for stage, seconds in context.stages.items():
+                    root.attributes[f"stage.{stage}_ms"] = round(seconds * 1000, 3)
+                context.end_span(root)
+                exporter.export(context.spans)
@@ -0,0 +1,181 @@
+"""
+Serialization codecs for cached payloads
+
+Every encoded payload starts with a 4 byte header:
+magic (0x00), format version, codec id, compression id.
+Legacy entries written as plain JSON have no header and are still readable.
+"""
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, Optional, Tuple
+from config import settings
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # optional dependency
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:  # optional dependency
+    lz4_frame = None
+
+MAGIC = 0x00
+FORMAT_VERSION = 1
+HEADER_SIZE = 4
+
+# msgpack extension types preserving Python types across the cache
+EXT_DATE = 1
+EXT_DATETIME = 2
+EXT_DECIMAL = 3
+
+
+class CodecError(ValueError):
+    """Payload can't be decoded by this process (unknown or unavailable codec)"""
+
+
+# ---------------------------------------------------------------------------
+# Codecs
+# ---------------------------------------------------------------------------
+
+def _json_encode(value: Any) -> bytes:
+    return json.dumps(value, default=str).encode()
+
+def _json_decode(payload: bytes) -> Any:
+    return json.loads(payload)
+
+def _orjson_default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+def _orjson_encode(value: Any) -> bytes:
+    return orjson.dumps(value, default=_orjson_default)
+
+def _orjson_decode(payload: bytes) -> Any:
+    return orjson.loads(payload)
+
+def _msgpack_default(value: Any) -> Any:
+    # datetime is a date subclass, check it first
+    if isinstance(value, datetime):
+        return msgpack.ExtType(EXT_DATETIME, value.isoformat().encode())
+    if isinstance(value, date):
+        return msgpack.ExtType(EXT_DATE, value.isoformat().encode())
+    if isinstance(value, Decimal):
+        return msgpack.ExtType(EXT_DECIMAL, str(value).encode())
+    raise TypeError(f"Type is not msgpack serializable: {type(value).__name__}")
+
+def _msgpack_ext_hook(code: int, data: bytes) -> Any:
+    if code == EXT_DATETIME:
+        return datetime.fromisoformat(data.decode())
+    if code == EXT_DATE:
+        return date.fromisoformat(data.decode())
+    if code == EXT_DECIMAL:
+        return Decimal(data.decode())
+    return msgpack.ExtType(code, data)
+
+def _msgpack_encode(value: Any) -> bytes:
+    return msgpack.packb(value, default=_msgpack_default, use_bin_type=True)
+
+def _msgpack_decode(payload: bytes) -> Any:
+    return msgpack.unpackb(payload, ext_hook=_msgpack_ext_hook, raw=False)
+
+# name -> (id, available, encode, decode)
+CODECS: Dict[str, Tuple[int, bool, Callable[[Any], bytes], Callable[[bytes], Any]]] = {
+    "json": (1, True, _json_encode, _json_decode),
+    "orjson": (2, orjson is not None, _orjson_encode, _orjson_decode),
+    "msgpack": (3, msgpack is not None, _msgpack_encode, _msgpack_decode),
+}
+
+# name -> (id, available, compress, decompress)
+COMPRESSIONS: Dict[str, Tuple[int, bool, Callable[[bytes], bytes], Callable[[bytes], bytes]]] = {
+    "none": (0, True, bytes, bytes),
+    "zstd": (
+        1,
+        zstandard is not None,
+        lambda data: zstandard.ZstdCompressor(level=3).compress(data),
+        lambda data: zstandard.ZstdDecompressor().decompress(data),
+    ),
+    "lz4": (
+        2,
+        lz4_frame is not None,
+        lambda data: lz4_frame.compress(data),
+        lambda data: lz4_frame.decompress(data),
+    ),
+}
+
+_CODECS_BY_ID = {entry[0]: entry for entry in CODECS.values()}
+_COMPRESSIONS_BY_ID = {entry[0]: entry for entry in COMPRESSIONS.values()}
+
+
+# ---------------------------------------------------------------------------
+# Payload codec
+# ---------------------------------------------------------------------------
+
+class PayloadCodec:
+    """Encode/decode cache values with a versioned codec + compression header"""
+
+    def __init__(self, codec: str = "json", compression: str = "none", compression_threshold: int = 1024):
+        if codec not in CODECS:
+            raise ValueError(f"Unknown cache codec: {codec}")
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown cache compression: {compression}")
+        if not CODECS[codec][1]:
+            print(f"⚠️ Cache codec {codec} is not installed, falling back to json")
+            codec = "json"
+        if not COMPRESSIONS[compression][1]:
+            print(f"⚠️ Cache compression {compression} is not installed, disabling compression")
+            compression = "none"
+
+        self.codec = codec
+        self.compression = compression
+        self.compression_threshold = compression_threshold
+        self._codec_id, _, self._encode, _ = CODECS[codec]
+        self._compression_id, _, self._compress, _ = COMPRESSIONS[compression]
+
+    def encode(self, value: Any) -> bytes:
+        """Serialize a value, compressing it when above the size threshold"""
+        payload = self._encode(value)
+        compression_id = 0
+        if self._compression_id and len(payload) >= self.compression_threshold:
+            payload = self._compress(payload)
+            compression_id = self._compression_id
+        return bytes((MAGIC, FORMAT_VERSION, self._codec_id, compression_id)) + payload
+
+    def decode(self, data: bytes) -> Any:
+        """Deserialize a payload written by any codec this process has installed"""
+        if not data or data[0] != MAGIC:
+            # Legacy entry: plain JSON without a header
+            return json.loads(data)
+        if len(data) < HEADER_SIZE or data[1] != FORMAT_VERSION:
+            raise CodecError("Unsupported cache payload version")
+
+        codec = _CODECS_BY_ID.get(data[2])
+        compression = _COMPRESSIONS_BY_ID.get(data[3])
+        if codec is None or compression is None or not codec[1] or not compression[1]:
+            raise CodecError(f"Cache payload codec {data[2]}/{data[3]} is not available")
+
+        payload = memoryview(data)[HEADER_SIZE:]
+        if data[3]:
+            payload = compression[3](bytes(payload))
+        return codec[3](bytes(payload))
+
+
+def get_payload_codec(codec: Optional[str] = None, compression: Optional[str] = None) -> PayloadCodec:
+    """Build the codec configured in settings"""
+    return PayloadCodec(
+        codec=codec or settings.cache_codec,
+        compression=compression or settings.cache_compression,
+        compression_threshold=settings.cache_compression_threshold,
+    )
@@ -1,9 +1,20 @@
 """
 Database configuration and connection management
 """
+import itertools
+import time
+from contextlib import asynccontextmanager
 from sqlmodel import SQLModel
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
-from typing import AsyncGenerator
+from sqlalchemy import inspect
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from starlette.requests import Request
+from starlette.responses import Response
+from typing import AsyncGenerator, AsyncIterator, Dict, List
+from app.core.metrics import instrument_sql
+from app.core.tracing import trace_sql
+from app.db.pool_metrics import InstrumentedAsyncPool, instrument_engine
+from app.db.redis_cache import get_client_write_key, redis_cache, replica_read
 from config import settings
 
 # Create async engine with connection pooling
@@ -11,6 +22,7 @@ async_engine = create_async_engine(
     settings.async_database_url, 
     echo=settings.debug,
     # Connection pool settings
+    poolclass=InstrumentedAsyncPool,
     pool_size=settings.database_pool_size,
     max_overflow=settings.database_max_overflow,
     pool_timeout=settings.database_pool_timeout,
@@ -23,18 +35,187 @@ async_engine = create_async_engine(
     }
 )
 
+# Read replicas get their own, smaller pools so reads never queue behind writes
+read_engines: List[AsyncEngine] = [
+    create_async_engine(
+        url,
+        echo=settings.debug,
+        poolclass=InstrumentedAsyncPool,
+        pool_size=settings.database_read_pool_size,
+        max_overflow=settings.database_read_max_overflow,
+        pool_timeout=settings.database_pool_timeout,
+        pool_recycle=settings.database_pool_recycle,
+        pool_pre_ping=True,
+        connect_args={
+            "charset": "utf8mb4",
+            "autocommit": False,
+            "connect_timeout": settings.database_read_connect_timeout,
+        }
+    )
+    for url in settings.read_database_urls
+]
+
+instrument_engine(async_engine, "primary")
+instrument_sql(async_engine)
+trace_sql(async_engine)
+for _engine in read_engines:
+    instrument_engine(_engine, f"replica:{_engine.url.host}:{_engine.url.port}")
+    instrument_sql(_engine)
+    trace_sql(_engine)
+
+class ReadRouter:
+    """Round-robin over healthy read replicas, falling back to the primary"""
+    
+    def __init__(self, primary: AsyncEngine, replicas: List[AsyncEngine], retry_after: float):
+        self.primary = primary
+        self.replicas = replicas
+        self.retry_after = retry_after
+        self._turn = itertools.count()
+        self._unhealthy_until: Dict[AsyncEngine, float] = {}
+    
+    def pick(self) -> AsyncEngine:
+        """Next healthy replica, or the primary when none is available"""
+        now = time.monotonic()
+        for _ in range(len(self.replicas)):
+            engine = self.replicas[next(self._turn) % len(self.replicas)]
+            if self._unhealthy_until.get(engine, 0) <= now:
+                return engine
+        return self.primary
+    
+    def mark_unhealthy(self, engine: AsyncEngine):
+        """Skip a replica for retry_after seconds"""
+        if engine is self.primary:
+            return
+        self._unhealthy_until[engine] = time.monotonic() + self.retry_after
+        print(f"⚠️ Read replica {engine.url.host} unavailable, retrying in {self.retry_after}s")
+    
+    def healthy_replicas(self) -> List[str]:
+        """Hosts of the replicas currently in rotation"""
+        now = time.monotonic()
+        return [
+            engine.url.host for engine in self.replicas
+            if self._unhealthy_until.get(engine, 0) <= now
+        ]
+    
+    async def session(self, use_primary: bool = False) -> AsyncSession:
+        """Open a session on a replica whose connection was checked out successfully"""
+        engine = self.primary if use_primary else self.pick()
+        while engine is not self.primary:
+            session = AsyncSession(engine)
+            try:
+                # Check out (and pre-ping) now so a dead replica fails over before the query
+                await session.connection()
+                replica_read.set(True)
+                return session
+            except (DBAPIError, OSError):
+                await session.close()
+                self.mark_unhealthy(engine)
+                engine = self.pick()
+        return AsyncSession(self.primary)
+
+read_router = ReadRouter(async_engine, read_engines, settings.database_replica_retry_after)
+
+def _create_missing_indexes(sync_conn):
+    """Add indexes declared on models to tables that already exist"""
+    inspector = inspect(sync_conn)
+    for table in SQLModel.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            try:
+                # InnoDB builds secondary indexes online (concurrent DML allowed)
+                index.create(sync_conn)
+                print(f"Created index {index.name} on {table.name}")
+            except Exception as e:
+                # Another worker may be creating the same index
+                print(f"Index creation skipped for {index.name}: {e}")
+
 async def init_db_async():
     """Initialize database with SQLModel"""
     try:
         # Create all tables
         async with async_engine.begin() as conn:
             await conn.run_sync(SQLModel.metadata.create_all)
+        # Columns added since a table was created, then the indexes that may use them
+        from app.db.migrations import add_missing_columns
+        await add_missing_columns()
+        async with async_engine.connect() as conn:
+            await conn.run_sync(_create_missing_indexes)
         print("Database initialized successfully")
     except Exception as e:
         print(f"Database initialization error: {e}")
         raise
 
+async def close_db_async():
+    """Dispose the primary and replica connection pools"""
+    for engine in [async_engine, *read_engines]:
+        await engine.dispose()
+
+def mark_recent_write(response: Response):
+    """Pin the client's reads to the primary until replicas have caught up"""
+    until = int(time.time()) + settings.read_your_writes_seconds
+    response.set_cookie(
+        settings.read_your_writes_cookie,
+        str(until),
+        max_age=settings.read_your_writes_seconds,
+        httponly=True,
+        samesite="lax"
+    )
+
+def wrote_recently(request: Request) -> bool:
+    """Whether the client made a write within the read-your-writes window"""
+    try:
+        return int(request.cookies.get(settings.read_your_writes_cookie, 0)) > time.time()
+    except ValueError:
+        return False
+
+async def mark_client_write(client: str):
+    """Pin the reads of a client that can't carry the cookie (an MCP session,
+    the agent) to the primary; kept in Redis so every worker sees it"""
+    if redis_cache.client is None:
+        return
+    try:
+        await redis_cache.client.set(get_client_write_key(client), 1, ex=settings.read_your_writes_seconds)
+    except Exception as e:
+        print(f"Redis read-your-writes error for client {client}: {e}")
+
+async def client_wrote_recently(client: str) -> bool:
+    """Whether a client marked with mark_client_write is within its read-your-writes window"""
+    if redis_cache.client is None:
+        return False
+    try:
+        return bool(await redis_cache.client.exists(get_client_write_key(client)))
+    except Exception as e:
+        # Without the marker we can't tell: the primary is always consistent
+        print(f"Redis read-your-writes error for client {client}: {e}")
+        return True
+
 async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
-    """Get async database session"""
+    """Get async database session on the primary (writes)"""
+    async with AsyncSession(async_engine) as session:
+        yield session
+
+@asynccontextmanager
+async def primary_session() -> AsyncIterator[AsyncSession]:
+    """Primary session owned by the caller, for routes that only sometimes write"""
     async with AsyncSession(async_engine) as session:
         yield session
+
+@asynccontextmanager
+async def read_session(use_primary: bool = False) -> AsyncIterator[AsyncSession]:
+    """Read session owned by the caller, closed on exit.
+
+    Single-flight cache loaders open their own: the load is shared by every
+    concurrent request and may outlive the one that started it.
+    """
+    session = await read_router.session(use_primary=use_primary)
+    async with session:
+        yield session
+
+async def get_read_async_session(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    """Get async database session for reads (replica unless the client just wrote)"""
+    async with read_session(use_primary=wrote_recently(request)) as session:
+        yield session
@@ -0,0 +1,80 @@
+"""
+In-process (L1) cache in front of Redis
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+_MISSING = object()
+
+class LocalCache:
+    """Bounded LRU cache with per-entry TTL, sized by entry count and bytes"""
+
+    def __init__(self, max_entries: int, max_bytes: int, default_ttl: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        # key -> (value, size in bytes, monotonic expiry)
+        self._entries: "OrderedDict[str, Tuple[Any, int, float]]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str, default: Any = _MISSING) -> Any:
+        """Return the cached value (treat as read-only) or `default`"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        value, _, expires_at = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any, size: int, ttl: Optional[int] = None) -> bool:
+        """Store a value; entries larger than the byte budget are not cached"""
+        self._remove(key)
+        if size > self.max_bytes:
+            return False
+        ttl = min(ttl, self.default_ttl) if ttl else self.default_ttl
+        self._entries[key] = (value, size, time.monotonic() + ttl)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+        return True
+
+    def delete(self, key: str) -> bool:
+        """Drop a key if present"""
+        return self._remove(key)
+
+    def clear(self) -> None:
+        """Drop every entry"""
+        self._entries.clear()
+        self._bytes = 0
+
+    def _remove(self, key: str) -> bool:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        self._bytes -= entry[1]
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss/eviction counters and current size"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+        }
@@ -0,0 +1,292 @@
+"""
+Online schema migrations
+
+Moves expense.date (VARCHAR -> DATE) and expense.amount (FLOAT -> DECIMAL(10,2))
+without blocking writes for the length of the backfill:
+
+1. prepare  - add nullable shadow columns and triggers mirroring every write into them
+2. backfill - copy existing rows in primary-key batches
+3. verify   - find rows whose values could not be converted
+4. index    - build the model's date/amount indexes on the shadow columns
+5. swap     - rename shadow columns/indexes into place (pause writes for this step)
+6. cleanup  - drop the old columns and make the new ones NOT NULL once the new code is live
+
+Nullable columns added to a model after its table shipped are added at
+startup by `add_missing_columns` (create_all never alters existing tables).
+"""
+import asyncio
+from typing import Dict, List, Optional
+from sqlalchemy import inspect, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlmodel import SQLModel
+from app.db.database import async_engine, _create_missing_indexes
+from app.models.expense import Expense
+from app.models.expense_attachment import ExpenseAttachment
+from app.models.expense_rollup import ExpenseDailyRollup
+
+EXPENSE_TABLE = Expense.__tablename__
+ROLLUP_TABLE = ExpenseDailyRollup.__tablename__
+
+# old column -> (shadow column, target definition, conversion from the old value)
+MIGRATED_COLUMNS = {
+    "date": ("date_new", "DATE", "CAST({value} AS DATE)"),
+    "amount": ("amount_new", "DECIMAL(10,2)", "CAST({value} AS DECIMAL(10,2))"),
+}
+
+# table -> nullable columns added after the table first shipped
+ADDED_COLUMNS = {
+    ExpenseAttachment.__tablename__: ("checksum", "thumbnail_key"),
+}
+
+SHADOW_INDEX_SUFFIX = "__new"
+TRIGGERS = {
+    "INSERT": f"{EXPENSE_TABLE}_migrate_bi",
+    "UPDATE": f"{EXPENSE_TABLE}_migrate_bu",
+}
+
+
+# ---------------------------------------------------------------------------
+# Introspection
+# ---------------------------------------------------------------------------
+
+async def _column_types(conn: AsyncConnection, table: str) -> Dict[str, str]:
+    """Column name -> MySQL data type"""
+    rows = await conn.execute(
+        text(
+            "SELECT COLUMN_NAME, DATA_TYPE FROM information_schema.COLUMNS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table"
+        ),
+        {"table": table},
+    )
+    return {name: data_type.lower() for name, data_type in rows}
+
+async def _column_definitions(conn: AsyncConnection, table: str) -> Dict[str, tuple]:
+    """Column name -> (full MySQL column type, nullable)"""
+    rows = await conn.execute(
+        text(
+            "SELECT COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE FROM information_schema.COLUMNS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table"
+        ),
+        {"table": table},
+    )
+    return {name: (column_type, nullable == "YES") for name, column_type, nullable in rows}
+
+async def _index_names(conn: AsyncConnection, table: str) -> set:
+    """Names of the indexes on a table"""
+    rows = await conn.execute(
+        text(
+            "SELECT DISTINCT INDEX_NAME FROM information_schema.STATISTICS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table"
+        ),
+        {"table": table},
+    )
+    return {name for (name,) in rows}
+
+def _migrated_indexes() -> List:
+    """Model indexes that include a migrated column"""
+    return [
+        index for index in Expense.__table__.indexes
+        if any(column.name in MIGRATED_COLUMNS for column in index.columns)
+    ]
+
+async def expense_columns_migrated() -> bool:
+    """Whether expense already uses DATE/DECIMAL columns"""
+    async with async_engine.connect() as conn:
+        types = await _column_types(conn, EXPENSE_TABLE)
+    return types.get("date") == "date" and types.get("amount") == "decimal"
+
+
+# ---------------------------------------------------------------------------
+# Added columns
+# ---------------------------------------------------------------------------
+
+def _add_missing_columns(sync_conn) -> List[str]:
+    """Add the ADDED_COLUMNS an existing table lacks; returns them as table.column"""
+    inspector = inspect(sync_conn)
+    added = []
+    for table_name, names in ADDED_COLUMNS.items():
+        if not inspector.has_table(table_name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table_name)}
+        table = SQLModel.metadata.tables[table_name]
+        for name in names:
+            if name in existing:
+                continue
+            definition = table.c[name].type.compile(dialect=sync_conn.dialect)
+            try:
+                # Appending a nullable column is an instant, metadata-only change on MySQL 8
+                sync_conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {name} {definition} NULL"))
+                added.append(f"{table_name}.{name}")
+            except Exception as e:
+                # Another worker may be adding the same column
+                print(f"Column creation skipped for {table_name}.{name}: {e}")
+    return added
+
+async def add_missing_columns() -> List[str]:
+    """Bring tables created by an older release up to the models (before their indexes are built)"""
+    async with async_engine.connect() as conn:
+        added = await conn.run_sync(_add_missing_columns)
+        await conn.commit()
+    for column in added:
+        print(f"Added column {column}")
+    return added
+
+
+# ---------------------------------------------------------------------------
+# Phases
+# ---------------------------------------------------------------------------
+
+async def prepare() -> None:
+    """Add shadow columns and the triggers keeping them in sync with writes"""
+    async with async_engine.begin() as conn:
+        types = await _column_types(conn, EXPENSE_TABLE)
+        missing = [
+            f"ADD COLUMN {shadow} {definition} NULL"
+            for shadow, definition, _ in MIGRATED_COLUMNS.values()
+            if shadow not in types
+        ]
+        if missing:
+            # Appending nullable columns is an instant, metadata-only change on MySQL 8
+            await conn.execute(text(f"ALTER TABLE {EXPENSE_TABLE} {', '.join(missing)}"))
+
+        assignments = ", ".join(
+            f"NEW.{shadow} = {conversion.format(value=f'NEW.{column}')}"
+            for column, (shadow, _, conversion) in MIGRATED_COLUMNS.items()
+        )
+        for event, name in TRIGGERS.items():
+            await conn.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+            await conn.execute(text(
+                f"CREATE TRIGGER {name} BEFORE {event} ON {EXPENSE_TABLE} "
+                f"FOR EACH ROW SET {assignments}"
+            ))
+    print("✅ Shadow columns and sync triggers in place.")
+
+async def backfill(batch_size: int = 10000, pause: float = 0.0) -> int:
+    """Copy existing rows into the shadow columns in primary-key batches"""
+    assignments = ", ".join(
+        f"{shadow} = {conversion.format(value=column)}"
+        for column, (shadow, _, conversion) in MIGRATED_COLUMNS.items()
+    )
+    async with async_engine.connect() as conn:
+        min_id, max_id = (await conn.execute(text(f"SELECT MIN(id), MAX(id) FROM {EXPENSE_TABLE}"))).one()
+
+    if min_id is None:
+        return 0
+
+    # Rows inserted after max_id is read are covered by the insert trigger
+    updated = 0
+    for low in range(min_id, max_id + 1, batch_size):
+        async with async_engine.begin() as conn:
+            result = await conn.execute(
+                text(f"UPDATE {EXPENSE_TABLE} SET {assignments} WHERE id BETWEEN :low AND :high"),
+                {"low": low, "high": low + batch_size - 1},
+            )
+            updated += result.rowcount
+        if pause:
+            # Give replication and foreground traffic room between batches
+            await asyncio.sleep(pause)
+    print(f"✅ Backfilled {updated} rows.")
+    return updated
+
+async def verify(limit: int = 20) -> List[Dict]:
+    """Rows whose shadow values are missing (unconvertible source values)"""
+    conditions = " OR ".join(f"{shadow} IS NULL" for shadow, _, _ in MIGRATED_COLUMNS.values())
+    async with async_engine.connect() as conn:
+        rows = await conn.execute(
+            text(
+                f"SELECT id, {', '.join(MIGRATED_COLUMNS)} FROM {EXPENSE_TABLE} "
+                f"WHERE {conditions} LIMIT :limit"
+            ),
+            {"limit": limit},
+        )
+        return [dict(row._mapping) for row in rows]
+
+async def build_indexes() -> None:
+    """Build the model's date/amount indexes on the shadow columns (online)"""
+    async with async_engine.connect() as conn:
+        existing = await _index_names(conn, EXPENSE_TABLE)
+        for index in _migrated_indexes():
+            name = f"{index.name}{SHADOW_INDEX_SUFFIX}"
+            if name in existing:
+                continue
+            columns = ", ".join(
+                MIGRATED_COLUMNS[column.name][0] if column.name in MIGRATED_COLUMNS else column.name
+                for column in index.columns
+            )
+            await conn.execute(text(
+                f"ALTER TABLE {EXPENSE_TABLE} ADD INDEX {name} ({columns}), ALGORITHM=INPLACE, LOCK=NONE"
+            ))
+            print(f"Built index {name}")
+        await conn.commit()
+
+async def swap() -> None:
+    """Rename shadow columns and indexes into place; run with writes paused"""
+    async with async_engine.begin() as conn:
+        types = await _column_types(conn, EXPENSE_TABLE)
+        if types.get("date") == "date" and types.get("amount") == "decimal":
+            print("Columns already swapped.")
+            return
+
+        # The triggers reference the shadow columns, drop them before renaming
+        for name in TRIGGERS.values():
+            await conn.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+
+        existing = await _index_names(conn, EXPENSE_TABLE)
+        columns = await _column_definitions(conn, EXPENSE_TABLE)
+        changes = []
+        for column, (shadow, definition, _) in MIGRATED_COLUMNS.items():
+            # Same type and nullability keeps every change a metadata-only rename;
+            # a default lets the new code insert without the old column until cleanup
+            old_type, nullable = columns[column]
+            default = "" if nullable else " DEFAULT " + ("''" if "char" in old_type else "0")
+            changes.append(
+                f"CHANGE COLUMN {column} {column}_old {old_type} {'NULL' if nullable else 'NOT NULL'}{default}"
+            )
+            changes.append(f"CHANGE COLUMN {shadow} {column} {definition} NULL")
+        for index in _migrated_indexes():
+            shadow_name = f"{index.name}{SHADOW_INDEX_SUFFIX}"
+            if shadow_name not in existing:
+                continue
+            if index.name in existing:
+                changes.append(f"DROP INDEX {index.name}")
+            changes.append(f"RENAME INDEX {shadow_name} TO {index.name}")
+        await conn.execute(text(f"ALTER TABLE {EXPENSE_TABLE} {', '.join(changes)}"))
+
+    # Anything build_indexes didn't cover
+    async with async_engine.connect() as conn:
+        await conn.run_sync(_create_missing_indexes)
+    print("✅ expense now uses DATE/DECIMAL columns.")
+
+async def cleanup() -> None:
+    """Drop the pre-migration columns and tighten the new ones to NOT NULL (online)"""
+    async with async_engine.begin() as conn:
+        columns = await _column_definitions(conn, EXPENSE_TABLE)
+        changes = [f"DROP COLUMN {column}_old" for column in MIGRATED_COLUMNS if f"{column}_old" in columns]
+        changes += [
+            f"MODIFY COLUMN {column} {definition} NOT NULL"
+            for column, (_, definition, _) in MIGRATED_COLUMNS.items()
+            if columns.get(column, (None, False))[1]
+        ]
+        if changes:
+            await conn.execute(text(
+                f"ALTER TABLE {EXPENSE_TABLE} {', '.join(changes)}, ALGORITHM=INPLACE, LOCK=NONE"
+            ))
+    print("✅ Old expense columns dropped.")
+
+async def migrate_rollup() -> Optional[int]:
+    """Convert expense_daily_rollup to DATE/DECIMAL and rebuild it exactly"""
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from app.services.rollup_service import RollupService
+
+    async with async_engine.begin() as conn:
+        types = await _column_types(conn, ROLLUP_TABLE)
+        if not types:
+            return None
+        if types.get("date") != "date" or types.get("total") != "decimal":
+            await conn.execute(text(
+                f"ALTER TABLE {ROLLUP_TABLE} "
+                f"MODIFY COLUMN date DATE NOT NULL, MODIFY COLUMN total DECIMAL(14,2) NOT NULL"
+            ))
+
+    async with AsyncSession(async_engine) as session:
+        return await RollupService(session).rebuild()
@@ -0,0 +1,243 @@
+"""
+Connection pool instrumentation and adaptive overflow tuning
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from config import settings
+
+# Samples kept for percentiles
+WAIT_WINDOW = 2000
+
+
+class PoolMetrics:
+    """Checkout wait, timeout and connection lifecycle counters for one pool"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.checkouts = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.invalidations = 0
+        self._waits = deque(maxlen=WAIT_WINDOW)
+        self._ages = deque(maxlen=WAIT_WINDOW)
+        self._max_wait = 0.0
+
+    def record_wait(self, seconds: float):
+        self.checkouts += 1
+        self._waits.append(seconds)
+        self._max_wait = max(self._max_wait, seconds)
+
+    def record_timeout(self):
+        self.timeouts += 1
+
+    def recent_waits(self, count: int) -> List[float]:
+        """The last `count` checkout waits (bounded by the sample window)"""
+        if count <= 0:
+            return []
+        return list(self._waits)[-count:]
+
+    def snapshot(self, pool) -> Dict[str, Any]:
+        """Current pool occupancy plus counters since startup"""
+        waits = sorted(self._waits)
+        ages = list(self._ages)
+        return {
+            "pool_size": pool.size(),
+            "max_overflow": pool.max_overflow,
+            "checked_out": pool.checkedout(),
+            "idle": pool.checkedin(),
+            # QueuePool counts overflow from -pool_size, only positive values are extra connections
+            "overflow": max(pool.overflow(), 0),
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "connects": self.connects,
+            "invalidations": self.invalidations,
+            "wait_ms": {
+                "avg": round(sum(waits) / len(waits) * 1000, 3) if waits else 0.0,
+                "p50": round(_percentile(waits, 0.50) * 1000, 3),
+                "p95": round(_percentile(waits, 0.95) * 1000, 3),
+                "p99": round(_percentile(waits, 0.99) * 1000, 3),
+                "max": round(self._max_wait * 1000, 3),
+            },
+            "connection_age_s": {
+                "avg": round(sum(ages) / len(ages), 1) if ages else 0.0,
+                "max": round(max(ages), 1) if ages else 0.0,
+            },
+        }
+
+
+def _percentile(ordered: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class InstrumentedAsyncPool(AsyncAdaptedQueuePool):
+    """Async queue pool that times how long each checkout waits for a connection"""
+
+    metrics: Optional[PoolMetrics] = None
+
+    @property
+    def max_overflow(self) -> int:
+        """Connections allowed beyond pool_size"""
+        return self._max_overflow
+
+    def set_max_overflow(self, value: int):
+        """Change the overflow limit of a live pool.
+
+        QueuePool reads the limit on every checkout, so the new value applies
+        from the next one; checkouts already waiting keep waiting for a
+        returned connection. Lowering it closes nothing: overflow connections
+        are closed as they are checked in, as usual.
+        """
+        self._max_overflow = value
+
+    def _create_connection(self):
+        started = time.perf_counter()
+        record = super()._create_connection()
+        # Read back (and cleared) by the checkout that opened it
+        record.info["connect_started"] = started
+        return record
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            record = super()._do_get()
+        except PoolTimeoutError:
+            if self.metrics:
+                self.metrics.record_timeout()
+            raise
+        # Only the time spent queued counts as waiting, not opening a new connection
+        waited_until = record.info.pop("connect_started", None) or time.perf_counter()
+        if self.metrics:
+            self.metrics.record_wait(max(waited_until - started, 0.0))
+        return record
+
+    def recreate(self):
+        # dispose() swaps in a fresh pool, keep counting into the same metrics
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+# name -> engine, in registration order
+_engines: Dict[str, AsyncEngine] = {}
+
+
+def instrument_engine(engine: AsyncEngine, name: str) -> PoolMetrics:
+    """Attach metrics to an engine created with InstrumentedAsyncPool"""
+    metrics = PoolMetrics(name)
+    pool = engine.sync_engine.pool
+    pool.metrics = metrics
+    _engines[name] = engine
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        metrics.connects += 1
+        connection_record.info["connected_at"] = time.monotonic()
+
+    @event.listens_for(engine.sync_engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        connected_at = connection_record.info.get("connected_at")
+        if connected_at is not None:
+            metrics._ages.append(time.monotonic() - connected_at)
+
+    @event.listens_for(engine.sync_engine, "invalidate")
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        metrics.invalidations += 1
+
+    return metrics
+
+
+def pool_stats() -> Dict[str, Any]:
+    """Snapshot of every instrumented pool in this worker"""
+    return {
+        name: engine.sync_engine.pool.metrics.snapshot(engine.sync_engine.pool)
+        for name, engine in _engines.items()
+    }
+
+
+class PoolTuner:
+    """Grow or shrink max_overflow within bounds based on recent checkout waits"""
+
+    def __init__(
+        self,
+        engines: List[AsyncEngine],
+        interval: float,
+        wait_target_ms: float,
+        min_overflow: int,
+        max_overflow: int,
+        step: int = 2
+    ):
+        self.engines = engines
+        self.interval = interval
+        self.wait_target = wait_target_ms / 1000
+        self.min_overflow = min_overflow
+        self.max_overflow = max_overflow
+        self.step = step
+        self._last: Dict[int, tuple] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def tune(self, engine: AsyncEngine) -> Optional[int]:
+        """Adjust one pool, returning the new max_overflow if it changed"""
+        pool = engine.sync_engine.pool
+        metrics = pool.metrics
+        if metrics is None:
+            return None
+        checkouts, timeouts = self._last.get(id(engine), (0, 0))
+        self._last[id(engine)] = (metrics.checkouts, metrics.timeouts)
+        waits = sorted(metrics.recent_waits(metrics.checkouts - checkouts))
+        p95 = _percentile(waits, 0.95)
+
+        current = pool.max_overflow
+        if metrics.timeouts > timeouts or p95 > self.wait_target:
+            target = min(current + self.step, self.max_overflow)
+        elif p95 < self.wait_target / 4 and pool.overflow() <= 0:
+            # Surplus overflow connections are closed as they are checked back in
+            target = max(current - self.step, self.min_overflow)
+        else:
+            target = current
+        if target == current:
+            return None
+        pool.set_max_overflow(target)
+        print(f"Pool {metrics.name}: max_overflow {current} -> {target} (p95 wait {p95 * 1000:.1f}ms)")
+        return target
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            for engine in self.engines:
+                try:
+                    self.tune(engine)
+                except Exception as e:
+                    print(f"⚠️ Pool tuning failed: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+def create_pool_tuner() -> PoolTuner:
+    """Tuner over every instrumented engine, configured from settings"""
+    return PoolTuner(
+        list(_engines.values()),
+        interval=settings.database_pool_tune_interval,
+        wait_target_ms=settings.database_pool_wait_target_ms,
+        min_overflow=settings.database_max_overflow_min,
+        max_overflow=settings.database_max_overflow_max,
+    )
@@ -1,16 +1,112 @@
 """
 Redis connection and caching utilities
 """
+import asyncio
+import copy
 import json
-from typing import Any, Optional
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import date
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Mapping, Optional
 import redis.asyncio as redis
+from app.db.codecs import CodecError, get_payload_codec
+from app.db.local_cache import LocalCache
+from app.core.metrics import count_cache, observe_cache
+from app.core.tracing import span
 from config import settings
 
+# Register a key under each tag set; tag sets live at least as long as their members
+TAG_KEYS_SCRIPT = """
+local ttl = tonumber(ARGV[2])
+for i = 1, #KEYS do
+    redis.call('SADD', KEYS[i], ARGV[1])
+    if ttl > 0 and redis.call('TTL', KEYS[i]) < ttl then
+        redis.call('EXPIRE', KEYS[i], ttl)
+    end
+end
+return #KEYS
+"""
+
+# Drop every key registered under the given tags, then the tag sets themselves,
+# and tell the other workers which keys are gone (ARGV: channel, sender id)
+INVALIDATE_TAGS_SCRIPT = """
+local removed = {}
+for i = 1, #KEYS do
+    local members = redis.call('SMEMBERS', KEYS[i])
+    for j = 1, #members, 1000 do
+        redis.call('UNLINK', unpack(members, j, math.min(j + 999, #members)))
+    end
+    for _, member in ipairs(members) do
+        removed[#removed + 1] = member
+    end
+    redis.call('UNLINK', KEYS[i])
+end
+if ARGV[1] ~= '' and #removed > 0 then
+    redis.call('PUBLISH', ARGV[1], cjson.encode({sender = ARGV[2], keys = removed}))
+end
+return removed
+"""
+
+# Read data version counters, seeding missing ones (ARGV[1]: now in ms) so a
+# counter lost to eviction never falls back to a previously used value
+VERSIONS_SCRIPT = """
+local versions = {}
+for i = 1, #KEYS do
+    redis.call('SET', KEYS[i], ARGV[1], 'NX')
+    versions[i] = redis.call('GET', KEYS[i])
+end
+return versions
+"""
+
+# Bump data version counters, seeding missing ones the same way
+BUMP_VERSIONS_SCRIPT = """
+for i = 1, #KEYS do
+    redis.call('SET', KEYS[i], ARGV[1], 'NX')
+    redis.call('INCR', KEYS[i])
+end
+return #KEYS
+"""
+
+# Summaries spanning more months than this share one coarse tag
+MAX_TAGGED_MONTHS = 120
+
+# Set when the current task read from a replica, whose data may trail the latest write
+replica_read: ContextVar[bool] = ContextVar("replica_read", default=False)
+
+# Values that can be handed to several callers as they are
+IMMUTABLE_TYPES = (str, bytes, int, float, bool)
+
+class _Encoded:
+    """L1 entry kept as its encoded payload and decoded on every hit, so no two
+    callers ever share (and mutate) one dict or list"""
+    __slots__ = ("payload",)
+
+    def __init__(self, payload: bytes):
+        self.payload = payload
+
+def _l1_entry(value: Any, payload: bytes) -> Any:
+    """What L1 stores for a value: the value itself if immutable, else its payload"""
+    return value if isinstance(value, IMMUTABLE_TYPES) else _Encoded(payload)
+
 class RedisCache:
-    """Redis caching service"""
+    """Redis caching service with an optional in-process L1 tier"""
     
     def __init__(self):
         self._redis: Optional[redis.Redis] = None
+        self._codec = get_payload_codec()
+        self._local: Optional[LocalCache] = None
+        if settings.cache_l1_enabled:
+            self._local = LocalCache(
+                max_entries=settings.cache_l1_max_entries,
+                max_bytes=settings.cache_l1_max_bytes,
+                default_ttl=settings.cache_l1_ttl,
+            )
+        # Identifies this process on the invalidation channel
+        self._instance_id = uuid.uuid4().hex
+        self._listener: Optional[asyncio.Task] = None
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._stats = {"l2_hits": 0, "l2_misses": 0, "l2_errors": 0, "loads": 0, "coalesced": 0, "replica_skips": 0}
     
     async def connect(self):
         """Connect to Redis"""
@@ -26,71 +122,306 @@ class RedisCache:
             await self._redis.ping()
             print("✅ Connected to Redis successfully")
             
+            # Keep the L1 tiers of all workers coherent
+            if self._local is not None:
+                self._listener = asyncio.create_task(self._listen_for_invalidations())
+            
         except Exception as e:
             print(f"❌ Failed to connect to Redis: {e}")
             raise
     
     async def disconnect(self):
         """Disconnect from Redis"""
+        if self._listener:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
         if self._redis:
             await self._redis.close()
     
+    @property
+    def client(self) -> Optional[redis.Redis]:
+        """Shared connection pool for other Redis users (None until connected)"""
+        return self._redis
+    
+    async def _listen_for_invalidations(self):
+        """Drop L1 entries other workers changed or invalidated"""
+        while True:
+            try:
+                async with self._redis.pubsub(ignore_subscribe_messages=True) as pubsub:
+                    await pubsub.subscribe(settings.cache_invalidation_channel)
+                    # Anything may have changed while we weren't listening
+                    self._local.clear()
+                    async for message in pubsub.listen():
+                        self._apply_invalidation(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Redis invalidation listener error: {e}")
+                await asyncio.sleep(1)
+    
+    def _apply_invalidation(self, data: bytes):
+        """Handle one message from the invalidation channel"""
+        try:
+            message = json.loads(data)
+        except ValueError:
+            return
+        if message.get("sender") == self._instance_id:
+            return
+        if message.get("clear"):
+            self._local.clear()
+            return
+        for key in message.get("keys") or []:
+            self._local.delete(key)
+    
+    def _invalidation_message(self, keys: Iterable[Any] = (), clear: bool = False) -> str:
+        """Payload announcing changed keys to the other workers"""
+        if clear:
+            return json.dumps({"sender": self._instance_id, "clear": True})
+        return json.dumps({"sender": self._instance_id, "keys": [_key_str(key) for key in keys]})
+    
     async def get(self, key: str) -> Optional[Any]:
-        """Get value from cache"""
+        """Get value from cache (L1, then Redis)"""
         if not self._redis:
             return None
         
+        if self._local is not None:
+            value = self._local.get(key, None)
+            if value is not None:
+                count_cache(key, "l1_hit")
+                return self._codec.decode(value.payload) if isinstance(value, _Encoded) else value
+        
         try:
-            value = await self._redis.get(key)
-            if value:
-                return json.loads(value)
+            started = time.perf_counter()
+            with span("redis.get", "redis", **{"cache.key": key}):
+                raw = await self._redis.get(key)
+            observe_cache("get", key, time.perf_counter() - started)
+            if raw:
+                value = self._codec.decode(raw)
+                self._stats["l2_hits"] += 1
+                count_cache(key, "l2_hit")
+                if self._local is not None:
+                    self._local.set(key, _l1_entry(value, raw), len(raw))
+                return value
+            self._stats["l2_misses"] += 1
+            count_cache(key, "miss")
+            return None
+        except CodecError:
+            # Written by a codec this worker can't read (e.g. mid-rollout): treat as a miss
+            self._stats["l2_misses"] += 1
+            count_cache(key, "miss")
             return None
         except Exception as e:
+            self._stats["l2_errors"] += 1
+            count_cache(key, "error")
             print(f"Redis GET error for key {key}: {e}")
             return None
     
-    async def set(self, key: str, value: Any, ttl: Optional[int] = None) -> bool:
-        """Set value in cache with optional TTL"""
+    async def set(
+        self,
+        key: str,
+        value: Any,
+        ttl: Optional[int] = None,
+        tags: Optional[Iterable[str]] = None
+    ) -> bool:
+        """Set value in cache with optional TTL and invalidation tags"""
         if not self._redis:
             return False
         
         try:
-            serialized_value = json.dumps(value, default=str)
-            if ttl:
-                await self._redis.setex(key, ttl, serialized_value)
-            else:
-                await self._redis.set(key, serialized_value)
+            serialized_value = self._codec.encode(value)
+            tags = list(tags or [])
+
+            # Value, tag registration and the L1 notice travel in one round trip
+            started = time.perf_counter()
+            with span("redis.set", "redis", **{"cache.key": key, "cache.bytes": len(serialized_value)}):
+                async with self._redis.pipeline(transaction=False) as pipe:
+                    if ttl:
+                        pipe.setex(key, ttl, serialized_value)
+                    else:
+                        pipe.set(key, serialized_value)
+                    if tags:
+                        pipe.eval(TAG_KEYS_SCRIPT, len(tags), *tags, key, ttl or 0)
+                    if self._local is not None:
+                        pipe.publish(settings.cache_invalidation_channel, self._invalidation_message([key]))
+                    await pipe.execute()
+            observe_cache("set", key, time.perf_counter() - started)
+
+            if self._local is not None:
+                self._local.set(key, _l1_entry(value, serialized_value), len(serialized_value), ttl)
             return True
         except Exception as e:
             print(f"Redis SET error for key {key}: {e}")
             return False
     
+    async def get_or_set(
+        self,
+        key: str,
+        loader: Callable[[], Awaitable[Any]],
+        ttl: Optional[int] = None,
+        tags: Optional[Iterable[str]] = None
+    ) -> Any:
+        """Return the cached value or load it once per process for all concurrent callers.
+        
+        The loader may outlive the caller that started it and serves every
+        coalesced caller, so it must not use request-scoped resources such as
+        the caller's database session: it opens its own.
+        """
+        value = await self.get(key)
+        if value is not None:
+            return value
+        
+        task = self._inflight.get(key)
+        coalesced = task is not None
+        if task is None:
+            task = asyncio.ensure_future(self._load(key, loader, ttl, tags))
+            self._inflight[key] = task
+        else:
+            self._stats["coalesced"] += 1
+        # A cancelled caller must not cancel the load other callers are waiting on
+        value = await asyncio.shield(task)
+        if coalesced and not isinstance(value, IMMUTABLE_TYPES):
+            # The caller that started the load keeps the loaded object, the others get copies
+            value = copy.deepcopy(value)
+        return value
+    
+    async def _load(self, key: str, loader: Callable[[], Awaitable[Any]], ttl: Optional[int], tags):
+        """Run a single-flight loader and cache its result"""
+        try:
+            self._stats["loads"] += 1
+            replica_read.set(False)
+            value = await loader()
+            if value is None:
+                return value
+            if replica_read.get() and await self.exists(get_recent_write_key()):
+                # A lagging replica could have missed the write: serve the value,
+                # but don't let it shadow the fresh data under the new version or tags
+                self._stats["replica_skips"] += 1
+                return value
+            await self.set(key, value, ttl, tags)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+    
     async def delete(self, key: str) -> bool:
         """Delete key from cache"""
+        if self._local is not None:
+            self._local.delete(key)
         if not self._redis:
             return False
         
         try:
-            result = await self._redis.delete(key)
+            async with self._redis.pipeline(transaction=False) as pipe:
+                pipe.delete(key)
+                if self._local is not None:
+                    pipe.publish(settings.cache_invalidation_channel, self._invalidation_message([key]))
+                result = (await pipe.execute())[0]
             return result > 0
         except Exception as e:
             print(f"Redis DELETE error for key {key}: {e}")
             return False
     
     async def delete_pattern(self, pattern: str) -> int:
-        """Delete all keys matching pattern"""
+        """Delete all keys matching pattern (incremental SCAN, for maintenance scripts)"""
+        if self._local is not None:
+            self._local.clear()
         if not self._redis:
             return 0
         
         try:
-            keys = await self._redis.keys(pattern)
-            if keys:
-                return await self._redis.delete(*keys)
-            return 0
+            deleted = 0
+            batch = []
+            async for key in self._redis.scan_iter(match=pattern, count=1000):
+                batch.append(key)
+                if len(batch) >= 1000:
+                    deleted += await self._redis.unlink(*batch)
+                    batch = []
+            if batch:
+                deleted += await self._redis.unlink(*batch)
+            if self._local is not None:
+                await self._redis.publish(
+                    settings.cache_invalidation_channel, self._invalidation_message(clear=True)
+                )
+            return deleted
         except Exception as e:
             print(f"Redis DELETE PATTERN error for pattern {pattern}: {e}")
             return 0
     
+    async def get_versions(self, keys: List[str]) -> Optional[List[int]]:
+        """Read data version counters (None when Redis is unavailable)"""
+        if not self._redis:
+            return None
+        
+        try:
+            with span("redis.versions", "redis", **{"cache.keys": len(keys)}):
+                versions = await self._redis.eval(VERSIONS_SCRIPT, len(keys), *keys, _now_ms())
+            return [int(version) for version in versions]
+        except Exception as e:
+            print(f"Redis VERSIONS error for keys {keys}: {e}")
+            return None
+    
+    async def invalidate_tags(
+        self,
+        tags: Iterable[str],
+        keys: Iterable[str] = (),
+        versions: Iterable[str] = (),
+        store: Optional[Mapping[str, Any]] = None,
+        store_ttl: Optional[int] = None,
+        recent_write_ttl: int = 0
+    ) -> int:
+        """Delete the given keys plus every key registered under the tags, bump version
+        counters and write `store` values through, all in one round trip.
+        
+        With `recent_write_ttl`, loads from replicas are not cached for that many
+        seconds, so a replica that hasn't replayed the write can't fill the cache.
+        """
+        if not self._redis:
+            return 0
+        
+        tags, keys, versions = list(dict.fromkeys(tags)), list(keys), list(versions)
+        store = dict(store or {})
+        payloads = {key: self._codec.encode(value) for key, value in store.items()}
+        channel = settings.cache_invalidation_channel if self._local is not None else ""
+        try:
+            # Only the unlink and tag results are read back; they go just before the publish,
+            # so a peer acting on the message can't refill L1 from keys not yet unlinked
+            with span("redis.invalidate_tags", "redis", **{"cache.tags": len(tags), "cache.keys": len(keys)}):
+                async with self._redis.pipeline(transaction=False) as pipe:
+                    if recent_write_ttl:
+                        pipe.set(get_recent_write_key(), _now_ms(), ex=recent_write_ttl)
+                    if versions:
+                        pipe.eval(BUMP_VERSIONS_SCRIPT, len(versions), *versions, _now_ms())
+                    for key, payload in payloads.items():
+                        if store_ttl:
+                            pipe.setex(key, store_ttl, payload)
+                        else:
+                            pipe.set(key, payload)
+                    if keys:
+                        pipe.unlink(*keys)
+                    if tags:
+                        pipe.eval(INVALIDATE_TAGS_SCRIPT, len(tags), *tags, channel, self._instance_id)
+                    published = bool(channel and (keys or store))
+                    if published:
+                        pipe.publish(channel, self._invalidation_message([*keys, *store]))
+                    results = await pipe.execute()
+            
+            if published:
+                results = results[:-1]
+            unlinked = results[-1 - bool(tags)] if keys else 0
+            removed = list(results[-1]) if tags else []
+            if self._local is not None:
+                for key in [*keys, *removed]:
+                    self._local.delete(_key_str(key))
+                for key, value in store.items():
+                    self._local.set(key, _l1_entry(value, payloads[key]), len(payloads[key]), store_ttl)
+            return unlinked + len(removed)
+        except Exception as e:
+            print(f"Redis INVALIDATE TAGS error for tags {tags}: {e}")
+            return 0
+    
     async def exists(self, key: str) -> bool:
         """Check if key exists in cache"""
         if not self._redis:
@@ -113,6 +444,30 @@ class RedisCache:
         except Exception as e:
             print(f"Redis TTL error for key {key}: {e}")
             return -1
+    
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Per-tier hit/miss/eviction counters"""
+        return {
+            "l1": self._local.stats() if self._local is not None else {},
+            "l2": {
+                "hits": self._stats["l2_hits"],
+                "misses": self._stats["l2_misses"],
+                "errors": self._stats["l2_errors"],
+            },
+            "single_flight": {
+                "loads": self._stats["loads"],
+                "coalesced": self._stats["coalesced"],
+                "replica_skips": self._stats["replica_skips"],
+            },
+        }
+
+def _now_ms() -> int:
+    """Wall clock in milliseconds, used to seed version counters"""
+    return int(time.time() * 1000)
+
+def _key_str(key: Any) -> str:
+    """Redis returns bytes keys, callers use str"""
+    return key.decode() if isinstance(key, bytes) else key
 
 # Global Redis cache instance
 redis_cache = RedisCache()
@@ -122,19 +477,127 @@ def get_expense_key(expense_id: int) -> str:
     """Generate cache key for expense by ID"""
     return f"expense:{expense_id}"
 
-def get_expenses_list_key() -> str:
-    """Generate cache key for all expenses list"""
-    return "expenses:all"
+def get_expenses_list_key(version: str, page: int, size: int) -> str:
+    """Generate cache key for one page of the all expenses list"""
+    return f"expenses:list:v{version}:p{page}:s{size}"
+
+def get_expenses_range_key(start_date: str, end_date: str, version: str, page: int, size: int) -> str:
+    """Generate cache key for one page of expenses by date range"""
+    return f"expenses:range:{start_date}:{end_date}:v{version}:p{page}:s{size}"
 
-def get_expenses_range_key(start_date: str, end_date: str) -> str:
-    """Generate cache key for expenses by date range"""
-    return f"expenses:range:{start_date}:{end_date}"
+def get_expenses_cursor_key(
+    version: str,
+    cursor: Optional[str],
+    size: int,
+    include_total: bool,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None
+) -> str:
+    """Generate cache key for one keyset page of expenses"""
+    scope = f"range:{start_date}:{end_date}" if start_date or end_date else "all"
+    return f"expenses:cursor:{scope}:v{version}:{cursor or 'first'}:s{size}:t{int(include_total)}"
 
-def get_expense_summary_key(start_date: str, end_date: str, category: Optional[str] = None) -> str:
+def get_expense_summary_key(
+    start_date: str,
+    end_date: str,
+    category: Optional[str] = None,
+    group_by: Optional[List[str]] = None
+) -> str:
     """Generate cache key for expense summary"""
+    key = f"expenses:summary:{start_date}:{end_date}"
     if category:
-        return f"expenses:summary:{start_date}:{end_date}:{category}"
-    return f"expenses:summary:{start_date}:{end_date}"
+        key = f"{key}:{category}"
+    if group_by:
+        key = f"{key}:by:{','.join(sorted(set(group_by)))}"
+    return key
+
+def get_upload_intent_key(intent_id: str) -> str:
+    """Key of a pending direct-to-S3 upload"""
+    return f"upload:intent:{intent_id}"
+
+def get_agent_tool_key(tool: str, version: str, digest: str) -> str:
+    """Generate cache key for an agent tool result (digest of the normalized arguments)"""
+    return f"agent:tool:{tool}:v{version}:{digest}"
+
+def get_recent_write_key() -> str:
+    """Present for the read-your-writes window after any expense write"""
+    return "expenses:recent_write"
+
+def get_client_write_key(client: str) -> str:
+    """Present for the read-your-writes window after a write by one client"""
+    return f"read_your_writes:{client}"
+
+def get_thumbnail_url_key(thumbnail_key: str) -> str:
+    """Key of the presigned download URL of a thumbnail"""
+    return f"upload:thumbnail:{thumbnail_key}"
+
+# Cache tag generators
+def _month_of(value: Any) -> str:
+    """Month bucket (YYYY-MM) of a date or ISO date string"""
+    return str(value)[:7]
+
+def _months_between(start_date: Any, end_date: Any) -> Optional[List[str]]:
+    """Month buckets covered by a date range, None if too wide or unparsable"""
+    try:
+        start = date.fromisoformat(str(start_date)[:10])
+        end = date.fromisoformat(str(end_date)[:10])
+    except ValueError:
+        return None
+    months = []
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        months.append(f"{year:04d}-{month:02d}")
+        if len(months) > MAX_TAGGED_MONTHS:
+            return None
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+def get_global_version_key() -> str:
+    """Data version bumped by every expense write"""
+    return "expenses:version"
+
+def get_month_version_key(month: str) -> str:
+    """Data version bumped by writes to one month"""
+    return f"expenses:version:month:{month}"
+
+def get_range_version_keys(start_date: Any, end_date: Any) -> List[str]:
+    """Version counters a cached range page depends on"""
+    months = _months_between(start_date, end_date)
+    if months is None:
+        return [get_global_version_key()]
+    return [get_month_version_key(month) for month in months]
+
+def get_write_version_keys(expenses: Iterable[Mapping[str, Any]]) -> List[str]:
+    """Version counters bumped by writing expenses with these (old or new) values"""
+    keys = [get_global_version_key()]
+    keys.extend(get_month_version_key(_month_of(expense["date"])) for expense in expenses)
+    return list(dict.fromkeys(keys))
+
+def get_wide_range_tag() -> str:
+    """Tag for cached ranges that can't be bucketed; every write invalidates it"""
+    return "tag:expenses:wide"
+
+def get_month_tag(month: str, category: Optional[str] = None) -> str:
+    """Tag for cached data depending on one month (optionally one category)"""
+    if category:
+        return f"tag:expenses:month:{month}:category:{category}"
+    return f"tag:expenses:month:{month}"
+
+def get_range_tags(start_date: Any, end_date: Any, category: Optional[str] = None) -> List[str]:
+    """Tags a cached range query depends on"""
+    months = _months_between(start_date, end_date)
+    if months is None:
+        return [get_wide_range_tag()]
+    return [get_month_tag(month, category) for month in months]
+
+def get_write_tags(expenses: Iterable[Mapping[str, Any]]) -> List[str]:
+    """Tags invalidated by writing expenses with these (old or new) values"""
+    tags = [get_wide_range_tag()]
+    for expense in expenses:
+        month = _month_of(expense["date"])
+        tags.append(get_month_tag(month))
+        tags.append(get_month_tag(month, expense["category"]))
+    return list(dict.fromkeys(tags))
 
 def get_expense_pattern_key() -> str:
     """Generate pattern for all expense-related cache keys"""
@@ -155,15 +618,7 @@ def cache_result(ttl: int = None, key_func: callable = None):
             else:
                 cache_key = f"{func.__name__}:{hash(str(args) + str(kwargs))}"
             
-            # Try to get from cache
-            cached_result = await redis_cache.get(cache_key)
-            if cached_result is not None:
-                return cached_result
-            
-            # Execute function and cache result
-            result = await func(*args, **kwargs)
-            await redis_cache.set(cache_key, result, ttl)
-            
-            return result
+            # Serve from cache, or execute once for all concurrent callers
+            return await redis_cache.get_or_set(cache_key, lambda: func(*args, **kwargs), ttl)
         return wrapper
     return decorator
@@ -0,0 +1,2 @@
+"""MCP server exposing the expense tools"""
+from app.mcp.server import mcp, mcp_app
@@ -0,0 +1,194 @@
+"""
+MCP server exposing the expense tools
+
+Tools call ExpenseService directly on pooled database sessions and share the
+REST routes' Redis cache; nothing loops back through the HTTP API. Remote
+clients use the streamable HTTP endpoint mounted at settings.mcp_path, the
+agent in this process talks to `mcp` in memory.
+"""
+import datetime
+import math
+from contextlib import asynccontextmanager
+from decimal import Decimal
+from typing import Annotated, AsyncIterator, List, Literal, Optional
+from fastmcp import FastMCP
+from fastmcp.exceptions import ToolError
+from fastmcp.server.dependencies import get_context, get_http_request
+from pydantic import Field
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.metrics import record_rate_limit_rejection
+from app.core.rate_limit import client_address, limiter
+from app.db.database import async_engine, client_wrote_recently, mark_client_write, read_router
+from app.db.redis_cache import redis_cache, get_expense_summary_key, get_expenses_cursor_key, get_range_tags
+from app.schemas.expense import ExpenseResponse, ExpenseSummary
+from app.services.expense_service import ExpenseService, render_cursor_page
+from config import settings
+
+mcp = FastMCP(
+    "Expense Tracker",
+    instructions=(
+        "Record and query personal expenses. Amounts are in the user's currency, "
+        "dates are ISO (YYYY-MM-DD). Page through lists with the returned next_cursor."
+    ),
+)
+
+PageSize = Annotated[int, Field(ge=1, le=settings.mcp_max_results, description="Expenses per page")]
+Cursor = Annotated[Optional[str], Field(description="next_cursor of the previous page; omit for the first page")]
+
+# Lets clients (e.g. the agent's tool cache) treat results as cacheable
+READ_ONLY = {"readOnlyHint": True}
+
+def mcp_client() -> Optional[str]:
+    """Read-your-writes identity of the client calling the current tool
+
+    Stateless HTTP opens a new MCP session per request, so remote clients are
+    keyed on the mcp-session-id they send, else on their address (as the rate
+    limiter sees it); in-process clients on their MCP session.
+    """
+    try:
+        request = get_http_request()
+    except RuntimeError:
+        request = None
+    if request is not None:
+        return f"mcp:{request.headers.get('mcp-session-id') or client_address(request)}"
+    try:
+        return f"mcp:{get_context().session_id}"
+    except RuntimeError:
+        return None
+
+@asynccontextmanager
+async def expense_service(write: bool = False) -> AsyncIterator[ExpenseService]:
+    """ExpenseService on a pooled session: the primary for writes, a replica for reads
+
+    A client's reads stay on the primary for a while after it wrote, like the
+    REST read-your-writes cookie; other clients keep reading the replicas.
+    """
+    if write:
+        session = AsyncSession(async_engine)
+    else:
+        client = mcp_client()
+        recent_write = client is not None and await client_wrote_recently(client)
+        session = await read_router.session(use_primary=recent_write)
+    async with session:
+        yield ExpenseService(session)
+
+async def check_rate_limit(tool: str):
+    """Count a write tool call against the remote client's limits (`rate_limit_routes[tool]`)
+
+    In-process calls come from agent turns, which are limited at the chat route.
+    """
+    try:
+        request = get_http_request()
+    except RuntimeError:
+        return
+    client = mcp_client()
+    if not settings.rate_limit_enabled or client is None:
+        return
+    limits = limiter.limits_for(tool)
+    allowed, _, retry_after = await limiter.hit(tool, client, limits)
+    if not allowed:
+        # Every MCP call shares the mount's path: label rejections by tool instead
+        record_rate_limit_rejection(request.scope, f"mcp:{tool}")
+        raise ToolError(
+            f"Rate limit exceeded: {'; '.join(limit.text for limit in limits)}; "
+            f"retry in {max(1, math.ceil(retry_after))}s"
+        )
+
+def checked(result):
+    """Service result, or a tool error the model can read"""
+    if isinstance(result, dict) and result.get("status") in ("error", "not_found"):
+        raise ToolError(result["message"])
+    return result
+
+async def cursor_page(
+    cursor: Optional[str],
+    size: int,
+    start_date: Optional[datetime.date] = None,
+    end_date: Optional[datetime.date] = None
+) -> str:
+    """One keyset page as JSON, from the same cache entries as the REST cursor routes"""
+    version = await ExpenseService.get_data_version(start_date, end_date)
+
+    async def load_page():
+        # The load may be shared with other callers, so it owns its session
+        async with expense_service() as service:
+            result = await service.get_expenses_page(cursor, size, start_date, end_date)
+        return render_cursor_page(checked(result))
+
+    if not version:
+        return await load_page()
+    cache_key = get_expenses_cursor_key(version, cursor, size, False, start_date, end_date)
+    return await redis_cache.get_or_set(cache_key, load_page, settings.cache_default_ttl)
+
+@mcp.tool
+async def add_expense(
+    date: datetime.date,
+    amount: Annotated[Decimal, Field(max_digits=10, decimal_places=2)],
+    category: str,
+    subcategory: str = "",
+    note: str = ""
+) -> ExpenseResponse:
+    """Record a new expense"""
+    await check_rate_limit("add_expense")
+    async with expense_service(write=True) as service:
+        created = checked(await service.create_expense(date, amount, category, subcategory, note))["expense"]
+        await service.invalidate_cache(created["id"], [created], write_through=created)
+    client = mcp_client()
+    if client is not None:
+        await mark_client_write(client)
+    return ExpenseResponse.model_validate(created)
+
+@mcp.tool(annotations=READ_ONLY)
+async def list_expenses(cursor: Cursor = None, size: PageSize = 20) -> str:
+    """List expenses, newest first, one page at a time"""
+    return await cursor_page(cursor, size)
+
+@mcp.tool(annotations=READ_ONLY)
+async def get_expenses_by_range(
+    start_date: datetime.date,
+    end_date: datetime.date,
+    cursor: Cursor = None,
+    size: PageSize = 20
+) -> str:
+    """List expenses between two dates (inclusive), newest first, one page at a time"""
+    return await cursor_page(cursor, size, start_date, end_date)
+
+@mcp.tool(annotations=READ_ONLY)
+async def summarize_expenses(
+    start_date: datetime.date,
+    end_date: datetime.date,
+    category: Optional[str] = None,
+    group_by: Optional[List[Literal["subcategory", "day", "week", "month"]]] = None
+) -> List[ExpenseSummary]:
+    """Total amount and count per category between two dates, optionally by subcategory and one of day, week or month"""
+    async def load_summary():
+        async with expense_service() as service:
+            return checked(await service.summarize_expenses(start_date, end_date, category, group_by))
+
+    rows = await redis_cache.get_or_set(
+        get_expense_summary_key(start_date, end_date, category, group_by),
+        load_summary,
+        settings.cache_summary_ttl,
+        tags=get_range_tags(start_date, end_date, category)
+    )
+    return [ExpenseSummary.model_validate(row) for row in rows]
+
+@mcp.tool(annotations=READ_ONLY)
+async def search_expenses(
+    text: Annotated[Optional[str], Field(description="Matched against note, category and subcategory")] = None,
+    category: Optional[str] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    start_date: Optional[datetime.date] = None,
+    end_date: Optional[datetime.date] = None,
+    limit: PageSize = 20
+) -> List[ExpenseResponse]:
+    """Find expenses by text, category, amount range and date range, newest first"""
+    async with expense_service() as service:
+        rows = checked(await service.search_expenses(
+            text, category, min_amount, max_amount, start_date, end_date, limit
+        ))
+    return [ExpenseResponse.model_validate(row) for row in rows]
+
+# Stateless JSON responses: any worker can answer any request, no SSE framing for plain calls
+mcp_app = mcp.http_app(path="/", stateless_http=True, json_response=True)
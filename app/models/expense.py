@@ -1,12 +1,24 @@
+import datetime
+from decimal import Decimal
+from sqlalchemy import Index
 from sqlmodel import Field
 from typing import Optional
 from app.models.base import BaseModel
 
 class Expense(BaseModel, table=True):
     """Expense model for the expense tracker"""
+    __table_args__ = (
+        # Backs ORDER BY date DESC, id DESC and keyset pagination seeks
+        Index("ix_expense_date_id", "date", "id"),
+        # Covering index for date-range aggregation by category
+        Index("ix_expense_date_category_amount", "date", "category", "amount"),
+        # Category-filtered range queries
+        Index("ix_expense_category_date", "category", "date"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
-    date: str = Field(index=True, description="Date of the expense")
-    amount: float = Field(index=True, description="Amount of the expense")
+    date: datetime.date = Field(index=True, description="Date of the expense")
+    amount: Decimal = Field(index=True, max_digits=10, decimal_places=2, description="Amount of the expense")
     category: str = Field(index=True, description="Category of the expense")
     subcategory: str = Field(default="", description="Subcategory of the expense")
     note: str = Field(default="", description="Additional notes about the expense")
@@ -0,0 +1,39 @@
+from typing import Optional
+from sqlalchemy import Index
+from sqlmodel import Field
+from app.models.base import BaseModel
+
+class ExpenseAttachment(BaseModel, table=True):
+    """An S3 object (e.g. a receipt) uploaded for an expense
+
+    Identical content is stored once: attachments with the same checksum
+    share one object (and its thumbnail).
+    """
+    __tablename__ = "expense_attachment"
+    __table_args__ = (
+        # Batched lookup of the attachments of a page of expenses
+        Index("ix_expense_attachment_expense_id_id", "expense_id", "id"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    expense_id: int = Field(foreign_key="expense.id", ondelete="CASCADE", description="Expense the object belongs to")
+    object_key: str = Field(max_length=512, index=True, description="S3 object key (shared by duplicates)")
+    filename: str = Field(max_length=255, description="Original file name")
+    content_type: str = Field(max_length=255, default="application/octet-stream", description="MIME type stored on the object")
+    size: int = Field(description="Object size in bytes")
+    etag: str = Field(max_length=128, default="", description="S3 ETag of the object")
+    checksum: Optional[str] = Field(default=None, max_length=64, index=True, description="SHA-256 of the content (hex), when verified")
+    thumbnail_key: Optional[str] = Field(default=None, max_length=512, description="S3 key of the rendered thumbnail")
+
+    class ConfigDict:
+        json_schema_extra = {
+            "example": {
+                "expense_id": 42,
+                "object_key": "receipts/42/3f0c9b1e4d5a4c2e9f6a7b8c9d0e1f2a.jpg",
+                "filename": "lunch.jpg",
+                "content_type": "image/jpeg",
+                "size": 184320,
+                "etag": "\"9b2cf535f27731c974343645a3985328\"",
+                "checksum": "9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08"
+            }
+        }
@@ -0,0 +1,24 @@
+import datetime
+from decimal import Decimal
+from sqlmodel import SQLModel, Field
+
+class ExpenseDailyRollup(SQLModel, table=True):
+    """Per-day, per-category totals maintained incrementally from Expense writes"""
+    __tablename__ = "expense_daily_rollup"
+
+    date: datetime.date = Field(primary_key=True, description="Date of the aggregated expenses")
+    category: str = Field(primary_key=True, description="Category of the aggregated expenses")
+    subcategory: str = Field(default="", primary_key=True, description="Subcategory of the aggregated expenses")
+    total: Decimal = Field(default=0, max_digits=14, decimal_places=2, description="Sum of expense amounts")
+    count: int = Field(default=0, description="Number of expenses")
+
+    class ConfigDict:
+        json_schema_extra = {
+            "example": {
+                "date": "2024-01-15",
+                "category": "Food & Dining",
+                "subcategory": "Lunch",
+                "total": 125.50,
+                "count": 4
+            }
+        }
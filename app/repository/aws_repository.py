@@ -1,21 +1,319 @@
+import asyncio
+import base64
+import hashlib
+from contextlib import AsyncExitStack
+from typing import Any, AsyncIterator, BinaryIO, Dict, List, Optional
 import aioboto3
+from aiobotocore.config import AioConfig
 from config import settings
-from typing import BinaryIO
+from app.core.tracing import span, traced
 
-async def upload_file_to_s3(file_obj: BinaryIO, bucket_name: str, object_name: str):
-    session = aioboto3.Session()
+# S3 rejects multipart parts smaller than this (except the last one)
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+class S3ClientManager:
+    """One long-lived S3 client (and connection pool) per worker, opened in the lifespan hook"""
+
+    def __init__(self):
+        self._stack: Optional[AsyncExitStack] = None
+        self._client = None
+
+    async def start(self):
+        """Open the shared client"""
+        if self._client is not None:
+            return
+        self._stack = AsyncExitStack()
+        self._client = await self._stack.enter_async_context(_create_client())
 
-    async with session.client(
+    async def stop(self):
+        """Close the shared client and its connections"""
+        if self._stack is not None:
+            await self._stack.aclose()
+        self._stack = self._client = None
+
+    @property
+    def client(self):
+        return self._client
+
+s3_client = S3ClientManager()
+
+
+def _create_client():
+    session = aioboto3.Session()
+    return session.client(
         "s3",
         aws_access_key_id=settings.aws_access_key_id.get_secret_value(),
         aws_secret_access_key=settings.aws_secret_access_key.get_secret_value(),
         region_name=settings.aws_region,
-    ) as s3:
-        
+        endpoint_url=settings.aws_s3_endpoint_url or None,
+        config=AioConfig(max_pool_connections=settings.s3_max_pool_connections),
+    )
+
+async def _client_context(stack: AsyncExitStack):
+    """The shared client, or a short-lived one outside the app (scripts)"""
+    if s3_client.client is not None:
+        return s3_client.client
+    return await stack.enter_async_context(_create_client())
+
+def object_url(bucket_name: str, object_name: str) -> str:
+    if settings.aws_s3_endpoint_url:
+        return f"{settings.aws_s3_endpoint_url.rstrip('/')}/{bucket_name}/{object_name}"
+    return f"https://{bucket_name}.s3.{settings.aws_region}.amazonaws.com/{object_name}"
+
+
+@traced("s3.upload_file", stage="s3")
+async def upload_file_to_s3(file_obj: BinaryIO, bucket_name: str, object_name: str):
+    async with AsyncExitStack() as stack:
+        s3 = await _client_context(stack)
+
         # Reset pointer to the start of the file/stream
         file_obj.seek(0)
-        
+
         # Upload directly from memory
         await s3.upload_fileobj(file_obj, bucket_name, object_name)
 
-        return f"https://{bucket_name}.s3.{settings.aws_region}.amazonaws.com/{object_name}"
\ No newline at end of file
+        return object_url(bucket_name, object_name)
+
+
+@traced("s3.stream_upload", stage="s3")
+async def stream_upload_to_s3(
+    chunks: AsyncIterator[bytes],
+    bucket_name: str,
+    object_name: str,
+    content_type: str = "application/octet-stream",
+    part_size: Optional[int] = None,
+    concurrency: Optional[int] = None,
+    max_bytes: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Upload a byte stream as an S3 multipart upload without buffering it whole
+
+    Chunks are collected into parts of `part_size` bytes and uploaded while the
+    stream is still being read, at most `concurrency` parts at a time, so memory
+    stays around (concurrency + 1) * part_size. Streams smaller than one part
+    are sent with a single PutObject. Returns the object's size, SHA-256 and URL.
+
+    Raises:
+        ValueError: if the stream is longer than `max_bytes`
+    """
+    part_size = max(part_size or settings.s3_part_size, MIN_PART_SIZE)
+    concurrency = concurrency or settings.s3_upload_concurrency
+    max_bytes = max_bytes or settings.s3_upload_max_bytes
+
+    digest = hashlib.sha256()
+    size = 0
+    buffer = bytearray()
+    upload_id = None
+    parts: Dict[int, str] = {}
+    tasks: List[asyncio.Task] = []
+    slots = asyncio.Semaphore(concurrency)
+
+    async with AsyncExitStack() as stack:
+        s3 = await _client_context(stack)
+
+        async def upload_part(number: int, body: bytes):
+            try:
+                with span("s3.upload_part", **{"s3.part": number, "s3.bytes": len(body)}):
+                    response = await s3.upload_part(
+                        Bucket=bucket_name, Key=object_name, UploadId=upload_id, PartNumber=number, Body=body
+                    )
+                parts[number] = response["ETag"]
+            finally:
+                slots.release()
+
+        async def flush_part(body: bytes):
+            nonlocal upload_id
+            if upload_id is None:
+                with span("s3.create_multipart_upload"):
+                    response = await s3.create_multipart_upload(
+                        Bucket=bucket_name, Key=object_name, ContentType=content_type
+                    )
+                upload_id = response["UploadId"]
+            # Waiting for a free slot is what bounds memory: the body is not read further meanwhile
+            await slots.acquire()
+            for task in tasks:
+                if task.done() and task.exception():
+                    slots.release()
+                    raise task.exception()
+            tasks.append(asyncio.create_task(upload_part(len(tasks) + 1, body)))
+
+        try:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > max_bytes:
+                    raise ValueError(f"Upload exceeds the {max_bytes} byte limit")
+                digest.update(chunk)
+                buffer += chunk
+                while len(buffer) >= part_size:
+                    body = bytes(buffer[:part_size])
+                    del buffer[:part_size]
+                    await flush_part(body)
+
+            if upload_id is None:
+                # Smaller than one part: a single request is cheaper than a multipart upload
+                await s3.put_object(Bucket=bucket_name, Key=object_name, Body=bytes(buffer), ContentType=content_type)
+            else:
+                if buffer:
+                    await flush_part(bytes(buffer))
+                buffer.clear()
+                await asyncio.gather(*tasks)
+                with span("s3.complete_multipart_upload", **{"s3.parts": len(parts)}):
+                    await s3.complete_multipart_upload(
+                        Bucket=bucket_name,
+                        Key=object_name,
+                        UploadId=upload_id,
+                        MultipartUpload={"Parts": [
+                            {"PartNumber": number, "ETag": parts[number]} for number in sorted(parts)
+                        ]},
+                    )
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if upload_id is not None:
+                # Don't leave orphaned parts behind (they are billed until aborted)
+                try:
+                    await s3.abort_multipart_upload(Bucket=bucket_name, Key=object_name, UploadId=upload_id)
+                except Exception:
+                    pass
+            raise
+
+    return {
+        "key": object_name,
+        "url": object_url(bucket_name, object_name),
+        "size": size,
+        "sha256": digest.hexdigest(),
+        "parts": len(parts) or 1,
+        "content_type": content_type,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Presigned (direct-to-S3) uploads
+# ---------------------------------------------------------------------------
+
+async def presign_upload(
+    bucket_name: str,
+    object_name: str,
+    content_type: str,
+    size: int,
+    expires_in: int,
+    sha256: Optional[str] = None
+) -> Dict[str, Any]:
+    """Presigned PUT URL and POST form for uploading one object in a single request
+
+    With `sha256` (hex), the PUT must carry that checksum and S3 rejects
+    content that doesn't match it.
+    """
+    params = {"Bucket": bucket_name, "Key": object_name, "ContentType": content_type}
+    put_headers = {"Content-Type": content_type}
+    if sha256:
+        params["ChecksumSHA256"] = put_headers["x-amz-checksum-sha256"] = base64.b64encode(bytes.fromhex(sha256)).decode()
+    async with AsyncExitStack() as stack:
+        s3 = await _client_context(stack)
+        put_url = await s3.generate_presigned_url("put_object", Params=params, ExpiresIn=expires_in)
+        # The POST policy also enforces the declared size and type on S3's side
+        post = await s3.generate_presigned_post(
+            bucket_name,
+            object_name,
+            Fields={"Content-Type": content_type},
+            Conditions=[{"Content-Type": content_type}, ["content-length-range", 1, size]],
+            ExpiresIn=expires_in,
+        )
+        return {"put_url": put_url, "put_headers": put_headers, "post": post}
+
+async def presign_multipart_upload(
+    bucket_name: str,
+    object_name: str,
+    content_type: str,
+    size: int,
+    part_size: int,
+    expires_in: int
+) -> Dict[str, Any]:
+    """Start a multipart upload and presign a PUT URL for each of its parts"""
+    # S3 allows at most 10,000 parts per upload
+    part_size = max(part_size, MIN_PART_SIZE, -(-size // 10000))
+    async with AsyncExitStack() as stack:
+        s3 = await _client_context(stack)
+        response = await s3.create_multipart_upload(Bucket=bucket_name, Key=object_name, ContentType=content_type)
+        upload_id = response["UploadId"]
+        parts = [
+            {
+                "part_number": number,
+                "url": await s3.generate_presigned_url(
+                    "upload_part",
+                    Params={"Bucket": bucket_name, "Key": object_name, "UploadId": upload_id, "PartNumber": number},
+                    ExpiresIn=expires_in,
+                ),
+            }
+            for number in range(1, -(-size // part_size) + 1)
+        ]
+        return {"upload_id": upload_id, "part_size": part_size, "parts": parts}
+
+async def complete_multipart_upload(bucket_name: str, object_name: str, upload_id: str, parts: List[Dict[str, Any]]):
+    """Assemble the parts a client uploaded with presigned URLs"""
+    async with AsyncExitStack() as stack:
+        s3 = await _client_context(stack)
+        with span("s3.complete_multipart_upload", **{"s3.parts": len(parts)}):
+            await s3.complete_multipart_upload(
+                Bucket=bucket_name,
+                Key=object_name,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": [
+                    {"PartNumber": part["part_number"], "ETag": part["etag"]}
+                    for part in sorted(parts, key=lambda part: part["part_number"])
+                ]},
+            )
+
+async def abort_multipart_upload(bucket_name: str, object_name: str, upload_id: str):
+    async with AsyncExitStack() as stack:
+        s3 = await _client_context(stack)
+        await s3.abort_multipart_upload(Bucket=bucket_name, Key=object_name, UploadId=upload_id)
+
+async def head_object(bucket_name: str, object_name: str) -> Optional[Dict[str, Any]]:
+    """Size, type, ETag and verified SHA-256 (hex, if any) of an object as stored in S3 (None if it doesn't exist)"""
+    async with AsyncExitStack() as stack:
+        s3 = await _client_context(stack)
+        try:
+            with span("s3.head_object"):
+                response = await s3.head_object(Bucket=bucket_name, Key=object_name, ChecksumMode="ENABLED")
+        except s3.exceptions.ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        checksum = response.get("ChecksumSHA256")
+        return {
+            "size": response["ContentLength"],
+            "content_type": response.get("ContentType") or "application/octet-stream",
+            "etag": response.get("ETag", ""),
+            # Full-object checksum only; multipart uploads carry a checksum of part checksums
+            "sha256": base64.b64decode(checksum).hex() if checksum and "-" not in checksum else None,
+        }
+
+async def delete_object(bucket_name: str, object_name: str):
+    async with AsyncExitStack() as stack:
+        s3 = await _client_context(stack)
+        await s3.delete_object(Bucket=bucket_name, Key=object_name)
+
+async def get_object_bytes(bucket_name: str, object_name: str) -> bytes:
+    async with AsyncExitStack() as stack:
+        s3 = await _client_context(stack)
+        with span("s3.get_object"):
+            response = await s3.get_object(Bucket=bucket_name, Key=object_name)
+            async with response["Body"] as body:
+                return await body.read()
+
+async def put_object_bytes(bucket_name: str, object_name: str, body: bytes, content_type: str, cache_control: str = ""):
+    async with AsyncExitStack() as stack:
+        s3 = await _client_context(stack)
+        extra = {"CacheControl": cache_control} if cache_control else {}
+        with span("s3.put_object"):
+            await s3.put_object(Bucket=bucket_name, Key=object_name, Body=body, ContentType=content_type, **extra)
+
+async def presign_download(bucket_name: str, object_name: str, expires_in: int) -> str:
+    async with AsyncExitStack() as stack:
+        s3 = await _client_context(stack)
+        return await s3.generate_presigned_url(
+            "get_object", Params={"Bucket": bucket_name, "Key": object_name}, ExpiresIn=expires_in
+        )
@@ -0,0 +1,98 @@
+"""
+Agent chat endpoints
+"""
+import asyncio
+import json
+import math
+from typing import Any, AsyncIterator, Dict
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from app.agents.limits import AgentBusy
+from app.agents.runtime import agent_runtime
+from app.core.rate_limit import limiter
+from app.schemas.agent import ChatRequest, ChatResponse
+
+router = APIRouter(prefix="/agent", tags=["agent"])
+
+def busy_error(exc: AgentBusy) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail=str(exc),
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))}
+    )
+
+@router.post("/chat", response_model=ChatResponse)
+@limiter.limit()
+async def chat(request: Request, chat_request: ChatRequest):
+    """Answer a message; pass the returned thread_id to continue the conversation"""
+    try:
+        return await agent_runtime.chat(chat_request.message, chat_request.thread_id)
+    except AgentBusy as e:
+        raise busy_error(e)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Agent unavailable: {str(e)}")
+
+def sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+async def wait_for_disconnect(request: Request):
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+async def stream_events(request: Request, thread_id: str, events: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[str]:
+    """SSE frames of an agent run; the run is cancelled as soon as the client goes away"""
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def produce():
+        try:
+            async for event in events:
+                await queue.put(event)
+        finally:
+            await queue.put(None)
+
+    producer = asyncio.create_task(produce())
+    disconnected = asyncio.create_task(wait_for_disconnect(request))
+    try:
+        yield sse("start", {"thread_id": thread_id})
+        while True:
+            next_event = asyncio.ensure_future(queue.get())
+            await asyncio.wait({next_event, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if not next_event.done():
+                next_event.cancel()
+                break  # client disconnected
+            event = next_event.result()
+            if event is None:
+                break
+            yield sse(event["event"], event["data"])
+    finally:
+        # Cancelling the producer aborts the in-flight model or tool call
+        for task in (producer, disconnected):
+            task.cancel()
+        await asyncio.gather(producer, disconnected, return_exceptions=True)
+
+@router.post("/chat/stream")
+@limiter.limit()
+async def chat_stream(request: Request, chat_request: ChatRequest):
+    """Answer a message as server-sent events: start, token, tool_start, tool_end, then done or error"""
+    try:
+        thread_id, events = await agent_runtime.open_stream(chat_request.message, chat_request.thread_id)
+    except AgentBusy as e:
+        raise busy_error(e)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Agent unavailable: {str(e)}")
+    return StreamingResponse(
+        stream_events(request, thread_id, events),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/tools")
+async def get_tools():
+    """Tools the agent can call"""
+    try:
+        agent = await agent_runtime.start()
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Agent unavailable: {str(e)}")
+    return await agent.get_available_tools()
@@ -1,11 +1,66 @@
 """
 API dependencies
 """
-from fastapi import Depends
+from contextlib import asynccontextmanager
+from typing import AsyncContextManager, Callable, Tuple
+from fastapi import Depends, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
+from app.services.attachment_service import AttachmentService
 from app.services.expense_service import ExpenseService
-from app.db.database import get_async_session
+from app.db.database import (
+    get_async_session,
+    get_read_async_session,
+    mark_recent_write,
+    primary_session,
+    read_session,
+    wrote_recently,
+)
 
-async def get_expense_service(db: AsyncSession = Depends(get_async_session)) -> ExpenseService:
-    """Get expense service instance with database session"""
+# Opens an ExpenseService on its own read session
+ExpenseServiceOpener = Callable[[], AsyncContextManager[ExpenseService]]
+# Opens attachment and expense services sharing one primary session
+AttachmentServicesOpener = Callable[[], AsyncContextManager[Tuple[AttachmentService, ExpenseService]]]
+
+async def get_expense_service(
+    response: Response,
+    db: AsyncSession = Depends(get_async_session)
+) -> ExpenseService:
+    """Get expense service instance on the primary, for routes that write"""
+    mark_recent_write(response)
+    return ExpenseService(db)
+
+async def get_read_expense_service(db: AsyncSession = Depends(get_read_async_session)) -> ExpenseService:
+    """Get expense service instance on a read replica, for routes that only read"""
     return ExpenseService(db)
+
+async def get_read_expense_opener(request: Request) -> ExpenseServiceOpener:
+    """Open read ExpenseServices on demand, for cache loaders shared across requests"""
+    use_primary = wrote_recently(request)
+
+    @asynccontextmanager
+    async def open_service():
+        async with read_session(use_primary=use_primary) as session:
+            yield ExpenseService(session)
+    return open_service
+
+async def get_attachment_service(
+    response: Response,
+    db: AsyncSession = Depends(get_async_session)
+) -> AttachmentService:
+    """Get attachment service instance on the primary"""
+    mark_recent_write(response)
+    return AttachmentService(db)
+
+async def get_attachment_opener(response: Response) -> AttachmentServicesOpener:
+    """Open primary attachment services on demand, for routes that write only with some parameters"""
+
+    @asynccontextmanager
+    async def open_services():
+        mark_recent_write(response)
+        async with primary_session() as session:
+            yield AttachmentService(session), ExpenseService(session)
+    return open_services
+
+async def get_read_attachment_service(db: AsyncSession = Depends(get_read_async_session)) -> AttachmentService:
+    """Get attachment service instance on a read replica"""
+    return AttachmentService(db)
@@ -1,186 +1,398 @@
 """
 Expense API endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException, Request
-from typing import List, Optional
-from slowapi import Limiter
-from slowapi.util import get_remote_address
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+import json
+from datetime import date
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from pydantic import ValidationError
 from fastapi_pagination import Page, Params
 from fastapi_pagination.ext.sqlmodel import paginate as apaginate
-from app.schemas.expense import ExpenseCreate, ExpenseResponse, ExpenseSummary
-from app.services.expense_service import ExpenseService
-from app.routes.dependencies import get_expense_service
+from app.schemas.expense import (
+    BulkExpenseResult,
+    ExpenseCreate,
+    ExpenseCursorPage,
+    ExpenseResponse,
+    ExpenseSummary,
+)
+from app.services.expense_service import ExpenseService, render_cursor_page
+from app.services.export_service import EXPORT_FORMATS, export_expenses as stream_export, export_format_available
+from app.routes.dependencies import ExpenseServiceOpener, get_expense_service, get_read_expense_opener
 from app.models.expense import Expense
+from app.core.logging import get_logger
+from app.core.rate_limit import limiter
+from app.core.timing import StageTimer
+from app.core.tracing import span
 from config import settings
 from app.db.redis_cache import (
     redis_cache, 
     get_expense_key, 
     get_expense_summary_key,
+    get_expenses_cursor_key,
+    get_expenses_list_key,
+    get_expenses_range_key,
+    get_range_tags,
 )
 
-# Create limiter instance
-limiter = Limiter(key_func=get_remote_address)
-
 router = APIRouter(prefix="/expenses", tags=["expenses"])
 
+logger = get_logger(__name__)
+
 @router.post("/", response_model=ExpenseResponse)
-@limiter.limit("4/minute")
+@limiter.limit()
 async def create_expense(
     request: Request,
     expense: ExpenseCreate, 
     service: ExpenseService = Depends(get_expense_service)
 ):
     """Create a new expense"""
+    timer = StageTimer()
     try:
-        result = await service.create_expense(
-            date=expense.date,
-            amount=expense.amount,
-            category=expense.category,
-            subcategory=expense.subcategory,
-            note=expense.note
-        )
+        with timer.stage("db"):
+            result = await service.create_expense(
+                date=expense.date,
+                amount=expense.amount,
+                category=expense.category,
+                subcategory=expense.subcategory,
+                note=expense.note
+            )
         
         if result["status"] == "error":
             raise HTTPException(status_code=400, detail=result["message"])
         
-        # Get the created expense
-        from sqlmodel import select
-        from app.models.expense import Expense
-        statement = select(Expense).where(Expense.id == result["id"])
-        result_query = await service.db.execute(statement)
-        expense_obj = result_query.scalar_one_or_none()
-        if not expense_obj:
-            raise HTTPException(status_code=404, detail="Expense not found")
+        # Write the new expense through and invalidate what it affects, in one round trip
+        created = result["expense"]
+        with timer.stage("cache"):
+            await service.invalidate_cache(created["id"], [created], write_through=created)
         
-        # Invalidate cache after creating new expense
-        await service.invalidate_cache()
-        
-        return expense_obj
+        logger.info("expense_write", operation="create", expense_id=created["id"], **timer.as_log_fields())
+        return created
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/jsonl", "application/ndjson")
+
+class BulkPayloadTooLarge(ValueError):
+    """A JSON array body or NDJSON line over its size limit"""
+
+async def read_json_body(request: Request) -> bytes:
+    """The whole body, refused once it passes bulk_max_json_bytes"""
+    limit = settings.bulk_max_json_bytes
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > limit:
+        raise BulkPayloadTooLarge(f"JSON array bodies are limited to {limit} bytes, send NDJSON instead")
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > limit:
+            raise BulkPayloadTooLarge(f"JSON array bodies are limited to {limit} bytes, send NDJSON instead")
+    return bytes(body)
+
+async def read_bulk_rows(request: Request) -> AsyncIterator[Tuple[int, Any]]:
+    """Yield (index, decoded row) from a JSON array body or an NDJSON stream
+
+    Only NDJSON is decoded as it arrives; a JSON array is parsed once fully
+    received, so its body is capped at bulk_max_json_bytes.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type not in NDJSON_CONTENT_TYPES:
+        rows = json.loads(await read_json_body(request))
+        if not isinstance(rows, list):
+            raise ValueError("Expected a JSON array of expenses")
+        for index, row in enumerate(rows):
+            yield index, row
+        return
+    
+    # NDJSON: decode rows as they arrive instead of buffering the whole body
+    limit = settings.bulk_max_line_bytes
+    index, buffer = 0, b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if len(line) > limit:
+                raise BulkPayloadTooLarge(f"Row {index} is longer than {limit} bytes")
+            if line.strip():
+                yield index, line
+                index += 1
+        if len(buffer) > limit:
+            # A line that long can't be valid; don't keep buffering it
+            raise BulkPayloadTooLarge(f"Row {index} is longer than {limit} bytes")
+    if buffer.strip():
+        yield index, buffer
+
+async def validate_bulk_rows(
+    rows: AsyncIterator[Tuple[int, Any]],
+    errors: List[Dict[str, Any]]
+) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+    """Validate rows one at a time, recording failures instead of aborting"""
+    async for index, row in rows:
+        if index >= settings.bulk_max_rows:
+            errors.append({"index": index, "message": f"Batch limit of {settings.bulk_max_rows} rows exceeded"})
+            return
+        try:
+            if isinstance(row, bytes):
+                expense = ExpenseCreate.model_validate_json(row)
+            else:
+                expense = ExpenseCreate.model_validate(row)
+        except ValidationError as e:
+            errors.append({"index": index, "message": "; ".join(
+                f"{'.'.join(map(str, error['loc'])) or 'row'}: {error['msg']}" for error in e.errors()
+            )})
+            continue
+        yield index, expense.model_dump()
+
+async def cached_json_response(cache_key: Optional[str], loader) -> Response:
+    """Serve a pre-rendered JSON body from cache, skipping the query and re-validation"""
+    if cache_key is None:
+        content = await loader()
+    else:
+        content = await redis_cache.get_or_set(cache_key, loader, settings.cache_default_ttl)
+    return Response(content=content, media_type="application/json")
+
+@router.post("/bulk", response_model=BulkExpenseResult)
+@limiter.limit()
+async def bulk_create_expenses(
+    request: Request,
+    chunk_size: Optional[int] = Query(default=None, ge=1, le=10000),
+    service: ExpenseService = Depends(get_expense_service)
+):
+    """Bulk-create expenses from a JSON array or an NDJSON stream
+    
+    Chunks are committed as they arrive: if the payload turns out to be invalid
+    halfway, the error detail reports how many rows were already inserted.
+    Only NDJSON is streamed; JSON arrays are limited to bulk_max_json_bytes.
+    """
+    errors: List[Dict[str, Any]] = []
+    result: Dict[str, Any] = {"inserted": 0, "errors": [], "touched": []}
+    try:
+        rows = validate_bulk_rows(read_bulk_rows(request), errors)
+        await service.bulk_create_expenses(rows, chunk_size or settings.bulk_insert_chunk_size, result)
+    except BulkPayloadTooLarge as e:
+        raise HTTPException(status_code=413, detail={"message": str(e), "inserted": result["inserted"]})
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail={"message": f"Invalid bulk payload: {str(e)}", "inserted": result["inserted"]}
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail={"message": str(e), "inserted": result["inserted"]})
+    finally:
+        # One targeted invalidation for every chunk committed, even if the request failed
+        if result["touched"]:
+            await service.invalidate_cache(touched=result["touched"])
+    
+    errors = sorted(errors + result["errors"], key=lambda error: error["index"])
+    return {"inserted": result["inserted"], "failed": len(errors), "errors": errors}
+
 @router.get("/", response_model=Page[ExpenseResponse])
-@limiter.limit("4/minute")
+@limiter.limit()
 async def get_all_expenses(
     request: Request,
     params: Params = Depends(),
-    service: ExpenseService = Depends(get_expense_service)
+    open_service: ExpenseServiceOpener = Depends(get_read_expense_opener)
 ):
     """Get all expenses with pagination and caching"""
     try:
-        # Get paginated results directly from database
-        # Note: Caching paginated results requires cache key to include page/size params
-        statement = service.get_all_expenses_query()
-        result = await apaginate(service.db, statement, params)
+        # Writes bump the data version, so stale pages are simply never looked up again
+        version = await ExpenseService.get_data_version()
+        cache_key = get_expenses_list_key(version, params.page, params.size) if version else None
         
-        if isinstance(result, dict) and result.get("status") == "error":
-            raise HTTPException(status_code=400, detail=result["message"])
+        async def load_page():
+            async with open_service() as service:
+                statement = service.get_all_expenses_query()
+                # Attachments of the whole page come from one extra query
+                result = await apaginate(service.db, statement, params, transformer=service.with_attachments)
+            with span("serialize", "serialize"):
+                return result.model_dump_json()
         
-        return result
+        return await cached_json_response(cache_key, load_page)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/range/", response_model=Page[ExpenseResponse])
-@limiter.limit("4/minute")
+@limiter.limit()
 async def get_expenses_by_date_range(
     request: Request,
-    start_date: str,
-    end_date: str,
+    start_date: date,
+    end_date: date,
     params: Params = Depends(),
-    service: ExpenseService = Depends(get_expense_service)
+    open_service: ExpenseServiceOpener = Depends(get_read_expense_opener)
 ):
-    """Get expenses within a date range with pagination"""
+    """Get expenses within a date range with pagination and caching"""
     try:
-        # Get paginated results directly from database
-        statement = service.get_expenses_by_date_range_query(start_date, end_date)
-        result = await apaginate(service.db, statement, params)
+        # Versioned by the month buckets the range covers
+        version = await ExpenseService.get_data_version(start_date, end_date)
+        cache_key = None
+        if version:
+            cache_key = get_expenses_range_key(start_date, end_date, version, params.page, params.size)
         
-        if isinstance(result, dict) and result.get("status") == "error":
-            raise HTTPException(status_code=400, detail=result["message"])
+        async def load_page():
+            async with open_service() as service:
+                statement = service.get_expenses_by_date_range_query(start_date, end_date)
+                result = await apaginate(service.db, statement, params, transformer=service.with_attachments)
+            with span("serialize", "serialize"):
+                return result.model_dump_json()
         
-        return result
+        return await cached_json_response(cache_key, load_page)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/summary/", response_model=List[ExpenseSummary])
-@limiter.limit("4/minute")
-async def get_expense_summary(
+@router.get("/cursor/", response_model=ExpenseCursorPage)
+@limiter.limit()
+async def get_expenses_by_cursor(
     request: Request,
-    start_date: str,
-    end_date: str,
-    category: Optional[str] = None,
-    service: ExpenseService = Depends(get_expense_service)
+    cursor: Optional[str] = None,
+    size: int = Query(default=50, ge=1, le=100),
+    include_total: bool = False,
+    open_service: ExpenseServiceOpener = Depends(get_read_expense_opener)
 ):
-    """Get expense summary by category with caching"""
+    """Get all expenses with keyset (cursor) pagination; deep pages cost the same as the first"""
     try:
-        # Try to get from cache first
-        cache_key = get_expense_summary_key(start_date, end_date, category)
-        cached_result = await redis_cache.get(cache_key)
+        version = await ExpenseService.get_data_version()
+        cache_key = get_expenses_cursor_key(version, cursor, size, include_total) if version else None
         
-        if cached_result is not None:
-            return cached_result
+        async def load_page():
+            async with open_service() as service:
+                result = await service.get_expenses_page(cursor, size, include_total=include_total)
+            if result.get("status") == "error":
+                raise HTTPException(status_code=400, detail=result["message"])
+            return render_cursor_page(result)
         
-        # If not in cache, get from database
-        result = await service.summarize_expenses(start_date, end_date, category)
+        return await cached_json_response(cache_key, load_page)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/range/cursor/", response_model=ExpenseCursorPage)
+@limiter.limit()
+async def get_expenses_by_date_range_cursor(
+    request: Request,
+    start_date: date,
+    end_date: date,
+    cursor: Optional[str] = None,
+    size: int = Query(default=50, ge=1, le=100),
+    include_total: bool = False,
+    open_service: ExpenseServiceOpener = Depends(get_read_expense_opener)
+):
+    """Get expenses within a date range with keyset (cursor) pagination"""
+    try:
+        version = await ExpenseService.get_data_version(start_date, end_date)
+        cache_key = None
+        if version:
+            cache_key = get_expenses_cursor_key(version, cursor, size, include_total, start_date, end_date)
         
-        if isinstance(result, dict) and result.get("status") == "error":
-            raise HTTPException(status_code=400, detail=result["message"])
+        async def load_page():
+            async with open_service() as service:
+                result = await service.get_expenses_page(cursor, size, start_date, end_date, include_total)
+            if result.get("status") == "error":
+                raise HTTPException(status_code=400, detail=result["message"])
+            return render_cursor_page(result)
         
-        # Cache the result
-        await redis_cache.set(cache_key, result, settings.cache_summary_ttl)
+        return await cached_json_response(cache_key, load_page)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/export")
+@limiter.limit()
+async def export_expenses(
+    request: Request,
+    format: str = Query(default="csv", pattern="^(csv|ndjson|parquet)$"),
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None
+):
+    """Stream expenses as CSV, NDJSON or Parquet without materializing the result"""
+    if not export_format_available(format):
+        raise HTTPException(status_code=400, detail=f"Export format {format} is not available")
+    
+    media_type, extension = EXPORT_FORMATS[format]
+    return StreamingResponse(
+        stream_export(format, start_date, end_date, settings.export_batch_size),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="expenses.{extension}"'}
+    )
+
+@router.get("/summary/", response_model=List[ExpenseSummary], response_model_exclude_none=True)
+@limiter.limit()
+async def get_expense_summary(
+    request: Request,
+    start_date: date,
+    end_date: date,
+    category: Optional[str] = None,
+    group_by: Optional[List[str]] = Query(
+        default=None,
+        description="Extra grouping dimensions: subcategory and one of day, week or month"
+    ),
+    open_service: ExpenseServiceOpener = Depends(get_read_expense_opener)
+):
+    """Get expense summary by category with caching"""
+    try:
+        async def load_summary():
+            # Aggregate in the database
+            async with open_service() as service:
+                result = await service.summarize_expenses(start_date, end_date, category, group_by)
+            if isinstance(result, dict) and result.get("status") == "error":
+                raise HTTPException(status_code=400, detail=result["message"])
+            return result
         
-        return result
+        # Serve from cache; concurrent misses share one query, tagged by the
+        # month (and category) buckets the summary covers
+        return await redis_cache.get_or_set(
+            get_expense_summary_key(start_date, end_date, category, group_by),
+            load_summary,
+            settings.cache_summary_ttl,
+            tags=get_range_tags(start_date, end_date, category)
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/{expense_id}", response_model=ExpenseResponse)
-@limiter.limit("4/minute")
+@limiter.limit()
 async def get_expense(
     request: Request,
     expense_id: int, 
-    service: ExpenseService = Depends(get_expense_service)
+    open_service: ExpenseServiceOpener = Depends(get_read_expense_opener)
 ):
     """Get a specific expense by ID with caching"""
     try:
-        # Try to get from cache first
-        cache_key = get_expense_key(expense_id)
-        cached_result = await redis_cache.get(cache_key)
-        
-        if cached_result is not None:
-            return cached_result
-        
-        # If not in cache, get from database
-        from sqlmodel import select
-        statement = select(Expense).where(Expense.id == expense_id)
-        result = await service.db.execute(statement)
-        expense = result.scalar_one_or_none()
+        async def load_expense():
+            # If not in cache, get from database
+            from sqlmodel import select
+            async with open_service() as service:
+                statement = select(Expense).where(Expense.id == expense_id)
+                result = await service.db.execute(statement)
+                expense = result.scalar_one_or_none()
+                
+                if not expense:
+                    raise HTTPException(status_code=404, detail="Expense not found")
+                
+                # Convert to dict (with attachments) for caching
+                return (await service.with_attachments([expense]))[0]
         
-        if not expense:
-            raise HTTPException(status_code=404, detail="Expense not found")
-        
-        # Convert to dict for caching
-        expense_dict = {
-            "id": expense.id,
-            "date": expense.date,
-            "amount": expense.amount,
-            "category": expense.category,
-            "subcategory": expense.subcategory,
-            "note": expense.note
-        }
-        
-        # Cache the result
-        await redis_cache.set(cache_key, expense_dict, settings.cache_expense_ttl)
-        
-        return expense_dict
+        return await redis_cache.get_or_set(
+            get_expense_key(expense_id),
+            load_expense,
+            settings.cache_expense_ttl
+        )
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.put("/{expense_id}", response_model=ExpenseResponse)
-@limiter.limit("4/minute")
+@limiter.limit()
 async def update_expense(
     request: Request,
     expense_id: int,
@@ -188,48 +400,50 @@ async def update_expense(
     service: ExpenseService = Depends(get_expense_service)
 ):
     """Update an existing expense"""
-    from sqlmodel import select
-    statement = select(Expense).where(Expense.id == expense_id)
-    result = await service.db.execute(statement)
-    db_expense = result.scalar_one_or_none()
-    if not db_expense:
-        raise HTTPException(status_code=404, detail="Expense not found")
-    
-    # Update fields
-    db_expense.date = expense.date
-    db_expense.amount = expense.amount
-    db_expense.category = expense.category
-    db_expense.subcategory = expense.subcategory
-    db_expense.note = expense.note
+    timer = StageTimer()
+    with timer.stage("db"):
+        result = await service.update_expense(
+            expense_id,
+            date=expense.date,
+            amount=expense.amount,
+            category=expense.category,
+            subcategory=expense.subcategory,
+            note=expense.note
+        )
     
-    service.db.add(db_expense)
-    await service.db.commit()
-    await service.db.refresh(db_expense)
+    if result["status"] == "not_found":
+        raise HTTPException(status_code=404, detail="Expense not found")
+    if result["status"] == "error":
+        raise HTTPException(status_code=400, detail=result["message"])
     
-    # Invalidate cache after updating expense
-    await service.invalidate_cache()
+    # Entries depending on either the old or the new values are invalidated
+    updated = result["expense"]
+    with timer.stage("cache"):
+        await service.invalidate_cache(expense_id, [result["old"], updated], write_through=updated)
     
-    return db_expense
+    logger.info("expense_write", operation="update", expense_id=expense_id, **timer.as_log_fields())
+    return updated
 
 @router.delete("/{expense_id}")
-@limiter.limit("4/minute")
+@limiter.limit()
 async def delete_expense(
     request: Request,
     expense_id: int, 
     service: ExpenseService = Depends(get_expense_service)
 ):
     """Delete an expense"""
-    from sqlmodel import select
-    statement = select(Expense).where(Expense.id == expense_id)
-    result = await service.db.execute(statement)
-    expense = result.scalar_one_or_none()
-    if not expense:
-        raise HTTPException(status_code=404, detail="Expense not found")
+    timer = StageTimer()
+    with timer.stage("db"):
+        result = await service.delete_expense(expense_id)
     
-    await service.db.delete(expense)
-    await service.db.commit()
+    if result["status"] == "not_found":
+        raise HTTPException(status_code=404, detail="Expense not found")
+    if result["status"] == "error":
+        raise HTTPException(status_code=400, detail=result["message"])
     
-    # Invalidate cache after deleting expense
-    await service.invalidate_cache()
+    # Invalidate entries depending on the deleted expense
+    with timer.stage("cache"):
+        await service.invalidate_cache(expense_id, [result["old"]])
     
+    logger.info("expense_write", operation="delete", expense_id=expense_id, **timer.as_log_fields())
     return {"message": "Expense deleted successfully"}
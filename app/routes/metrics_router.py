@@ -0,0 +1,66 @@
+"""
+Runtime metrics endpoints
+"""
+import hmac
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException, Query, Request
+from app.agents.runtime import agent_runtime
+from app.agents.tool_cache import tool_cache
+from app.core import tracing
+from app.core.rate_limit import client_address, is_trusted, trusted_networks
+from app.db.database import read_router
+from app.db.pool_metrics import pool_stats
+from app.db.redis_cache import redis_cache
+from app.services.thumbnail_service import thumbnail_worker
+from config import settings
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+async def require_scrape_access(request: Request, authorization: Optional[str] = Header(default=None)):
+    """Let only scrapers read the Prometheus endpoint: METRICS_TOKEN or METRICS_ALLOWED_NETWORKS"""
+    token = settings.metrics_token.get_secret_value()
+    if token and authorization and hmac.compare_digest(authorization.encode(), f"Bearer {token}".encode()):
+        return
+    if is_trusted(client_address(request), trusted_networks(tuple(settings.metrics_allowed_networks))):
+        return
+    raise HTTPException(status_code=403, detail="Forbidden")
+
+@router.get("/cache")
+async def get_cache_metrics():
+    """Per-tier cache counters for this worker"""
+    return redis_cache.stats()
+
+@router.get("/db-pool")
+async def get_db_pool_metrics():
+    """Connection pool occupancy and checkout waits for this worker"""
+    return {
+        "pools": pool_stats(),
+        "healthy_replicas": read_router.healthy_replicas(),
+    }
+
+@router.get("/thumbnails")
+async def get_thumbnail_metrics():
+    """Thumbnail worker queue and counters for this worker"""
+    return thumbnail_worker.stats()
+
+@router.get("/agent")
+async def get_agent_metrics():
+    """Agent runtime state and model-call concurrency for this worker"""
+    return agent_runtime.stats()
+
+@router.get("/agent-tools")
+async def get_agent_tool_metrics():
+    """Per-tool hit rate and saved latency of the agent's tool-result cache in this worker"""
+    return tool_cache.stats()
+
+@router.get("/traces")
+async def get_recent_traces(
+    limit: int = Query(default=100, ge=1, le=1000),
+    trace_id: Optional[str] = None
+):
+    """Most recent sampled spans held by the in-memory trace exporter (TRACING_TRACES_ENDPOINT)"""
+    if not settings.tracing_traces_endpoint:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not isinstance(tracing.exporter, tracing.InMemoryExporter):
+        raise HTTPException(status_code=404, detail="In-memory trace exporter is not enabled")
+    return tracing.exporter.recent(limit, trace_id)
@@ -1,29 +1,264 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, RedirectResponse
+import asyncio
+import hashlib
 import uuid
+from contextlib import nullcontext
+from typing import Any, BinaryIO, Dict, Optional
 from config import settings
-from app.repository.aws_repository import upload_file_to_s3
+from app.db.redis_cache import redis_cache, get_thumbnail_url_key
+from app.repository.aws_repository import presign_download, stream_upload_to_s3, upload_file_to_s3
+from app.routes.dependencies import (
+    AttachmentServicesOpener,
+    get_attachment_opener,
+    get_attachment_service,
+    get_expense_service,
+    get_read_attachment_service,
+)
+from app.schemas.attachment import AttachmentResponse, UploadComplete, UploadIntentCreate, UploadIntentResponse
+from app.services.attachment_service import AttachmentService, attachment_object_key
+from app.services.expense_service import ExpenseService
+from app.services.thumbnail_service import can_thumbnail, thumbnail_worker
 
 router = APIRouter(tags=["Upload"])
 
+# Service status -> HTTP status for failed attachment operations
+STATUS_CODES = {"not_found": 404, "unavailable": 503}
+
+def s3_object_name(filename: str) -> str:
+    """Unique object name keeping the original extension"""
+    file_extension = filename.split(".")[-1]
+    return f"{uuid.uuid4()}.{file_extension}"
+
+def file_sha256(file_obj: BinaryIO) -> str:
+    """SHA-256 of a (spooled) file, leaving it rewound"""
+    digest = hashlib.sha256()
+    file_obj.seek(0)
+    for chunk in iter(lambda: file_obj.read(1024 * 1024), b""):
+        digest.update(chunk)
+    file_obj.seek(0)
+    return digest.hexdigest()
+
+async def get_upload_target(service: AttachmentService, expense_id: Optional[int]) -> Optional[Dict[str, Any]]:
+    """Expense an upload is attached to, checked before any byte goes to S3"""
+    if expense_id is None:
+        return None
+    expense = await service.get_expense_values(expense_id)
+    if expense is None:
+        raise HTTPException(status_code=404, detail="Expense not found")
+    return expense
+
+def upload_services(open_services: AttachmentServicesOpener, expense_id: Optional[int]):
+    """Primary services for an upload attached to an expense; none (and no cookie) otherwise"""
+    return open_services() if expense_id is not None else nullcontext((None, None))
+
+async def attach_upload(
+    service: AttachmentService,
+    expenses: ExpenseService,
+    expense: Dict[str, Any],
+    **attachment: Any
+) -> Dict[str, Any]:
+    """Record an uploaded object against the expense and invalidate its cached pages"""
+    result = await service.record_attachment(expense, **attachment)
+    if result["status"] != "success":
+        raise HTTPException(status_code=STATUS_CODES.get(result["status"], 400), detail=result["message"])
+    await expenses.invalidate_cache(expense["id"], [expense])
+    return result["attachment"]
+
 @router.post("/upload_files")
-async def upload_file(file: UploadFile = File(...)):
-    try:
-        # 1. Generate unique filename
-        file_extension = file.filename.split(".")[-1]
-        s3_file_name = f"{uuid.uuid4()}.{file_extension}"
-        
-        
-        # 2. Upload to S3
-        s3_object_details = await upload_file_to_s3(
-            file_obj=file.file, 
-            bucket_name=settings.aws_s3_bucket_name,
-            object_name=s3_file_name
-        )
+async def upload_file(
+    file: UploadFile = File(...),
+    expense_id: Optional[int] = Query(default=None, description="Attach the file to this expense"),
+    open_services: AttachmentServicesOpener = Depends(get_attachment_opener)
+):
+    async with upload_services(open_services, expense_id) as (service, expenses):
+        expense = await get_upload_target(service, expense_id)
+        try:
+            # 1. Generate unique filename
+            if expense is None:
+                s3_file_name = s3_object_name(file.filename)
+            else:
+                s3_file_name = attachment_object_key(expense["id"], uuid.uuid4().hex, file.filename)
 
-        return {
+
+            # 2. Upload to S3
+            s3_object_details = await upload_file_to_s3(
+                file_obj=file.file,
+                bucket_name=settings.aws_s3_bucket_name,
+                object_name=s3_file_name
+            )
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+
+        response = {
             "message": "File uploaded successfully",
             "s3_object": s3_object_details
         }
+        if expense is not None:
+            response["attachment"] = await attach_upload(
+                service,
+                expenses,
+                expense,
+                object_key=s3_file_name,
+                filename=file.filename,
+                content_type=file.content_type or "application/octet-stream",
+                size=file.size,
+                checksum=await asyncio.to_thread(file_sha256, file.file)
+            )
+            if response["attachment"]["duplicate"]:
+                # The uploaded object was deleted in favour of the stored copy
+                response["s3_object"] = response["attachment"]["url"]
+    return response
+
+@router.post("/upload_files/stream")
+async def upload_file_stream(
+    request: Request,
+    filename: str = Query(..., min_length=1),
+    expense_id: Optional[int] = Query(default=None, description="Attach the file to this expense"),
+    open_services: AttachmentServicesOpener = Depends(get_attachment_opener)
+):
+    """
+    Upload the raw request body (not multipart/form-data) to S3 as it arrives
+
+    The body is never spooled: it is cut into parts that are uploaded with
+    bounded concurrency while the client is still sending. With `expense_id`
+    the object is attached to the expense; content already stored (same
+    SHA-256) is not kept twice.
+    """
+    content_length = request.headers.get("content-length")
+    if content_length is not None:
+        try:
+            declared = int(content_length)
+        except ValueError:
+            declared = -1
+        if declared < 0:
+            raise HTTPException(status_code=400, detail="Invalid Content-Length header")
+        if declared > settings.s3_upload_max_bytes:
+            raise HTTPException(status_code=413, detail=f"Upload exceeds the {settings.s3_upload_max_bytes} byte limit")
 
+    async with upload_services(open_services, expense_id) as (service, expenses):
+        expense = await get_upload_target(service, expense_id)
+        if expense is None:
+            object_name = s3_object_name(filename)
+        else:
+            object_name = attachment_object_key(expense["id"], uuid.uuid4().hex, filename)
+        content_type = request.headers.get("content-type") or "application/octet-stream"
+        try:
+            s3_object_details = await stream_upload_to_s3(
+                request.stream(),
+                bucket_name=settings.aws_s3_bucket_name,
+                object_name=object_name,
+                content_type=content_type
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+
+        response = {
+            "message": "File uploaded successfully",
+            "s3_object": s3_object_details
+        }
+        if expense is not None:
+            response["attachment"] = await attach_upload(
+                service,
+                expenses,
+                expense,
+                object_key=object_name,
+                filename=filename,
+                content_type=content_type,
+                size=s3_object_details["size"],
+                checksum=s3_object_details["sha256"]
+            )
+            if response["attachment"]["duplicate"]:
+                # The uploaded object was deleted in favour of the stored copy
+                response["s3_object"] = {
+                    **s3_object_details,
+                    "key": response["attachment"]["object_key"],
+                    "url": response["attachment"]["url"],
+                }
+    return response
+
+# Direct-to-S3 uploads: the API only hands out presigned URLs and records the result
+@router.post("/upload_files/intents", response_model=UploadIntentResponse, response_model_exclude_none=True)
+async def create_upload_intent(
+    intent: UploadIntentCreate,
+    service: AttachmentService = Depends(get_attachment_service),
+    expenses: ExpenseService = Depends(get_expense_service)
+):
+    """
+    Presigned URLs for uploading a receipt straight to S3
+
+    Files up to `s3_presign_multipart_threshold` get a PUT URL and a POST form;
+    larger ones get one PUT URL per `part_size` part. Call
+    /upload_files/complete afterwards to attach the object to the expense.
+    If `sha256` matches content that is already stored, the attachment is
+    recorded immediately and returned instead of URLs.
+    """
+    try:
+        result = await service.create_upload_intent(
+            expense_id=intent.expense_id,
+            filename=intent.filename,
+            content_type=intent.content_type,
+            size=intent.size,
+            sha256=intent.sha256
+        )
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Presigning failed: {str(e)}")
+
+    if result["status"] != "success":
+        raise HTTPException(status_code=STATUS_CODES.get(result["status"], 400), detail=result["message"])
+    if "attachment" in result:
+        await expenses.invalidate_cache(intent.expense_id, [result["expense"]])
+    return result["intent"]
+
+@router.post("/upload_files/complete", response_model=AttachmentResponse)
+async def complete_upload(
+    completion: UploadComplete,
+    service: AttachmentService = Depends(get_attachment_service),
+    expenses: ExpenseService = Depends(get_expense_service)
+):
+    """Record a direct upload against its expense (completing multipart uploads first)"""
+    try:
+        result = await service.complete_upload(
+            completion.intent_id,
+            [part.model_dump() for part in completion.parts]
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Upload completion failed: {str(e)}")
+
+    if result["status"] != "success":
+        raise HTTPException(status_code=STATUS_CODES.get(result["status"], 400), detail=result["message"])
+    await expenses.invalidate_cache(result["expense"]["id"], [result["expense"]])
+    return result["attachment"]
+
+@router.get("/upload_files/attachments/{attachment_id}/thumbnail")
+async def get_attachment_thumbnail(
+    attachment_id: int,
+    service: AttachmentService = Depends(get_read_attachment_service)
+):
+    """
+    Redirect to the attachment's thumbnail, rendering it on first request
+
+    Until the background worker has stored it, answers 202 with Retry-After.
+    """
+    attachment = await service.get_attachment(attachment_id)
+    if attachment is None:
+        raise HTTPException(status_code=404, detail="Attachment not found")
+    if not can_thumbnail(attachment):
+        raise HTTPException(status_code=404, detail="No thumbnail for this attachment")
+
+    thumbnail_key = attachment["thumbnail_key"]
+    if thumbnail_key:
+        # One presigned URL per thumbnail, reused well within its expiry
+        ttl = settings.s3_presign_expires // 2
+        url = await redis_cache.get_or_set(
+            get_thumbnail_url_key(thumbnail_key),
+            lambda: presign_download(settings.aws_s3_bucket_name, thumbnail_key, settings.s3_presign_expires),
+            ttl
+        )
+        return RedirectResponse(url, status_code=307, headers={"Cache-Control": f"private, max-age={ttl}"})
+
+    if not thumbnail_worker.enqueue(attachment):
+        raise HTTPException(status_code=503, detail="Thumbnail queue is full")
+    return JSONResponse({"status": "pending"}, status_code=202, headers={"Retry-After": "1"})
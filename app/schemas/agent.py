@@ -0,0 +1,11 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+
+class ChatRequest(BaseModel):
+    message: str = Field(min_length=1, max_length=4000)
+    # Continue a conversation; omit to start a new one
+    thread_id: Optional[str] = Field(default=None, pattern="^[A-Za-z0-9_-]{1,64}$")
+
+class ChatResponse(BaseModel):
+    thread_id: str
+    response: str
@@ -0,0 +1,64 @@
+import datetime
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
+
+class AttachmentSummary(BaseModel):
+    id: int
+    filename: str
+    content_type: str
+    size: int
+    checksum: Optional[str] = None
+    url: str
+    # Rendered on first request; None for non-image attachments
+    thumbnail_url: Optional[str] = None
+
+    class ConfigDict:
+        from_attributes = True
+
+class AttachmentResponse(AttachmentSummary):
+    expense_id: int
+    object_key: str
+    etag: str
+    duplicate: bool = False
+
+class UploadIntentCreate(BaseModel):
+    expense_id: int
+    filename: str = Field(min_length=1, max_length=255)
+    content_type: str = "application/octet-stream"
+    size: int = Field(gt=0, description="Size of the file in bytes")
+    sha256: Optional[str] = Field(
+        default=None,
+        pattern="^[0-9a-f]{64}$",
+        description="Hex SHA-256 of the file: known content is attached without uploading, new content is verified by S3"
+    )
+
+class PresignedPost(BaseModel):
+    url: str
+    fields: Dict[str, str]
+
+class PresignedPart(BaseModel):
+    part_number: int
+    url: str
+
+class UploadIntentResponse(BaseModel):
+    intent_id: str
+    object_key: str
+    expires_at: datetime.datetime
+    # Single request uploads: PUT the bytes to put_url with put_headers, or POST a form to post
+    put_url: Optional[str] = None
+    put_headers: Dict[str, str] = {}
+    post: Optional[PresignedPost] = None
+    # Multipart uploads: PUT each part_size slice to its URL and keep the returned ETag
+    upload_id: Optional[str] = None
+    part_size: Optional[int] = None
+    parts: List[PresignedPart] = []
+    # Set when the content is already stored: nothing to upload, no completion needed
+    attachment: Optional[AttachmentResponse] = None
+
+class CompletedPart(BaseModel):
+    part_number: int = Field(ge=1, le=10000)
+    etag: str
+
+class UploadComplete(BaseModel):
+    intent_id: str
+    parts: List[CompletedPart] = []
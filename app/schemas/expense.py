@@ -1,24 +1,47 @@
-from pydantic import BaseModel
+import datetime
+from decimal import Decimal
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from app.schemas.attachment import AttachmentSummary
 
 class ExpenseCreate(BaseModel):
-    date: str
-    amount: float
+    date: datetime.date
+    amount: Decimal = Field(max_digits=10, decimal_places=2)
     category: str
     subcategory: str = ""
     note: str = ""
 
 class ExpenseResponse(BaseModel):
     id: int
-    date: str
+    date: datetime.date
     amount: float
     category: str
     subcategory: str
     note: str
+    attachments: List[AttachmentSummary] = []
 
     class ConfigDict:
         from_attributes = True
 
 class ExpenseSummary(BaseModel):
     category: str
+    subcategory: Optional[str] = None
+    period: Optional[str] = None
     total_amount: float
-    count: int
\ No newline at end of file
+    count: int
+
+class ExpenseCursorPage(BaseModel):
+    items: List[ExpenseResponse]
+    size: int
+    next_cursor: Optional[str] = None
+    total: Optional[int] = None
+
+
+class BulkRowError(BaseModel):
+    index: int
+    message: str
+
+class BulkExpenseResult(BaseModel):
+    inserted: int
+    failed: int
+    errors: List[BulkRowError]
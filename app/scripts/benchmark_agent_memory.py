@@ -0,0 +1,114 @@
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+# Ensure the app directory is in the import path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+import aiosqlite
+from langchain.agents import create_agent
+from langchain_core.tools import tool
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+from app.agents.checkpointer import ConversationStore
+from app.agents.fake_model import FakeExpenseChatModel
+from app.agents.history import HistoryBudget
+from config import settings
+
+# A tool result the size of a real page of expenses
+PAGE = json.dumps({
+    "items": [
+        {"id": i, "date": "2025-01-01", "amount": 12.5 + i, "category": "Food", "subcategory": "Lunch", "note": f"lunch with team #{i}"}
+        for i in range(5)
+    ],
+    "next_cursor": "eyJpZCI6IDV9",
+})
+
+
+@tool
+def list_expenses(size: int = 20) -> str:
+    """List recent expenses"""
+    return PAGE
+
+
+@tool
+def summarize_expenses(start_date: str, end_date: str) -> str:
+    """Total spent per category"""
+    return json.dumps([{"category": "Food", "total_amount": 412.5, "count": 33}])
+
+
+def timed(saver, samples):
+    """Record checkpoint write/read latency of `saver` into `samples`"""
+    for name in ("aput", "aput_writes", "aget_tuple"):
+        method = getattr(saver, name)
+
+        async def wrapper(*args, _method=method, _name=name, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await _method(*args, **kwargs)
+            finally:
+                samples[_name].append((time.perf_counter() - started) * 1000)
+        setattr(saver, name, wrapper)
+
+
+def p50_p95(values):
+    values = sorted(values)
+    return statistics.median(values), values[max(0, int(len(values) * 0.95) - 1)]
+
+
+async def run(label: str, turns: int, directory: str, compact: bool, budget: bool):
+    path = os.path.join(directory, f"{label.replace(' ', '_')}.db")
+    if compact:
+        saver = await ConversationStore.open(path)
+    else:
+        saver = AsyncSqliteSaver(await aiosqlite.connect(path))
+    samples = {"aput": [], "aput_writes": [], "aget_tuple": []}
+    timed(saver, samples)
+
+    middleware = [HistoryBudget(settings.agent_history_max_tokens, settings.agent_history_target_tokens)] if budget else []
+    agent = create_agent(
+        FakeExpenseChatModel(token_delay=0),
+        [list_expenses, summarize_expenses],
+        middleware=middleware,
+        checkpointer=saver
+    )
+    config = {"configurable": {"thread_id": "benchmark"}}
+    started = time.perf_counter()
+    for turn in range(turns):
+        await agent.ainvoke({"messages": [{"role": "user", "content": f"show my latest expenses ({turn})"}]}, config)
+    elapsed = time.perf_counter() - started
+    kept = len((await agent.aget_state(config)).values["messages"])
+
+    # Size once the WAL is folded into the database file
+    await saver.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    size = os.path.getsize(path)
+    await saver.conn.close()
+
+    put_p50, put_p95 = p50_p95(samples["aput"])
+    get_p50, get_p95 = p50_p95(samples["aget_tuple"])
+    print(
+        f"{label:<26} put p50 {put_p50:>6.2f} ms  p95 {put_p95:>6.2f} ms  "
+        f"get p50 {get_p50:>6.2f} ms  p95 {get_p95:>6.2f} ms  "
+        f"{size / 1024 * 100 / turns:>8.1f} KiB/100 turns  {kept:>4} msgs kept  "
+        f"{elapsed / turns * 1000:>6.1f} ms/turn"
+    )
+
+
+async def main():
+    """Checkpoint latency and on-disk size of one conversation, stock saver vs. ConversationStore"""
+    turns = int(sys.argv[1]) if len(sys.argv) > 1 and sys.argv[1].isdigit() else 100
+    print(f"{turns} turns (4 messages each), history budget {settings.agent_history_max_tokens} tokens")
+    with tempfile.TemporaryDirectory() as directory:
+        await run("stock sqlite saver", turns, directory, compact=False, budget=False)
+        await run("deltas", turns, directory, compact=True, budget=False)
+        await run("deltas + history budget", turns, directory, compact=True, budget=True)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("\n❌ Benchmark interrupted by user.")
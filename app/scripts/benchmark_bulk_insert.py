@@ -0,0 +1,46 @@
+import asyncio
+import sys
+import os
+import time
+
+from sqlalchemy.ext.asyncio import AsyncSession
+# Ensure the app directory is in the import path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from app.db.database import async_engine, init_db_async
+from app.scripts.benchmark_summary import cleanup, fake_rows
+from app.services.expense_service import ExpenseService
+
+BATCH_SIZES = [1, 100, 500, 1000, 5000]
+
+
+async def rows_for(count: int):
+    """Validated (index, values) rows as the bulk endpoint hands them to the service."""
+    for index, row in enumerate(fake_rows(count)):
+        yield index, {key: row[key] for key in ("date", "amount", "category", "subcategory", "note")}
+
+
+async def main():
+    """Report bulk ingestion rows/second for different INSERT chunk sizes."""
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 and sys.argv[1].isdigit() else 20_000
+
+    await init_db_async()
+    async with AsyncSession(async_engine) as session:
+        service = ExpenseService(session)
+        print(f"{'chunk size':>10} {'rows':>8} {'seconds':>8} {'rows/s':>10}")
+        for chunk_size in BATCH_SIZES:
+            # Row-at-a-time inserts are slow, keep that run short
+            count = min(rows, 2_000) if chunk_size == 1 else rows
+            await cleanup(session)
+            started = time.perf_counter()
+            result = await service.bulk_create_expenses(rows_for(count), chunk_size)
+            elapsed = time.perf_counter() - started
+            print(f"{chunk_size:>10} {result['inserted']:>8} {elapsed:>8.2f} {result['inserted'] / elapsed:>10.0f}")
+        await cleanup(session)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("\n❌ Benchmark interrupted by user.")
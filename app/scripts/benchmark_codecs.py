@@ -0,0 +1,87 @@
+import sys
+import os
+import random
+import time
+from datetime import date, datetime, timedelta
+
+# Ensure the app directory is in the import path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from app.db.codecs import CODECS, COMPRESSIONS, PayloadCodec
+
+CATEGORIES = ["Food", "Transportation", "Utilities", "Entertainment", "Health", "Shopping"]
+
+
+# ---------------------------------------------------------------------------
+# Realistic payloads
+# ---------------------------------------------------------------------------
+
+def expense_page(size: int) -> dict:
+    """A paginated /expenses/ response body."""
+    today = date.today()
+    return {
+        "items": [
+            {
+                "id": 100000 + i,
+                "date": today - timedelta(days=i % 180),
+                "amount": round(random.uniform(5.0, 500.0), 2),
+                "category": random.choice(CATEGORIES),
+                "subcategory": "Groceries",
+                "note": "Weekly shopping at the local market with family",
+                "created_at": datetime.now(),
+            }
+            for i in range(size)
+        ],
+        "total": 250000,
+        "page": 1,
+        "size": size,
+        "pages": 250000 // size,
+    }
+
+
+def summary(periods: int) -> list:
+    """A /expenses/summary/ response grouped by category and day."""
+    return [
+        {"category": category, "period": f"2024-{1 + p // 28:02d}-{1 + p % 28:02d}",
+         "total_amount": round(random.uniform(50, 5000), 2), "count": random.randint(1, 400)}
+        for category in CATEGORIES
+        for p in range(periods)
+    ]
+
+
+def measure(codec: PayloadCodec, value, repeat: int) -> tuple:
+    """Mean encode/decode time in microseconds and encoded size."""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        payload = codec.encode(value)
+    encode_us = (time.perf_counter() - started) / repeat * 1e6
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        codec.decode(payload)
+    decode_us = (time.perf_counter() - started) / repeat * 1e6
+    return encode_us, decode_us, len(payload)
+
+
+def main():
+    """Print serialize/deserialize throughput and payload size per codec."""
+    payloads = {
+        "page of 50": expense_page(50),
+        "page of 1000": expense_page(1000),
+        "summary 6x180 days": summary(180),
+    }
+    print(f"{'payload':<20} {'codec':<18} {'encode µs':>10} {'decode µs':>10} {'bytes':>9}")
+    for name, value in payloads.items():
+        repeat = 2000 if name == "page of 50" else 100
+        for codec_name, (_, codec_available, _, _) in CODECS.items():
+            for compression_name, (_, compression_available, _, _) in COMPRESSIONS.items():
+                if not (codec_available and compression_available):
+                    continue
+                codec = PayloadCodec(codec_name, compression_name, compression_threshold=1024)
+                encode_us, decode_us, size = measure(codec, value, repeat)
+                label = codec_name if compression_name == "none" else f"{codec_name}+{compression_name}"
+                print(f"{name:<20} {label:<18} {encode_us:>10.1f} {decode_us:>10.1f} {size:>9}")
+
+
+if __name__ == "__main__":
+    main()
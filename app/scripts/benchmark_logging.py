@@ -0,0 +1,111 @@
+import asyncio
+import logging
+import sys
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+
+# Ensure the app directory is in the import path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from app.core import logging as app_logging
+from app.core.logging import LoggingMiddleware, setup_logging, shutdown_logging
+
+ROUTE = SimpleNamespace(path="/api/v1/expenses/{expense_id}")
+BODY = b'{"id": 1, "date": "2024-01-01", "amount": 12.5, "category": "Food"}'
+
+
+# ---------------------------------------------------------------------------
+# Minimal ASGI stand-ins
+# ---------------------------------------------------------------------------
+
+async def endpoint(scope, receive, send):
+    scope["route"] = ROUTE
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": BODY, "more_body": False})
+
+
+async def receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def send(message):
+    pass
+
+
+async def run(app, requests: int) -> float:
+    """Requests per second through `app`."""
+    headers = [(b"host", b"localhost"), (b"x-request-id", b"bench")]
+    started = time.perf_counter()
+    for _ in range(requests):
+        await app({"type": "http", "method": "GET", "path": "/api/v1/expenses/1", "headers": headers}, receive, send)
+    return requests / (time.perf_counter() - started)
+
+
+class SlowStream:
+    """File wrapper whose writes stall like a full stdout pipe / logging driver."""
+
+    def __init__(self, stream, stall: float = 0.0002):
+        self.stream = stream
+        self.stall = stall
+
+    def write(self, data: str) -> int:
+        time.sleep(self.stall)
+        return self.stream.write(data)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def use_sync_handler(stream):
+    """Previous behaviour: the event loop renders and writes each record itself."""
+    writer = app_logging._writer
+    shutdown_logging()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(writer.formatter)
+    root.addHandler(handler)
+
+
+async def compare(stream, requests: int, label: str):
+    """Access-log throughput for one sink: off, synchronous, queued, queued + sampling."""
+    print(f"\n{label}")
+    print(f"{'mode':<28} {'req/s':>10}")
+    print(f"{'logging off':<28} {await run(endpoint, requests):>10.0f}")
+
+    setup_logging("INFO", stream=stream)
+    use_sync_handler(stream)
+    print(f"{'sync StreamHandler':<28} {await run(LoggingMiddleware(endpoint), requests):>10.0f}")
+
+    setup_logging("INFO", stream=stream)
+    queued = await run(LoggingMiddleware(endpoint), requests)
+    writer = app_logging._writer
+    drain_started = time.perf_counter()
+    shutdown_logging()
+    print(f"{'queued batch writer':<28} {queued:>10.0f}  (drained {writer.written} records, dropped {writer.dropped} "
+          f"{time.perf_counter() - drain_started:.2f}s after the run)")
+
+    setup_logging("INFO", stream=stream)
+    sampled = await run(LoggingMiddleware(endpoint, sample_rate=0.1), requests)
+    shutdown_logging()
+    print(f"{'queued, 10% 2xx sampling':<28} {sampled:>10.0f}")
+
+
+async def main():
+    """Compare access-log throughput with logging off, synchronous and queued/batched."""
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+
+    with tempfile.NamedTemporaryFile("w", suffix=".log", delete=False) as stream:
+        await compare(stream, requests, "fast sink (local file)")
+        await compare(SlowStream(stream), requests // 4, "slow sink (0.2 ms stall per write)")
+    os.unlink(stream.name)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("\n❌ Benchmark interrupted by user.")
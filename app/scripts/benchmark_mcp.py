@@ -0,0 +1,77 @@
+import asyncio
+import os
+import socket
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+# Ensure the app directory is in the import path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+import uvicorn
+from fastmcp import Client
+from config import settings
+from app.mcp import mcp
+from main import app
+
+TODAY = date.today()
+CALLS = {
+    "list_expenses": {"size": 20},
+    "summarize_expenses": {"start_date": str(TODAY - timedelta(days=30)), "end_date": str(TODAY)},
+    "search_expenses": {"text": "lunch", "limit": 20},
+}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def measure(mode: str, tool: str, call, runs: int):
+    """Print p50/p95 tool-call latency."""
+    await call()  # warm the cache and the connection
+    latencies = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        await call()
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{mode:<22} {tool:<20} p50 {statistics.median(latencies):>7.2f} ms  p95 {p95:>7.2f} ms")
+
+
+async def main():
+    """Tool-call latency in-process vs. over loopback HTTP, against the configured database/Redis."""
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 and sys.argv[1].isdigit() else 200
+
+    # The API (and its lifespan) runs in this process; the HTTP modes loop back to it
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    url = f"http://127.0.0.1:{port}{settings.mcp_path}/"
+
+    try:
+        async with Client(mcp) as in_process, Client(url) as http:
+            for tool, arguments in CALLS.items():
+                await measure("in-process", tool, lambda: in_process.call_tool(tool, arguments), runs)
+                await measure("http, one session", tool, lambda: http.call_tool(tool, arguments), runs)
+
+                # What a fresh client per call (e.g. MultiServerMCPClient tools) pays: connect + initialize
+                async def new_session_call():
+                    async with Client(url) as client:
+                        await client.call_tool(tool, arguments)
+                await measure("http, session per call", tool, new_session_call, runs)
+    finally:
+        server.should_exit = True
+        await serving
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("\n❌ Benchmark interrupted by user.")
@@ -0,0 +1,72 @@
+import asyncio
+import sys
+import os
+import time
+from types import SimpleNamespace
+
+# Ensure the app directory is in the import path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from app.core.metrics import MetricsMiddleware
+
+BUDGET_US = 50
+ROUTES = [SimpleNamespace(path=path) for path in (
+    "/api/v1/expenses/",
+    "/api/v1/expenses/{expense_id}",
+    "/api/v1/expenses/summary/",
+)]
+
+
+# ---------------------------------------------------------------------------
+# Minimal ASGI stand-ins
+# ---------------------------------------------------------------------------
+
+async def endpoint(scope, receive, send):
+    """Routed app: sets the matched route like FastAPI does, then responds."""
+    scope["route"] = ROUTES[scope["n"] % len(ROUTES)]
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}", "more_body": False})
+
+
+async def receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def send(message):
+    pass
+
+
+async def run(app, requests: int) -> float:
+    """Mean wall time per request in microseconds."""
+    started = time.perf_counter()
+    for n in range(requests):
+        await app({"type": "http", "method": "GET", "path": "/", "headers": [], "n": n}, receive, send)
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+async def main() -> int:
+    """Measure the per-request cost MetricsMiddleware adds on top of the app."""
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    instrumented = MetricsMiddleware(endpoint)
+
+    # Warm up label children and caches
+    await run(endpoint, 1000)
+    await run(instrumented, 1000)
+
+    baseline = min([await run(endpoint, requests) for _ in range(3)])
+    with_metrics = min([await run(instrumented, requests) for _ in range(3)])
+    overhead = with_metrics - baseline
+
+    mode = "multiprocess" if "PROMETHEUS_MULTIPROC_DIR" in os.environ else "single process"
+    print(f"requests:        {requests} ({mode})")
+    print(f"baseline:        {baseline:.2f} µs/request")
+    print(f"with metrics:    {with_metrics:.2f} µs/request")
+    print(f"overhead:        {overhead:.2f} µs/request (budget {BUDGET_US} µs)")
+    return 0 if overhead < BUDGET_US else 1
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(asyncio.run(main()))
+    except KeyboardInterrupt:
+        print("\n❌ Benchmark interrupted by user.")
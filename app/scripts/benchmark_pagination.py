@@ -0,0 +1,80 @@
+import asyncio
+import sys
+import os
+import time
+
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select
+# Ensure the app directory is in the import path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from app.db.database import async_engine, init_db_async
+from app.models.expense import Expense
+from app.scripts.benchmark_summary import BENCH_START, BENCH_END, seed, cleanup
+from app.services.expense_service import ExpenseService, encode_cursor
+
+PAGE_SIZE = 50
+
+
+async def timed(coro_factory, repeat: int = 3) -> float:
+    """Best-of-N wall time in milliseconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await coro_factory()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+async def offset_page(session: AsyncSession, service: ExpenseService, start: str, end: str, page: int):
+    """What fastapi_pagination's offset paginate issues: COUNT(*) + OFFSET/LIMIT."""
+    statement = service.get_expenses_by_date_range_query(start, end)
+    await session.execute(select(func.count()).select_from(statement.subquery()))
+    result = await session.execute(statement.offset((page - 1) * PAGE_SIZE).limit(PAGE_SIZE))
+    result.scalars().all()
+    session.expunge_all()
+
+
+async def keyset_page(session: AsyncSession, service: ExpenseService, start: str, end: str, cursor):
+    """Seek straight to the page via the (date, id) index."""
+    await service.get_expenses_page(cursor, PAGE_SIZE, start, end)
+    session.expunge_all()
+
+
+async def main():
+    """Compare offset and keyset pagination cost at increasing page depth."""
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 and sys.argv[1].isdigit() else 1_000_000
+    start, end = BENCH_START.isoformat(), BENCH_END.isoformat()
+
+    await init_db_async()
+    async with AsyncSession(async_engine) as session:
+        await cleanup(session)
+        service = ExpenseService(session)
+        try:
+            await seed(session, rows)
+            print(f"{'page':>8} {'offset (ms)':>12} {'keyset (ms)':>12}")
+            last_page = rows // PAGE_SIZE
+            for page in (1, 10, 100, 1000, last_page // 2, last_page):
+                cursor = None
+                if page > 1:
+                    # Position of the last row on the previous page (not timed)
+                    statement = service.get_expenses_by_date_range_query(start, end)
+                    previous = (await session.execute(
+                        statement.offset((page - 1) * PAGE_SIZE - 1).limit(1)
+                    )).scalar_one()
+                    cursor = encode_cursor(previous)
+                    session.expunge_all()
+
+                offset_ms = await timed(lambda: offset_page(session, service, start, end, page))
+                keyset_ms = await timed(lambda: keyset_page(session, service, start, end, cursor))
+                print(f"{page:>8} {offset_ms:>12.1f} {keyset_ms:>12.1f}")
+        finally:
+            await cleanup(session)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("\n❌ Benchmark interrupted by user.")
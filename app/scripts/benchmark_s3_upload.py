@@ -0,0 +1,99 @@
+import asyncio
+import hashlib
+import os
+import sys
+import time
+import tracemalloc
+
+# Ensure the app directory is in the import path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+import httpx
+from fastapi import FastAPI
+from config import settings
+from app.repository.aws_repository import s3_client
+from app.routes.upload_router import router as upload_router
+
+CHUNK = 64 * 1024  # what a client/ASGI server typically delivers per body message
+
+
+def body(block: bytes, size: int):
+    """`size` bytes made of repeated `block`s"""
+    sent = 0
+    while sent < size:
+        chunk = block[:min(len(block), size - sent)]
+        sent += len(chunk)
+        yield chunk
+
+
+async def upload(client: httpx.AsyncClient, mode: str, block: bytes, size: int):
+    """(seconds, peak traced MB, response JSON) for one upload of `size` bytes"""
+    async def stream():
+        for chunk in body(block, size):
+            yield chunk
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    if mode == "stream":
+        response = await client.post("/upload_files/stream", params={"filename": "bench.bin"}, content=stream())
+    else:
+        # The form endpoint needs the whole file up front, like a browser form post
+        payload = b"".join(body(block, size))
+        response = await client.post("/upload_files", files={"file": ("bench.bin", payload)})
+        del payload
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    response.raise_for_status()
+    return elapsed, peak / 1024 / 1024, response.json()
+
+
+async def main():
+    """Upload large bodies through both endpoints against an S3-compatible endpoint"""
+    if not settings.aws_s3_endpoint_url:
+        print("Set AWS_S3_ENDPOINT_URL to a local S3 stand-in, e.g. `moto_server -p 5000` or MinIO.")
+        return
+    sizes_mb = [int(arg) for arg in sys.argv[1:]] or [16, 128, 512]
+
+    app = FastAPI()
+    app.include_router(upload_router)
+    await s3_client.start()
+    try:
+        try:
+            await s3_client.client.create_bucket(
+                Bucket=settings.aws_s3_bucket_name,
+                CreateBucketConfiguration={"LocationConstraint": settings.aws_region},
+            )
+        except s3_client.client.exceptions.BucketAlreadyOwnedByYou:
+            pass
+
+        print(f"part size {settings.s3_part_size // 1024 // 1024} MB, {settings.s3_upload_concurrency} parts in flight")
+        print(f"{'endpoint':<16} {'size MB':>8} {'seconds':>8} {'MB/s':>8} {'peak MB':>8} {'parts':>6}  checksum")
+        block = os.urandom(CHUNK)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for size_mb in sizes_mb:
+                size = size_mb * 1024 * 1024
+                for mode in ("form", "stream"):
+                    elapsed, peak, result = await upload(client, mode, block, size)
+                    details = result["s3_object"]
+                    if mode == "stream":
+                        key = details["key"]
+                        digest = hashlib.sha256()
+                        for chunk in body(block, size):
+                            digest.update(chunk)
+                        head = await s3_client.client.head_object(Bucket=settings.aws_s3_bucket_name, Key=key)
+                        ok = details["sha256"] == digest.hexdigest() and details["size"] == size == head["ContentLength"]
+                        parts, checksum = details["parts"], "ok" if ok else "MISMATCH"
+                    else:
+                        parts, checksum = "-", "-"
+                    print(f"{mode:<16} {size_mb:>8} {elapsed:>8.2f} {size_mb / elapsed:>8.1f} {peak:>8.1f} {parts:>6}  {checksum}")
+    finally:
+        await s3_client.stop()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("\n❌ Benchmark interrupted by user.")
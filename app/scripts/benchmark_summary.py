@@ -0,0 +1,147 @@
+import asyncio
+import sys
+import os
+import random
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import delete, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select
+# Ensure the app directory is in the import path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from app.db.database import async_engine, init_db_async
+from app.models.expense import Expense
+from app.services.expense_service import ExpenseService
+from app.services.rollup_service import RollupService
+from config import settings
+
+# Benchmark rows live in a date range no real data uses, so they can be
+# summarized in isolation and removed afterwards.
+BENCH_START = date(1900, 1, 1)
+BENCH_END = date(1900, 6, 30)
+INSERT_CHUNK = 10_000
+
+CATEGORIES = {
+    "Food": ["Groceries", "Restaurants", "Cafes"],
+    "Transportation": ["Fuel", "Maintenance", "Ride Share"],
+    "Utilities": ["Electricity", "Water", "Internet"],
+    "Entertainment": ["Movies", "Games", "Concerts"],
+    "Health": ["Medicine", "Doctor", "Gym"],
+    "Shopping": ["Clothes", "Electronics", "Furniture"],
+}
+
+
+# ---------------------------------------------------------------------------
+# Seeding
+# ---------------------------------------------------------------------------
+
+def fake_rows(count: int):
+    """Generate raw expense rows inside the benchmark date range."""
+    days = (BENCH_END - BENCH_START).days
+    now = datetime.now()
+    for _ in range(count):
+        category = random.choice(list(CATEGORIES))
+        yield {
+            "date": (BENCH_START + timedelta(days=random.randint(0, days))).isoformat(),
+            "amount": round(random.uniform(5.0, 500.0), 2),
+            "category": category,
+            "subcategory": random.choice(CATEGORIES[category]),
+            "note": "benchmark",
+            "created_at": now,
+            "updated_at": now,
+        }
+
+
+async def seed(session: AsyncSession, count: int):
+    """Insert `count` benchmark rows in multi-row INSERT chunks."""
+    rows = fake_rows(count)
+    remaining = count
+    while remaining > 0:
+        chunk = [next(rows) for _ in range(min(INSERT_CHUNK, remaining))]
+        await session.execute(insert(Expense), chunk)
+        await session.commit()
+        remaining -= len(chunk)
+
+
+async def cleanup(session: AsyncSession):
+    """Remove all benchmark rows and their rollup buckets."""
+    await session.execute(
+        delete(Expense).where(
+            Expense.date >= BENCH_START.isoformat(),
+            Expense.date <= BENCH_END.isoformat()
+        )
+    )
+    await session.commit()
+    await RollupService(session).rebuild(BENCH_START.isoformat(), BENCH_END.isoformat())
+
+
+# ---------------------------------------------------------------------------
+# Summary paths
+# ---------------------------------------------------------------------------
+
+async def legacy_summarize(session: AsyncSession, start_date: str, end_date: str):
+    """Previous implementation: hydrate every row and add them up in Python."""
+    statement = select(Expense).where(Expense.date >= start_date, Expense.date <= end_date)
+    result = await session.execute(statement)
+    category_totals = {}
+    for expense in result.scalars().all():
+        totals = category_totals.setdefault(expense.category, {"total_amount": 0, "count": 0})
+        totals["total_amount"] += expense.amount
+        totals["count"] += 1
+    return sorted(
+        ({"category": cat, **data} for cat, data in category_totals.items()),
+        key=lambda x: x["total_amount"],
+        reverse=True
+    )
+
+
+async def timed(coro_factory, repeat: int = 3) -> float:
+    """Best-of-N wall time in milliseconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await coro_factory()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+async def main():
+    """Compare Python-side and SQL GROUP BY summaries at growing table sizes."""
+    sizes = [int(arg) for arg in sys.argv[1:] if arg.isdigit()] or [10_000, 100_000, 1_000_000]
+    start, end = BENCH_START.isoformat(), BENCH_END.isoformat()
+    use_rollup = settings.summary_use_rollup
+
+    await init_db_async()
+    async with AsyncSession(async_engine) as session:
+        await cleanup(session)
+        service = ExpenseService(session)
+        seeded = 0
+        try:
+            print(f"{'rows':>10} {'python (ms)':>12} {'sql (ms)':>10} {'rollup (ms)':>12} {'speedup':>8}")
+            for size in sorted(sizes):
+                await seed(session, size - seeded)
+                await RollupService(session).rebuild(start, end)
+                seeded = size
+
+                legacy_ms = await timed(lambda: legacy_summarize(session, start, end))
+                session.expunge_all()
+                settings.summary_use_rollup = False
+                sql_ms = await timed(lambda: service.summarize_expenses(start, end))
+                settings.summary_use_rollup = True
+                rollup_ms = await timed(lambda: service.summarize_expenses(start, end))
+                print(
+                    f"{size:>10} {legacy_ms:>12.1f} {sql_ms:>10.1f} {rollup_ms:>12.1f} "
+                    f"{legacy_ms / sql_ms:>7.1f}x"
+                )
+        finally:
+            settings.summary_use_rollup = use_rollup
+            await cleanup(session)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("\n❌ Benchmark interrupted by user.")
@@ -0,0 +1,96 @@
+import asyncio
+import sys
+import os
+import statistics
+import time
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select
+# Ensure the app directory is in the import path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from app.db.database import async_engine, init_db_async
+from app.db.redis_cache import redis_cache, get_expense_pattern_key, get_expenses_pattern_key
+from app.models.expense import Expense
+from app.scripts.benchmark_summary import BENCH_START, cleanup
+from app.services.expense_service import ExpenseService
+
+VALUES = {
+    "date": BENCH_START.isoformat(),
+    "amount": 12.5,
+    "category": "Food",
+    "subcategory": "Cafes",
+    "note": "benchmark",
+}
+
+statements = 0
+
+
+@event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+def count_statement(conn, cursor, statement, parameters, context, executemany):
+    global statements
+    statements += 1
+
+
+# ---------------------------------------------------------------------------
+# Write paths
+# ---------------------------------------------------------------------------
+
+async def legacy_create(session: AsyncSession):
+    """Previous route: ORM add, commit, refresh, re-SELECT, two pattern wipes."""
+    expense = Expense(**VALUES)
+    session.add(expense)
+    await session.commit()
+    await session.refresh(expense)
+    result = await session.execute(select(Expense).where(Expense.id == expense.id))
+    result.scalar_one()
+    await redis_cache.delete_pattern(get_expense_pattern_key())
+    await redis_cache.delete_pattern(get_expenses_pattern_key())
+
+
+async def current_create(service: ExpenseService):
+    """Current route: one INSERT + rollup delta, one pipelined cache write-through."""
+    result = await service.create_expense(**VALUES)
+    created = result["expense"]
+    await service.invalidate_cache(created["id"], [created], write_through=created)
+
+
+async def measure(name: str, write, runs: int):
+    """Print p50/p95 latency and DB statements per write."""
+    global statements
+    latencies = []
+    statements = 0
+    for _ in range(runs):
+        started = time.perf_counter()
+        await write()
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(
+        f"{name:<10} p50 {statistics.median(latencies):>7.2f} ms  "
+        f"p95 {p95:>7.2f} ms  {statements / runs:>4.1f} statements/write"
+    )
+
+
+async def main():
+    """Compare create latency and round trips of the old and new write path."""
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 and sys.argv[1].isdigit() else 200
+
+    await init_db_async()
+    await redis_cache.connect()
+    try:
+        async with AsyncSession(async_engine) as session:
+            service = ExpenseService(session)
+            await measure("legacy", lambda: legacy_create(session), runs)
+            await measure("current", lambda: current_create(service), runs)
+            await cleanup(session)
+    finally:
+        await redis_cache.disconnect()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("\n❌ Benchmark interrupted by user.")
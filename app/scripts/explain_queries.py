@@ -0,0 +1,89 @@
+import asyncio
+import sys
+import os
+from datetime import date
+from typing import List
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+# Ensure the app directory is in the import path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from app.db.database import async_engine, init_db_async
+from app.services.expense_service import ExpenseService
+from config import settings
+
+START = date(2024, 1, 1)
+END = date(2024, 3, 31)
+
+
+# ---------------------------------------------------------------------------
+# Plans
+# ---------------------------------------------------------------------------
+
+def checked_queries(service: ExpenseService):
+    """(name, statement, expected index, must be covering, must avoid filesort) for the hot read paths."""
+    use_rollup = settings.summary_use_rollup
+    settings.summary_use_rollup = False
+    try:
+        summary = service.get_summary_query(START, END)
+        summary_by_category = service.get_summary_query(START, END, category="Food")
+    finally:
+        settings.summary_use_rollup = use_rollup
+    return [
+        ("range", service.get_expenses_by_date_range_query(START, END), "ix_expense_date_id", False, True),
+        ("keyset page", service.get_expenses_after_query((END, 1000), START, END).limit(50), "ix_expense_date_id", False, True),
+        ("summary", summary, "ix_expense_date_category_amount", True, False),
+        ("summary by category", summary_by_category, "ix_expense_category_date", False, False),
+    ]
+
+
+def plan_problems(plan: dict, index: str, covering: bool, ordered: bool) -> List[str]:
+    """Ways the first EXPLAIN row falls short of the plan a query was designed around."""
+    key = plan.get("key")
+    extra = [part.strip() for part in (plan.get("Extra") or "").split(";")]
+    problems = []
+    if key != index:
+        problems.append(f"uses {key or 'no index'} instead of {index}")
+    if ordered and "Using filesort" in extra:
+        problems.append("filesort")
+    # "Using index condition" is index condition pushdown, not an index-only read
+    if covering and "Using index" not in extra:
+        problems.append("not covering (no 'Using index')")
+    return problems
+
+
+async def explain(session: AsyncSession, statement) -> list:
+    """Run EXPLAIN for a statement with its parameters inlined."""
+    sql = statement.compile(dialect=session.bind.dialect, compile_kwargs={"literal_binds": True})
+    result = await session.execute(text(f"EXPLAIN {sql}"))
+    return [dict(row._mapping) for row in result]
+
+
+async def main() -> int:
+    """Fail when a hot query stops using the index it was designed around.
+
+    Run it against a database with a representative amount of data: on a
+    near-empty table the optimizer may prefer a full scan or another index.
+    """
+    await init_db_async()
+    failures = 0
+    async with AsyncSession(async_engine) as session:
+        service = ExpenseService(session)
+        for name, statement, index, covering, ordered in checked_queries(service):
+            plan = (await explain(session, statement))[0]
+            problems = plan_problems(plan, index, covering, ordered)
+
+            status = "❌" if problems else "✅"
+            print(f"{status} {name:<20} key={plan.get('key')} (expected {index}) type={plan.get('type')} extra={plan.get('Extra')}")
+            for problem in problems:
+                print(f"    {problem}")
+            failures += bool(problems)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(asyncio.run(main()))
+    except KeyboardInterrupt:
+        print("\n❌ Script interrupted by user.")
@@ -11,6 +11,7 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..",
 # Import your app modules
 from app.db.database import async_engine
 from app.models.expense import Expense
+from app.services.rollup_service import RollupService
 
 # Optional imports — if you have Redis cache implemented
 try:
@@ -68,6 +69,7 @@ async def insert_expense_records(count: int = 1000):
             expenses.append(expense)
 
         session.add_all(expenses)
+        await RollupService(session).apply_changes(added=[expense.model_dump() for expense in expenses])
         await session.commit()
 
         print(f"✅ Successfully inserted {count} expense records.")
@@ -0,0 +1,84 @@
+import asyncio
+import sys
+import os
+
+# Ensure the app directory is in the import path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from app.db import migrations
+
+USAGE = (
+    "Usage: python app/scripts/migrate_expense_columns.py "
+    "online|swap|cleanup|rollup [batch_size] [pause_seconds]"
+)
+
+
+# ---------------------------------------------------------------------------
+# Commands
+# ---------------------------------------------------------------------------
+
+async def online(batch_size: int = 10000, pause: float = 0.0) -> bool:
+    """Prepare, backfill, verify and index while the app keeps serving writes."""
+    if await migrations.expense_columns_migrated():
+        print("✅ expense already uses DATE/DECIMAL columns.")
+        return True
+
+    await migrations.prepare()
+    await migrations.backfill(batch_size, pause)
+    invalid = await migrations.verify()
+    if invalid:
+        print(f"❌ {len(invalid)} rows could not be converted, fix them and rerun:")
+        for row in invalid:
+            print(f"  id={row['id']} date={row['date']!r} amount={row['amount']!r}")
+        return False
+
+    await migrations.build_indexes()
+    print("Ready to swap: pause writes, then run the swap command.")
+    return True
+
+
+async def swap() -> bool:
+    """Swap the shadow columns into place and rebuild the rollup exactly."""
+    invalid = await migrations.verify()
+    if invalid:
+        print(f"❌ {len(invalid)} rows still have no converted value, run online again.")
+        return False
+
+    await migrations.swap()
+    buckets = await migrations.migrate_rollup()
+    if buckets is not None:
+        print(f"✅ Rebuilt expense_daily_rollup ({buckets} buckets).")
+    return True
+
+
+# ---------------------------------------------------------------------------
+# CLI Entrypoint
+# ---------------------------------------------------------------------------
+
+async def main() -> int:
+    """Run the requested migration step."""
+    if len(sys.argv) < 2 or sys.argv[1] not in ("online", "swap", "cleanup", "rollup"):
+        print(USAGE)
+        return 2
+
+    command = sys.argv[1]
+    if command == "online":
+        batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+        pause = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+        return 0 if await online(batch_size, pause) else 1
+    if command == "swap":
+        return 0 if await swap() else 1
+    if command == "cleanup":
+        await migrations.cleanup()
+        return 0
+
+    buckets = await migrations.migrate_rollup()
+    print(f"✅ Rebuilt expense_daily_rollup ({buckets or 0} buckets).")
+    return 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(asyncio.run(main()))
+    except KeyboardInterrupt:
+        print("\n❌ Script interrupted by user.")
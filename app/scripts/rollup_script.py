@@ -0,0 +1,67 @@
+import asyncio
+import sys
+import os
+
+from sqlalchemy.ext.asyncio import AsyncSession
+# Ensure the app directory is in the import path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from app.db.database import async_engine, init_db_async
+from app.services.rollup_service import RollupService
+
+USAGE = "Usage: python app/scripts/rollup_script.py rebuild|check [start_date] [end_date]"
+
+
+# ---------------------------------------------------------------------------
+# Commands
+# ---------------------------------------------------------------------------
+
+async def rebuild(start_date: str = None, end_date: str = None):
+    """Backfill / rebuild expense_daily_rollup from the Expense table."""
+    async with AsyncSession(async_engine) as session:
+        rows = await RollupService(session).rebuild(start_date, end_date)
+        print(f"✅ Rebuilt expense_daily_rollup ({rows} buckets).")
+
+
+async def check(start_date: str = None, end_date: str = None) -> bool:
+    """Report buckets where the rollup disagrees with the Expense table."""
+    async with AsyncSession(async_engine) as session:
+        mismatches = await RollupService(session).check(start_date, end_date)
+
+    if not mismatches:
+        print("✅ expense_daily_rollup is consistent with expense.")
+        return True
+
+    print(f"❌ {len(mismatches)} inconsistent rollup buckets:")
+    for mismatch in mismatches:
+        print(
+            f"  {mismatch['date']} {mismatch['category']}/{mismatch['subcategory']}: "
+            f"expected {mismatch['expected_total']:.2f} ({mismatch['expected_count']}), "
+            f"rollup {mismatch['rollup_total']:.2f} ({mismatch['rollup_count']})"
+        )
+    return False
+
+
+# ---------------------------------------------------------------------------
+# CLI Entrypoint
+# ---------------------------------------------------------------------------
+
+async def main() -> int:
+    """Run the requested rollup command."""
+    if len(sys.argv) < 2 or sys.argv[1] not in ("rebuild", "check"):
+        print(USAGE)
+        return 2
+
+    command, date_range = sys.argv[1], sys.argv[2:4]
+    await init_db_async()
+    if command == "rebuild":
+        await rebuild(*date_range)
+        return 0
+    return 0 if await check(*date_range) else 1
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(asyncio.run(main()))
+    except KeyboardInterrupt:
+        print("\n❌ Script interrupted by user.")
@@ -0,0 +1,317 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+from sqlmodel import select
+from sqlalchemy import insert, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, Dict, Iterable, List, Optional
+from app.core.metrics import db_operation
+from app.core.tracing import traced
+from app.models.expense import Expense
+from app.models.expense_attachment import ExpenseAttachment
+from app.repository import aws_repository
+from config import settings
+from app.db.redis_cache import redis_cache, get_upload_intent_key
+
+# Content types the thumbnail worker can render
+THUMBNAIL_TYPES = ("image/jpeg", "image/png", "image/webp", "image/gif")
+
+ATTACHMENT_COLUMNS = (
+    ExpenseAttachment.id,
+    ExpenseAttachment.expense_id,
+    ExpenseAttachment.object_key,
+    ExpenseAttachment.filename,
+    ExpenseAttachment.content_type,
+    ExpenseAttachment.size,
+    ExpenseAttachment.etag,
+    ExpenseAttachment.checksum,
+)
+
+def attachment_object_key(expense_id: int, upload_id: str, filename: str) -> str:
+    """Object key scoped to the expense, keeping the original extension"""
+    extension = filename.rsplit(".", 1)[-1].lower() if "." in filename else "bin"
+    return f"receipts/{expense_id}/{upload_id}.{extension}"
+
+def attachment_response(attachment: Dict[str, Any]) -> Dict[str, Any]:
+    """Attachment row plus its download and (for images) thumbnail URLs"""
+    thumbnail_url = None
+    if attachment["content_type"] in THUMBNAIL_TYPES:
+        thumbnail_url = f"{settings.api_v1_str}/upload_files/attachments/{attachment['id']}/thumbnail"
+    return {
+        **attachment,
+        "url": aws_repository.object_url(settings.aws_s3_bucket_name, attachment["object_key"]),
+        "thumbnail_url": thumbnail_url,
+    }
+
+class AttachmentService:
+    """Expense attachments stored in S3, deduplicated by content hash"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    @traced()
+    @db_operation
+    async def get_expense_values(self, expense_id: int) -> Optional[Dict[str, Any]]:
+        """Values of the expense that cache tags depend on (None if it doesn't exist)"""
+        statement = select(Expense.id, Expense.date, Expense.amount, Expense.category, Expense.subcategory).where(
+            Expense.id == expense_id
+        )
+        row = (await self.db.execute(statement)).one_or_none()
+        return dict(row._mapping) if row else None
+
+    @traced()
+    @db_operation
+    async def get_attachments_for(self, expense_ids: Iterable[int]) -> Dict[int, List[Dict[str, Any]]]:
+        """Attachments of many expenses in one query, grouped by expense id"""
+        expense_ids = list(dict.fromkeys(expense_ids))
+        grouped: Dict[int, List[Dict[str, Any]]] = {expense_id: [] for expense_id in expense_ids}
+        if not expense_ids:
+            return grouped
+        statement = (
+            select(*ATTACHMENT_COLUMNS)
+            .where(ExpenseAttachment.expense_id.in_(expense_ids))
+            .order_by(ExpenseAttachment.expense_id, ExpenseAttachment.id)
+        )
+        for row in (await self.db.execute(statement)).mappings():
+            grouped[row["expense_id"]].append(attachment_response(dict(row)))
+        return grouped
+
+    @traced()
+    @db_operation
+    async def get_attachment(self, attachment_id: int) -> Optional[Dict[str, Any]]:
+        statement = select(*ATTACHMENT_COLUMNS, ExpenseAttachment.thumbnail_key).where(
+            ExpenseAttachment.id == attachment_id
+        )
+        row = (await self.db.execute(statement)).mappings().one_or_none()
+        return dict(row) if row else None
+
+    @traced()
+    @db_operation
+    async def find_by_checksum(self, checksum: str, expense_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """An attachment with this content, preferring one on the given expense"""
+        statement = select(*ATTACHMENT_COLUMNS, ExpenseAttachment.thumbnail_key).where(
+            ExpenseAttachment.checksum == checksum
+        )
+        if expense_id is not None:
+            statement = statement.order_by((ExpenseAttachment.expense_id == expense_id).desc())
+        row = (await self.db.execute(statement.order_by(ExpenseAttachment.id).limit(1))).mappings().first()
+        return dict(row) if row else None
+
+    @traced()
+    @db_operation
+    async def set_thumbnail_key(self, object_key: str, thumbnail_key: str) -> int:
+        """Point every attachment sharing the object at its thumbnail"""
+        result = await self.db.execute(
+            update(ExpenseAttachment)
+            .where(ExpenseAttachment.object_key == object_key)
+            .values(thumbnail_key=thumbnail_key, updated_at=datetime.now())
+        )
+        await self.db.commit()
+        return result.rowcount
+
+    @traced()
+    async def record_attachment(
+        self,
+        expense: Dict[str, Any],
+        object_key: str,
+        filename: str,
+        content_type: str,
+        size: int,
+        etag: str = "",
+        checksum: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Attach an uploaded object to an expense, reusing stored content with the same checksum
+
+        When the content is already stored, the new object is deleted and the
+        attachment points at the existing one (and its thumbnail); when the
+        expense already has it, the existing attachment is returned.
+        """
+        duplicate, thumbnail_key = False, None
+        if checksum:
+            existing = await self.find_by_checksum(checksum, expense["id"])
+            if existing is not None:
+                duplicate = True
+                if existing["object_key"] != object_key:
+                    await aws_repository.delete_object(settings.aws_s3_bucket_name, object_key)
+                thumbnail_key = existing.pop("thumbnail_key")
+                if existing["expense_id"] == expense["id"]:
+                    return {
+                        "status": "success",
+                        "attachment": {**attachment_response(existing), "duplicate": True},
+                        "expense": expense,
+                        "message": "Attachment already recorded"
+                    }
+                object_key, etag = existing["object_key"], existing["etag"]
+
+        result = await self.create_attachment(
+            expense_id=expense["id"],
+            object_key=object_key,
+            filename=filename,
+            content_type=content_type,
+            size=size,
+            etag=etag,
+            checksum=checksum,
+            thumbnail_key=thumbnail_key,
+        )
+        if result["status"] == "success":
+            result["attachment"]["duplicate"] = duplicate
+            result["expense"] = expense
+        return result
+
+    @traced()
+    async def create_upload_intent(
+        self,
+        expense_id: int,
+        filename: str,
+        content_type: str,
+        size: int,
+        sha256: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Presign an upload for a new object under the expense's prefix.
+
+        The intent (key, declared size, multipart upload id) is kept in Redis
+        until the presigned URLs expire; only a completion matching a live
+        intent is recorded. Content whose SHA-256 is already stored is attached
+        right away, without an upload.
+        """
+        if size > settings.s3_upload_max_bytes:
+            return {"status": "error", "message": f"Upload exceeds the {settings.s3_upload_max_bytes} byte limit"}
+        expense = await self.get_expense_values(expense_id)
+        if expense is None:
+            return {"status": "not_found", "message": "Expense not found"}
+
+        intent_id = uuid.uuid4().hex
+        expires_in = settings.s3_presign_expires
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=expires_in)
+        if sha256:
+            existing = await self.find_by_checksum(sha256, expense_id)
+            if existing is not None:
+                result = await self.record_attachment(
+                    expense, existing["object_key"], filename, existing["content_type"],
+                    existing["size"], existing["etag"], sha256
+                )
+                if result["status"] == "success":
+                    result["intent"] = {
+                        "intent_id": intent_id,
+                        "object_key": existing["object_key"],
+                        "expires_at": expires_at,
+                        "attachment": result["attachment"],
+                    }
+                return result
+
+        object_key = attachment_object_key(expense_id, intent_id, filename)
+        bucket = settings.aws_s3_bucket_name
+        if size > settings.s3_presign_multipart_threshold:
+            presigned = await aws_repository.presign_multipart_upload(
+                bucket, object_key, content_type, size, settings.s3_part_size, expires_in
+            )
+        else:
+            presigned = await aws_repository.presign_upload(bucket, object_key, content_type, size, expires_in, sha256)
+
+        intent = {
+            "expense_id": expense_id,
+            "object_key": object_key,
+            "filename": filename,
+            "content_type": content_type,
+            "size": size,
+            "upload_id": presigned.get("upload_id"),
+        }
+        if not await redis_cache.set(get_upload_intent_key(intent_id), intent, expires_in):
+            if intent["upload_id"]:
+                await aws_repository.abort_multipart_upload(bucket, object_key, intent["upload_id"])
+            return {"status": "unavailable", "message": "Upload intents cannot be stored right now"}
+
+        return {
+            "status": "success",
+            "intent": {
+                "intent_id": intent_id,
+                "object_key": object_key,
+                "expires_at": expires_at,
+                **presigned,
+            },
+        }
+
+    @traced()
+    async def complete_upload(self, intent_id: str, parts: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Finish the S3 side of an intent and record the object against its expense"""
+        intent_key = get_upload_intent_key(intent_id)
+        intent = await redis_cache.get(intent_key)
+        if intent is None:
+            return {"status": "not_found", "message": "Upload intent not found or expired"}
+
+        bucket, object_key = settings.aws_s3_bucket_name, intent["object_key"]
+        if intent["upload_id"]:
+            if not parts:
+                return {"status": "error", "message": "Multipart uploads need the ETag of every part"}
+            try:
+                await aws_repository.complete_multipart_upload(bucket, object_key, intent["upload_id"], parts)
+            except Exception as e:
+                return {"status": "error", "message": f"Could not complete the multipart upload: {str(e)}"}
+
+        # Record what S3 actually stored, not what the client claims
+        stored = await aws_repository.head_object(bucket, object_key)
+        if stored is None:
+            return {"status": "error", "message": "Object has not been uploaded yet"}
+        if stored["size"] > intent["size"]:
+            # A presigned PUT does not enforce the declared size
+            await aws_repository.delete_object(bucket, object_key)
+            await redis_cache.delete(intent_key)
+            return {"status": "error", "message": "Uploaded object is larger than declared"}
+
+        expense = await self.get_expense_values(intent["expense_id"])
+        if expense is None:
+            await aws_repository.delete_object(bucket, object_key)
+            await redis_cache.delete(intent_key)
+            return {"status": "not_found", "message": "Expense not found"}
+
+        result = await self.record_attachment(
+            expense,
+            object_key=object_key,
+            filename=intent["filename"],
+            content_type=stored["content_type"],
+            size=stored["size"],
+            etag=stored["etag"],
+            # Only a checksum S3 verified on upload is used for deduplication
+            checksum=stored["sha256"],
+        )
+        if result["status"] == "success":
+            await redis_cache.delete(intent_key)
+        return result
+
+    @traced()
+    @db_operation
+    async def create_attachment(
+        self,
+        expense_id: int,
+        object_key: str,
+        filename: str,
+        content_type: str,
+        size: int,
+        etag: str = "",
+        checksum: Optional[str] = None,
+        thumbnail_key: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Insert one attachment row"""
+        values = {
+            "expense_id": expense_id,
+            "object_key": object_key,
+            "filename": filename,
+            "content_type": content_type,
+            "size": size,
+            "etag": etag,
+            "checksum": checksum,
+        }
+        try:
+            now = datetime.now()
+            result = await self.db.execute(
+                insert(ExpenseAttachment).values(**values, thumbnail_key=thumbnail_key, created_at=now, updated_at=now)
+            )
+            await self.db.commit()
+            attachment = {"id": result.inserted_primary_key[0], **values}
+            return {
+                "status": "success",
+                "attachment": attachment_response(attachment),
+                "message": "Attachment recorded successfully"
+            }
+        except Exception as e:
+            await self.db.rollback()
+            return {"status": "error", "message": f"Database error: {str(e)}"}
@@ -1,16 +1,87 @@
+import base64
+import hashlib
+import json
+from datetime import datetime
 from sqlmodel import select
+from sqlalchemy import and_, delete, func, insert, or_, update
+from sqlalchemy.engine import Row
 from sqlalchemy.sql import Select
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, AsyncIterable, AsyncIterator, Iterable, Mapping, Optional, Tuple
+from app.core.metrics import db_operation
+from app.core.tracing import span, traced
 from app.models.expense import Expense
-from app.db.redis_cache import redis_cache, get_expense_pattern_key, get_expenses_pattern_key
+from app.models.expense_rollup import ExpenseDailyRollup
+from app.schemas.expense import ExpenseCursorPage
+from app.services.attachment_service import AttachmentService
+from app.services.rollup_service import RollupService
+from config import settings
+from app.db.redis_cache import (
+    redis_cache,
+    get_expense_key,
+    get_expense_pattern_key,
+    get_expenses_pattern_key,
+    get_global_version_key,
+    get_range_version_keys,
+    get_write_tags,
+    get_write_version_keys,
+)
+
+# Time buckets supported by summarize_expenses (MySQL date functions)
+SUMMARY_PERIODS = {
+    "day": lambda column: func.date_format(column, "%Y-%m-%d"),
+    "week": lambda column: func.date_format(column, "%x-W%v"),
+    "month": lambda column: func.date_format(column, "%Y-%m"),
+}
+
+# Optional grouping dimensions on top of category
+SUMMARY_DIMENSIONS = ("subcategory", *SUMMARY_PERIODS)
+
+# Plain expense columns (no ORM hydration), in export/API order
+EXPENSE_COLUMNS = (
+    Expense.id,
+    Expense.date,
+    Expense.amount,
+    Expense.category,
+    Expense.subcategory,
+    Expense.note,
+)
+
+def encode_cursor(expense: Expense) -> str:
+    """Opaque cursor for the (date, id) position of an expense"""
+    payload = json.dumps([str(expense.date), expense.id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    """(date, id) position encoded by encode_cursor"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        after_date, after_id = json.loads(base64.urlsafe_b64decode(padded))
+        return str(after_date), int(after_id)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid pagination cursor")
+
+def render_cursor_page(result: Dict[str, Any]) -> str:
+    """Validate a keyset page once and render it to JSON (REST routes and MCP tools share it)"""
+    with span("serialize", "serialize"):
+        return ExpenseCursorPage.model_validate(result).model_dump_json()
+
+def expense_to_dict(expense: Any) -> Dict[str, Any]:
+    """Column values of an Expense (model instance, row or mapping)"""
+    if isinstance(expense, Mapping):
+        return {column.key: expense[column.key] for column in EXPENSE_COLUMNS}
+    return {column.key: getattr(expense, column.key) for column in EXPENSE_COLUMNS}
 
 class ExpenseService:
     """Service class for expense operations"""
     
     def __init__(self, db: AsyncSession):
         self.db = db
+        self.rollup = RollupService(db)
+        self.attachments = AttachmentService(db)
     
+    @traced()
+    @db_operation
     async def create_expense(
         self,
         date: str, 
@@ -19,28 +90,185 @@ class ExpenseService:
         subcategory: str = "", 
         note: str = ""
     ) -> Dict[str, Any]:
-        """Create a new expense with proper transaction handling"""
+        """Create a new expense: one INSERT (id from lastrowid) plus its rollup delta, one commit"""
+        values = {
+            "date": date,
+            "amount": amount,
+            "category": category,
+            "subcategory": subcategory,
+            "note": note,
+        }
         try:
-            expense = Expense(
-                date=date,
-                amount=amount,
-                category=category,
-                subcategory=subcategory,
-                note=note
+            now = datetime.now()
+            result = await self.db.execute(
+                insert(Expense).values(**values, created_at=now, updated_at=now)
             )
-            self.db.add(expense)
+            await self.rollup.apply_changes(added=[values])
             await self.db.commit()
-            await self.db.refresh(expense)
             
+            expense = {"id": result.inserted_primary_key[0], **values, "attachments": []}
             return {
                 "status": "success", 
-                "id": expense.id, 
+                "id": expense["id"], 
+                "expense": expense,
                 "message": "Expense added successfully"
             }
         except Exception as e:
             await self.db.rollback()
             return {"status": "error", "message": f"Database error: {str(e)}"}
     
+    async def _lock_expense_values(self, expense_id: int) -> Optional[Dict[str, Any]]:
+        """Current column values of an expense, row-locked until commit"""
+        statement = select(*EXPENSE_COLUMNS).where(Expense.id == expense_id).with_for_update()
+        row = (await self.db.execute(statement)).one_or_none()
+        return dict(row._mapping) if row else None
+    
+    @traced()
+    @db_operation
+    async def update_expense(
+        self,
+        expense_id: int,
+        date: str,
+        amount: float,
+        category: str,
+        subcategory: str = "",
+        note: str = ""
+    ) -> Dict[str, Any]:
+        """Update an expense with a single UPDATE ... WHERE id and adjust the rollup"""
+        values = {
+            "date": date,
+            "amount": amount,
+            "category": category,
+            "subcategory": subcategory,
+            "note": note,
+        }
+        try:
+            # MySQL has no UPDATE ... RETURNING; the old values are needed for
+            # the rollup delta and cache tags, so read them under the row lock
+            old_values = await self._lock_expense_values(expense_id)
+            if old_values is None:
+                await self.db.rollback()
+                return {"status": "not_found", "message": "Expense not found"}
+            
+            result = await self.db.execute(
+                update(Expense)
+                .where(Expense.id == expense_id)
+                .values(**values, updated_at=datetime.now())
+            )
+            if result.rowcount != 1:
+                await self.db.rollback()
+                return {"status": "not_found", "message": "Expense not found"}
+            
+            await self.rollup.apply_changes(added=[values], removed=[old_values])
+            await self.db.commit()
+            # The response (and the cache write-through) keeps the expense's attachments
+            attachments = await self.attachments.get_attachments_for([expense_id])
+            return {
+                "status": "success",
+                "expense": {"id": expense_id, **values, "attachments": attachments[expense_id]},
+                "old": old_values,
+                "message": "Expense updated successfully"
+            }
+        except Exception as e:
+            await self.db.rollback()
+            return {"status": "error", "message": f"Database error: {str(e)}"}
+    
+    @traced()
+    @db_operation
+    async def delete_expense(self, expense_id: int) -> Dict[str, Any]:
+        """Delete an expense with a single DELETE ... WHERE id and adjust the rollup"""
+        try:
+            old_values = await self._lock_expense_values(expense_id)
+            if old_values is None:
+                await self.db.rollback()
+                return {"status": "not_found", "message": "Expense not found"}
+            
+            result = await self.db.execute(delete(Expense).where(Expense.id == expense_id))
+            if result.rowcount != 1:
+                await self.db.rollback()
+                return {"status": "not_found", "message": "Expense not found"}
+            
+            await self.rollup.apply_changes(removed=[old_values])
+            await self.db.commit()
+            return {
+                "status": "success",
+                "old": old_values,
+                "message": "Expense deleted successfully"
+            }
+        except Exception as e:
+            await self.db.rollback()
+            return {"status": "error", "message": f"Database error: {str(e)}"}
+    
+    @traced()
+    @db_operation
+    async def bulk_create_expenses(
+        self,
+        rows: AsyncIterable[Tuple[int, Dict[str, Any]]],
+        chunk_size: int = 1000,
+        result: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Insert (index, values) rows in multi-row INSERT chunks, collecting per-row errors.
+        
+        `result` is updated as each chunk commits, so a caller whose row stream
+        fails midway still knows what was inserted and which cache entries it affects.
+        """
+        result = result if result is not None else {}
+        result.update({
+            "status": "success",
+            "inserted": 0,
+            "errors": [],
+            # One representative row per (month, category) for cache invalidation
+            "touched": [],
+        })
+        touched: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        chunk: List[Tuple[int, Dict[str, Any]]] = []
+        
+        async def flush():
+            result["inserted"] += await self._insert_chunk(chunk, result["errors"], touched)
+            result["touched"] = list(touched.values())
+        
+        async for index, values in rows:
+            chunk.append((index, values))
+            if len(chunk) >= chunk_size:
+                await flush()
+                chunk = []
+        if chunk:
+            await flush()
+        return result
+    
+    async def _insert_chunk(
+        self,
+        chunk: List[Tuple[int, Dict[str, Any]]],
+        errors: List[Dict[str, Any]],
+        touched: Dict[Tuple[str, str], Dict[str, Any]]
+    ) -> int:
+        """Insert one chunk in a single transaction, isolating bad rows if it fails"""
+        now = datetime.now()
+        values = [{**row, "created_at": now, "updated_at": now} for _, row in chunk]
+        try:
+            # executemany: rendered as multi-row INSERT ... VALUES batches
+            await self.db.execute(insert(Expense), values)
+            await self.rollup.apply_changes(added=values)
+            await self.db.commit()
+            inserted = chunk
+        except Exception:
+            await self.db.rollback()
+            # Retry row by row so one bad row doesn't abort its whole chunk
+            inserted = []
+            for (index, row), row_values in zip(chunk, values):
+                try:
+                    await self.db.execute(insert(Expense), [row_values])
+                    await self.rollup.apply_changes(added=[row_values])
+                    await self.db.commit()
+                    inserted.append((index, row))
+                except Exception as e:
+                    await self.db.rollback()
+                    errors.append({"index": index, "message": f"Database error: {str(e)}"})
+        
+        for _, row in inserted:
+            touched.setdefault((str(row["date"])[:7], row["category"]), row)
+        return len(inserted)
+    
     def get_expenses_by_date_range_query(
         self,
         start_date: str, 
@@ -52,6 +280,8 @@ class ExpenseService:
             Expense.date <= end_date
         ).order_by(Expense.date.desc(), Expense.id.desc())
     
+    @traced()
+    @db_operation
     async def get_expenses_by_date_range(
         self,
         start_date: str, 
@@ -81,10 +311,32 @@ class ExpenseService:
         except Exception as e:
             return {"status": "error", "message": f"Error listing expenses: {str(e)}"}
     
+    @traced()
+    @db_operation
+    async def stream_expenses(
+        self,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        batch_size: int = 5000
+    ) -> AsyncIterator[List[Row]]:
+        """Yield expense rows in fixed-size batches from an unbuffered server-side cursor"""
+        statement = select(*EXPENSE_COLUMNS)
+        if start_date:
+            statement = statement.where(Expense.date >= start_date)
+        if end_date:
+            statement = statement.where(Expense.date <= end_date)
+        statement = statement.order_by(Expense.date.desc(), Expense.id.desc())
+        
+        result = await self.db.stream(statement.execution_options(yield_per=batch_size))
+        async for partition in result.partitions(batch_size):
+            yield partition
+    
     def get_all_expenses_query(self) -> Select:
         """Get query statement for all expenses (for pagination)"""
         return select(Expense).order_by(Expense.date.desc(), Expense.id.desc())
     
+    @traced()
+    @db_operation
     async def get_all_expenses(self) -> List[Dict[str, Any]]:
         """Get all expenses with proper transaction handling (non-paginated, kept for backward compatibility)"""
         try:
@@ -106,53 +358,246 @@ class ExpenseService:
         except Exception as e:
             return {"status": "error", "message": f"Error listing expenses: {str(e)}"}
     
+    def get_expenses_after_query(
+        self,
+        after: Optional[Tuple[str, int]] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> Select:
+        """Keyset query for expenses after an (date, id) position, newest first"""
+        statement = select(Expense)
+        if start_date:
+            statement = statement.where(Expense.date >= start_date)
+        if end_date:
+            statement = statement.where(Expense.date <= end_date)
+        if after:
+            after_date, after_id = after
+            # Seek predicate served by the (date, id) index
+            statement = statement.where(or_(
+                Expense.date < after_date,
+                and_(Expense.date == after_date, Expense.id < after_id)
+            ))
+        return statement.order_by(Expense.date.desc(), Expense.id.desc())
+    
+    @traced()
+    @db_operation
+    async def get_expenses_page(
+        self,
+        cursor: Optional[str] = None,
+        size: int = 50,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        include_total: bool = False
+    ) -> Dict[str, Any]:
+        """Get one keyset page of expenses plus the cursor for the next one"""
+        try:
+            after = decode_cursor(cursor) if cursor else None
+        except ValueError as e:
+            return {"status": "error", "message": str(e)}
+
+        try:
+            # One extra row tells us whether another page exists
+            statement = self.get_expenses_after_query(after, start_date, end_date).limit(size + 1)
+            result = await self.db.execute(statement)
+            expenses = result.scalars().all()
+            
+            items = expenses[:size]
+            page = {
+                "items": await self.with_attachments(items),
+                "size": size,
+                "next_cursor": encode_cursor(items[-1]) if len(expenses) > size else None,
+                "total": None,
+            }
+            if include_total:
+                count_statement = select(func.count()).select_from(Expense)
+                if start_date:
+                    count_statement = count_statement.where(Expense.date >= start_date)
+                if end_date:
+                    count_statement = count_statement.where(Expense.date <= end_date)
+                page["total"] = (await self.db.execute(count_statement)).scalar_one()
+            return page
+        except Exception as e:
+            return {"status": "error", "message": f"Error listing expenses: {str(e)}"}
+    
+    def get_search_query(
+        self,
+        text: Optional[str] = None,
+        category: Optional[str] = None,
+        min_amount: Optional[float] = None,
+        max_amount: Optional[float] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> Select:
+        """Expenses matching all given filters, newest first"""
+        statement = select(Expense)
+        if text:
+            statement = statement.where(or_(
+                Expense.note.icontains(text, autoescape=True),
+                Expense.category.icontains(text, autoescape=True),
+                Expense.subcategory.icontains(text, autoescape=True)
+            ))
+        if category:
+            statement = statement.where(Expense.category == category)
+        if min_amount is not None:
+            statement = statement.where(Expense.amount >= min_amount)
+        if max_amount is not None:
+            statement = statement.where(Expense.amount <= max_amount)
+        if start_date:
+            statement = statement.where(Expense.date >= start_date)
+        if end_date:
+            statement = statement.where(Expense.date <= end_date)
+        return statement.order_by(Expense.date.desc(), Expense.id.desc())
+
+    @traced()
+    @db_operation
+    async def search_expenses(
+        self,
+        text: Optional[str] = None,
+        category: Optional[str] = None,
+        min_amount: Optional[float] = None,
+        max_amount: Optional[float] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        limit: int = 50
+    ) -> List[Dict[str, Any]]:
+        """Search expenses by text (note, category, subcategory), amount and date"""
+        try:
+            statement = self.get_search_query(text, category, min_amount, max_amount, start_date, end_date)
+            result = await self.db.execute(statement.limit(limit))
+            return await self.with_attachments(result.scalars().all())
+        except Exception as e:
+            return {"status": "error", "message": f"Error searching expenses: {str(e)}"}
+
+    @traced()
+    async def with_attachments(self, expenses: Iterable[Any]) -> List[Dict[str, Any]]:
+        """Expense dicts with their attachments, fetched in one query for the whole page"""
+        items = [expense_to_dict(expense) for expense in expenses]
+        attachments = await self.attachments.get_attachments_for(item["id"] for item in items)
+        for item in items:
+            item["attachments"] = attachments[item["id"]]
+        return items
+    
+    def get_summary_query(
+        self,
+        start_date: str,
+        end_date: str,
+        category: Optional[str] = None,
+        group_by: Optional[List[str]] = None
+    ) -> Select:
+        """Build the GROUP BY aggregation statement used by summarize_expenses"""
+        group_by = list(dict.fromkeys(group_by or []))
+        unknown = [dimension for dimension in group_by if dimension not in SUMMARY_DIMENSIONS]
+        if unknown:
+            raise ValueError(f"Unsupported summary grouping: {', '.join(unknown)}")
+        periods = [dimension for dimension in group_by if dimension in SUMMARY_PERIODS]
+        if len(periods) > 1:
+            raise ValueError("Only one of day, week or month can be used for grouping")
+
+        # The daily rollup answers in O(days x categories) instead of O(expenses)
+        source = ExpenseDailyRollup if settings.summary_use_rollup else Expense
+        if source is ExpenseDailyRollup:
+            total_amount = func.sum(ExpenseDailyRollup.total).label("total_amount")
+            count = func.sum(ExpenseDailyRollup.count).label("count")
+        else:
+            total_amount = func.sum(Expense.amount).label("total_amount")
+            count = func.count().label("count")
+
+        columns = [source.category.label("category")]
+        if "subcategory" in group_by:
+            columns.append(source.subcategory.label("subcategory"))
+        if periods:
+            columns.append(SUMMARY_PERIODS[periods[0]](source.date).label("period"))
+
+        statement = select(*columns, total_amount, count).where(
+            source.date >= start_date,
+            source.date <= end_date
+        )
+
+        if category:
+            statement = statement.where(source.category == category)
+
+        statement = statement.group_by(*columns)
+        if source is ExpenseDailyRollup:
+            # Buckets emptied by deletes are kept with a zero count
+            statement = statement.having(count > 0)
+        if periods:
+            return statement.order_by(columns[-1], total_amount.desc())
+        return statement.order_by(total_amount.desc())
+
+    @traced()
+    @db_operation
     async def summarize_expenses(
         self,
         start_date: str, 
         end_date: str, 
-        category: Optional[str] = None
+        category: Optional[str] = None,
+        group_by: Optional[List[str]] = None
     ) -> List[Dict[str, Any]]:
-        """Summarize expenses by category with proper transaction handling"""
+        """Summarize expenses by category (and optional subcategory/period) inside the database"""
         try:
-            statement = select(Expense).where(
-                Expense.date >= start_date,
-                Expense.date <= end_date
-            )
-            
-            if category:
-                statement = statement.where(Expense.category == category)
-            
+            statement = self.get_summary_query(start_date, end_date, category, group_by)
+        except ValueError as e:
+            return {"status": "error", "message": str(e)}
+
+        try:
+            # Only the aggregate rows come back, never the individual expenses
             result = await self.db.execute(statement)
-            expenses = result.scalars().all()
-            
-            # Group by category and calculate totals
-            category_totals = {}
-            for expense in expenses:
-                if expense.category not in category_totals:
-                    category_totals[expense.category] = {"total_amount": 0, "count": 0}
-                category_totals[expense.category]["total_amount"] += expense.amount
-                category_totals[expense.category]["count"] += 1
-            
-            # Convert to list and sort by total amount
-            summary = [
-                {
-                    "category": cat,
-                    "total_amount": data["total_amount"],
-                    "count": data["count"]
-                }
-                for cat, data in category_totals.items()
+            return [
+                {**row, "total_amount": round(float(row["total_amount"] or 0), 2), "count": int(row["count"])}
+                for row in result.mappings()
             ]
-            summary.sort(key=lambda x: x["total_amount"], reverse=True)
-            
-            return summary
         except Exception as e:
             return {"status": "error", "message": f"Error summarizing expenses: {str(e)}"}
     
-    async def invalidate_cache(self):
-        """Invalidate all expense-related cache"""
+    @staticmethod
+    async def get_data_version(
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> Optional[str]:
+        """Version token for cached pages: global, or per month bucket for a date range (Redis only)"""
+        if start_date and end_date:
+            keys = get_range_version_keys(start_date, end_date)
+        else:
+            keys = [get_global_version_key()]
+        versions = await redis_cache.get_versions(keys)
+        if versions is None:
+            return None
+        if len(versions) == 1:
+            return str(versions[0])
+        return hashlib.sha1(",".join(map(str, versions)).encode()).hexdigest()[:16]
+    
+    async def invalidate_cache(
+        self,
+        expense_id: Optional[int] = None,
+        touched: Iterable[Mapping[str, Any]] = (),
+        write_through: Optional[Dict[str, Any]] = None
+    ):
+        """Invalidate cache entries affected by a write to the given expense values.
+        
+        With `write_through`, expense:{id} is refreshed with that value instead of
+        deleted, in the same Redis round trip as the invalidation.
+        """
         try:
-            # Clear all expense-related cache keys
-            await redis_cache.delete_pattern(get_expense_pattern_key())
-            await redis_cache.delete_pattern(get_expenses_pattern_key())
+            touched = list(touched)
+            if expense_id is None and not touched:
+                # Nothing to target: clear all expense-related cache keys
+                await redis_cache.delete_pattern(get_expense_pattern_key())
+                await redis_cache.delete_pattern(get_expenses_pattern_key())
+                return
+
+            keys, store = [], {}
+            if expense_id is not None:
+                if write_through is not None:
+                    store[get_expense_key(expense_id)] = write_through
+                else:
+                    keys.append(get_expense_key(expense_id))
+            await redis_cache.invalidate_tags(
+                get_write_tags(touched),
+                keys,
+                versions=get_write_version_keys(touched),
+                store=store,
+                store_ttl=settings.cache_expense_ttl,
+                recent_write_ttl=settings.read_your_writes_seconds
+            )
         except Exception as e:
             print(f"Cache invalidation error: {e}")
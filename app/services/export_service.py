@@ -0,0 +1,138 @@
+import csv
+import io
+import json
+from decimal import Decimal
+from typing import AsyncIterator, List, Optional
+from sqlalchemy.engine import Row
+from app.db.database import read_router
+from app.services.expense_service import EXPENSE_COLUMNS, ExpenseService
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional dependency
+    pa = None
+    pq = None
+
+EXPORT_FIELDS = [column.key for column in EXPENSE_COLUMNS]
+
+# format -> (media type, file extension)
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+def export_format_available(export_format: str) -> bool:
+    """Whether this worker can produce the given export format"""
+    if export_format == "parquet":
+        return pq is not None
+    return export_format in EXPORT_FORMATS
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object whose contents are drained after every row group"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _encode_csv(rows: List[Row], header: bool) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(EXPORT_FIELDS)
+    writer.writerows(rows)
+    return buffer.getvalue().encode()
+
+def _json_default(value):
+    # DECIMAL amounts stay JSON numbers, DATE becomes ISO text
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+def _encode_ndjson(rows: List[Row]) -> bytes:
+    return "".join(
+        json.dumps(dict(zip(EXPORT_FIELDS, row)), default=_json_default) + "\n" for row in rows
+    ).encode()
+
+def _parquet_schema():
+    return pa.schema([
+        ("id", pa.int64()),
+        ("date", pa.date32()),
+        ("amount", pa.decimal128(10, 2)),
+        ("category", pa.string()),
+        ("subcategory", pa.string()),
+        ("note", pa.string()),
+    ])
+
+def _parquet_table(rows: List[Row], schema):
+    columns = list(zip(*rows))
+    return pa.Table.from_arrays(
+        [
+            pa.array(columns[0], pa.int64()),
+            pa.array(columns[1], pa.date32()),
+            pa.array(columns[2], pa.decimal128(10, 2)),
+            pa.array(columns[3], pa.string()),
+            pa.array(columns[4], pa.string()),
+            pa.array(columns[5], pa.string()),
+        ],
+        schema=schema,
+    )
+
+
+async def export_expenses(
+    export_format: str,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    batch_size: int = 5000
+) -> AsyncIterator[bytes]:
+    """Stream an export chunk by chunk; memory is bounded by one batch of rows"""
+    # The session belongs to the stream, not to the request dependencies,
+    # so it stays open until the last chunk has been sent; long scans go to a replica
+    async with await read_router.session() as session:
+        batches = ExpenseService(session).stream_expenses(start_date, end_date, batch_size)
+
+        if export_format == "csv":
+            header = True
+            async for rows in batches:
+                yield _encode_csv(rows, header)
+                header = False
+            if header:
+                yield _encode_csv([], header)
+
+        elif export_format == "ndjson":
+            async for rows in batches:
+                yield _encode_ndjson(rows)
+
+        elif export_format == "parquet":
+            # One row group per batch, flushed to the client as soon as it's written
+            sink, schema = _ChunkSink(), _parquet_schema()
+            writer = pq.ParquetWriter(sink, schema)
+            try:
+                async for rows in batches:
+                    writer.write_table(_parquet_table(rows, schema))
+                    yield sink.drain()
+            finally:
+                writer.close()
+            yield sink.drain()
+
+        else:
+            raise ValueError(f"Unsupported export format: {export_format}")
@@ -0,0 +1,123 @@
+from decimal import Decimal
+from sqlmodel import select
+from sqlalchemy import delete, func, insert
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+from app.models.expense import Expense
+from app.models.expense_rollup import ExpenseDailyRollup
+
+RollupKey = Tuple[str, str, str]
+
+def rollup_deltas(
+    added: Iterable[Mapping[str, Any]] = (),
+    removed: Iterable[Mapping[str, Any]] = ()
+) -> Dict[RollupKey, List]:
+    """Net (total, count) change per (date, category, subcategory) for a set of writes"""
+    deltas: Dict[RollupKey, List] = {}
+    for sign, expenses in ((1, added), (-1, removed)):
+        for expense in expenses:
+            key = (str(expense["date"]), expense["category"], expense.get("subcategory") or "")
+            delta = deltas.setdefault(key, [Decimal("0"), 0])
+            delta[0] += sign * Decimal(str(expense["amount"]))
+            delta[1] += sign
+    # An update that changes nothing relevant cancels out
+    return {key: delta for key, delta in deltas.items() if delta[0] or delta[1]}
+
+class RollupService:
+    """Maintenance of the expense_daily_rollup table"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def apply_changes(
+        self,
+        added: Iterable[Mapping[str, Any]] = (),
+        removed: Iterable[Mapping[str, Any]] = ()
+    ) -> int:
+        """Apply the old/new values of written expenses to the rollup (caller commits)"""
+        deltas = rollup_deltas(added, removed)
+        if not deltas:
+            return 0
+
+        statement = mysql_insert(ExpenseDailyRollup)
+        statement = statement.on_duplicate_key_update(
+            total=statement.table.c.total + statement.inserted.total,
+            count=statement.table.c.count + statement.inserted.count,
+        )
+        await self.db.execute(statement, [
+            {"date": date, "category": category, "subcategory": subcategory, "total": total, "count": count}
+            for (date, category, subcategory), (total, count) in deltas.items()
+        ])
+        return len(deltas)
+
+    def _expense_aggregate_query(self, start_date: Optional[str] = None, end_date: Optional[str] = None):
+        """Rollup rows computed straight from the Expense table"""
+        statement = select(
+            Expense.date,
+            Expense.category,
+            Expense.subcategory,
+            func.sum(Expense.amount).label("total"),
+            func.count().label("count")
+        )
+        if start_date:
+            statement = statement.where(Expense.date >= start_date)
+        if end_date:
+            statement = statement.where(Expense.date <= end_date)
+        return statement.group_by(Expense.date, Expense.category, Expense.subcategory)
+
+    async def rebuild(self, start_date: Optional[str] = None, end_date: Optional[str] = None) -> int:
+        """Recompute the rollup (optionally for a date range) from the Expense table"""
+        try:
+            statement = delete(ExpenseDailyRollup)
+            if start_date:
+                statement = statement.where(ExpenseDailyRollup.date >= start_date)
+            if end_date:
+                statement = statement.where(ExpenseDailyRollup.date <= end_date)
+            await self.db.execute(statement)
+
+            result = await self.db.execute(
+                insert(ExpenseDailyRollup).from_select(
+                    ["date", "category", "subcategory", "total", "count"],
+                    self._expense_aggregate_query(start_date, end_date)
+                )
+            )
+            await self.db.commit()
+            return result.rowcount
+        except Exception:
+            await self.db.rollback()
+            raise
+
+    async def check(self, start_date: Optional[str] = None, end_date: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Compare the rollup with the Expense table and return mismatching buckets"""
+        expected = {
+            (str(row.date), row.category, row.subcategory or ""): (Decimal(row.total or 0), int(row.count))
+            for row in await self.db.execute(self._expense_aggregate_query(start_date, end_date))
+        }
+
+        statement = select(ExpenseDailyRollup).where(ExpenseDailyRollup.count != 0)
+        if start_date:
+            statement = statement.where(ExpenseDailyRollup.date >= start_date)
+        if end_date:
+            statement = statement.where(ExpenseDailyRollup.date <= end_date)
+        actual = {
+            (str(row.date), row.category, row.subcategory): (Decimal(row.total), int(row.count))
+            for row in (await self.db.execute(statement)).scalars()
+        }
+
+        mismatches = []
+        for key in sorted(expected.keys() | actual.keys()):
+            expected_total, expected_count = expected.get(key, (Decimal("0"), 0))
+            actual_total, actual_count = actual.get(key, (Decimal("0"), 0))
+            if expected_count != actual_count or expected_total != actual_total:
+                date, category, subcategory = key
+                mismatches.append({
+                    "date": date,
+                    "category": category,
+                    "subcategory": subcategory,
+                    "expected_total": float(expected_total),
+                    "expected_count": expected_count,
+                    "rollup_total": float(actual_total),
+                    "rollup_count": actual_count,
+                })
+        return mismatches
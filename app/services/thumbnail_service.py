@@ -0,0 +1,122 @@
+"""
+Lazy thumbnails for image attachments
+
+Nothing is rendered at upload time. The first request for a thumbnail queues
+the attachment for a background worker, which downloads the image, renders a
+JPEG off the event loop and stores it in S3 next to the original; every
+attachment sharing that object then points at the same thumbnail.
+"""
+import asyncio
+import io
+from typing import List, Optional, Set
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.database import async_engine
+from app.repository import aws_repository
+from app.services.attachment_service import THUMBNAIL_TYPES, AttachmentService
+from config import settings
+
+try:
+    from PIL import Image
+except ImportError:  # optional dependency
+    Image = None
+
+
+def thumbnails_available() -> bool:
+    return Image is not None
+
+def can_thumbnail(attachment: dict) -> bool:
+    return (
+        thumbnails_available()
+        and attachment["content_type"] in THUMBNAIL_TYPES
+        and attachment["size"] <= settings.thumbnail_max_source_bytes
+    )
+
+def thumbnail_key_for(object_key: str) -> str:
+    return f"thumbnails/{object_key.rsplit('.', 1)[0]}.jpg"
+
+def render_thumbnail(data: bytes, size: int) -> bytes:
+    """JPEG no larger than size x size (CPU-bound, run in a thread)"""
+    with Image.open(io.BytesIO(data)) as image:
+        image.draft("RGB", (size, size))  # JPEG: decode at reduced scale
+        image = image.convert("RGB")
+        image.thumbnail((size, size))
+        output = io.BytesIO()
+        image.save(output, "JPEG", quality=80, optimize=True)
+        return output.getvalue()
+
+
+class ThumbnailWorker:
+    """Background tasks rendering queued attachments, one job per object at a time"""
+
+    def __init__(self, workers: int, queue_size: int):
+        self.workers = workers
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._pending: Set[str] = set()
+        self._tasks: List[asyncio.Task] = []
+        self.rendered = 0
+        self.failed = 0
+
+    def enqueue(self, attachment: dict) -> bool:
+        """Queue an attachment unless its object is already queued; False when the queue is full"""
+        object_key = attachment["object_key"]
+        if object_key in self._pending:
+            return True
+        try:
+            self._queue.put_nowait((attachment["id"], object_key))
+        except asyncio.QueueFull:
+            return False
+        self._pending.add(object_key)
+        return True
+
+    async def generate(self, attachment_id: int) -> Optional[str]:
+        """Render and store the thumbnail of one attachment, returning its key"""
+        async with AsyncSession(async_engine) as session:
+            service = AttachmentService(session)
+            attachment = await service.get_attachment(attachment_id)
+            if attachment is None or not can_thumbnail(attachment):
+                return None
+            if attachment["thumbnail_key"]:
+                return attachment["thumbnail_key"]
+
+            bucket = settings.aws_s3_bucket_name
+            data = await aws_repository.get_object_bytes(bucket, attachment["object_key"])
+            thumbnail = await asyncio.to_thread(render_thumbnail, data, settings.thumbnail_size)
+            thumbnail_key = thumbnail_key_for(attachment["object_key"])
+            await aws_repository.put_object_bytes(
+                bucket, thumbnail_key, thumbnail, "image/jpeg", cache_control="public, max-age=31536000, immutable"
+            )
+            await service.set_thumbnail_key(attachment["object_key"], thumbnail_key)
+            return thumbnail_key
+
+    async def _run(self):
+        while True:
+            attachment_id, object_key = await self._queue.get()
+            try:
+                await self.generate(attachment_id)
+                self.rendered += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"⚠️ Thumbnail for attachment {attachment_id} failed: {e}")
+            finally:
+                self._queue.task_done()
+                self._pending.discard(object_key)
+
+    def start(self):
+        if not self._tasks and thumbnails_available():
+            self._tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> dict:
+        return {
+            "available": thumbnails_available(),
+            "queued": self._queue.qsize(),
+            "rendered": self.rendered,
+            "failed": self.failed,
+        }
+
+thumbnail_worker = ThumbnailWorker(settings.thumbnail_workers, settings.thumbnail_queue_size)
@@ -1,6 +1,10 @@
+from pathlib import Path
 from pydantic_settings import BaseSettings,SettingsConfigDict
 from pydantic import SecretStr
-from typing import List
+from typing import Dict, List
+
+# Project root: relative defaults below are anchored here, not to the working directory
+BASE_DIR = Path(__file__).resolve().parent
 
 
 class Settings(BaseSettings):
@@ -27,6 +31,23 @@ class Settings(BaseSettings):
     database_pool_timeout: int = 30
     database_pool_recycle: int = 3600
     
+    # Adaptive overflow: each uvicorn worker has its own pools, keep
+    # workers * (pool_size + database_max_overflow_max) below RDS max_connections
+    database_pool_adaptive: bool = False
+    database_max_overflow_min: int = 5
+    database_max_overflow_max: int = 30
+    database_pool_wait_target_ms: int = 50  # p95 checkout wait that triggers growth
+    database_pool_tune_interval: int = 30  # seconds
+    
+    # Read replicas (host or host:port); reads use the primary when empty
+    mysql_read_hosts: List[str] = []
+    database_read_pool_size: int = 10
+    database_read_max_overflow: int = 10
+    database_read_connect_timeout: int = 2  # seconds, fail over quickly
+    database_replica_retry_after: int = 30  # seconds an unhealthy replica is skipped
+    read_your_writes_seconds: int = 5  # reads go to the primary this long after a write
+    read_your_writes_cookie: str = "db_primary_until"
+    
     # Redis Configuration
     redis_host: str = "localhost"
     redis_port: int = 6379
@@ -39,6 +60,66 @@ class Settings(BaseSettings):
     cache_expense_ttl: int = 600  # 10 minutes
     cache_summary_ttl: int = 1800  # 30 minutes
     
+    # In-process L1 cache in front of Redis (per uvicorn worker)
+    cache_l1_enabled: bool = True
+    cache_l1_max_entries: int = 10000
+    cache_l1_max_bytes: int = 64 * 1024 * 1024  # 64 MB
+    cache_l1_ttl: int = 30  # upper bound on L1 staleness if an invalidation is missed
+    cache_invalidation_channel: str = "cache:invalidate"
+    
+    # Cached payload serialization: json | orjson | msgpack, compression: none | zstd | lz4
+    cache_codec: str = "json"
+    cache_compression: str = "none"
+    cache_compression_threshold: int = 1024  # bytes
+    
+    # Bulk ingestion
+    bulk_insert_chunk_size: int = 1000  # rows per multi-row INSERT/commit
+    bulk_max_rows: int = 100000  # rows accepted per request
+    bulk_max_json_bytes: int = 10 * 1024 * 1024  # JSON array bodies are buffered whole; stream larger batches as NDJSON
+    bulk_max_line_bytes: int = 64 * 1024  # longest NDJSON row
+    
+    # Exports
+    export_batch_size: int = 5000  # rows fetched and written per chunk
+    
+    # Summaries
+    summary_use_rollup: bool = False  # answer summaries from expense_daily_rollup (enable after `rollup_script.py rebuild`)
+    
+    # Logging: records are written by a background thread in batches
+    log_level: str = "INFO"
+    log_json: bool = True
+    log_batch_size: int = 256
+    log_flush_interval: float = 0.5  # seconds
+    log_queue_size: int = 10000  # records waiting for the writer thread; more are dropped
+    access_log_sample_rate: float = 1.0  # fraction of fast 2xx/3xx requests logged
+    access_log_slow_ms: float = 1000.0  # slower requests are always logged
+    
+    # Rate limiting: sliding-window counters in Redis, shared by all workers and nodes.
+    # Limits read "4/minute", "2/5 minutes" or "10/second;100/hour"; routes are keyed by endpoint name
+    rate_limit_enabled: bool = True
+    rate_limit_default: str = "4/minute"
+    rate_limit_routes: Dict[str, str] = {
+        "bulk_create_expenses": "2/minute",
+        "export_expenses": "2/minute",
+    }
+    # Proxies (IPs or CIDRs) whose X-Forwarded-For is believed; empty = key on the socket peer
+    rate_limit_trusted_proxies: List[str] = []
+    
+    # Metrics: shared directory for multi-worker aggregation (empty = single process)
+    prometheus_multiproc_dir: str = ""
+    # /metrics answers scrapers sending `Authorization: Bearer <token>` or connecting from these networks
+    metrics_token: SecretStr = SecretStr("")
+    metrics_allowed_networks: List[str] = ["127.0.0.1/32", "::1/128"]
+    
+    # Tracing: sampled traces go to the exporter (memory | file | none)
+    tracing_enabled: bool = True
+    tracing_sample_rate: float = 0.05  # head sampling for requests without a traceparent
+    tracing_exporter: str = "memory"
+    tracing_file_path: str = "traces.jsonl"
+    tracing_file_queue_size: int = 1000  # finished traces waiting for the file writer; more are dropped
+    tracing_memory_max_spans: int = 10000
+    tracing_traces_endpoint: bool = False  # serve recent spans (SQL shapes, cache keys) at /metrics/traces
+    tracing_server_timing: bool = True  # per-stage Server-Timing response header
+    
     # Password Configuration
     password_min_length: int = 8
     password_require_special_chars: bool = True
@@ -52,6 +133,49 @@ class Settings(BaseSettings):
     aws_secret_access_key: SecretStr
     aws_region:str
     aws_s3_bucket_name: str
+    aws_s3_endpoint_url: str = ""  # S3-compatible endpoint (MinIO, moto); empty = AWS
+    
+    # S3 uploads: one client per worker; streamed bodies are sent as multipart parts
+    s3_max_pool_connections: int = 20
+    s3_part_size: int = 8 * 1024 * 1024  # bytes, S3 minimum is 5 MiB
+    s3_upload_concurrency: int = 4  # parts in flight per upload
+    s3_upload_max_bytes: int = 5 * 1024 * 1024 * 1024  # 5 GiB
+    s3_presign_expires: int = 900  # seconds presigned URLs and upload intents stay valid
+    s3_presign_multipart_threshold: int = 64 * 1024 * 1024  # larger direct uploads get presigned parts
+    
+    # Attachment thumbnails: rendered on first request by background workers (needs Pillow)
+    thumbnail_size: int = 256  # px, longest side
+    thumbnail_workers: int = 2
+    thumbnail_queue_size: int = 1000
+    thumbnail_max_source_bytes: int = 20 * 1024 * 1024  # larger images get no thumbnail
+    
+    # MCP server mounted on the API (streamable HTTP)
+    mcp_path: str = "/mcp"
+    # Where the agent reaches the MCP tools; empty = in-process, without an HTTP hop
+    mcp_server_url: str = ""
+    mcp_max_results: int = 100  # upper bound on page size / search results per tool call
+    
+    # Agent tool results, keyed by the global data version (any write makes them stale)
+    agent_tool_cache_enabled: bool = True
+    agent_tool_cache_ttl: int = 300  # seconds
+    
+    # Agent runtime: one graph per process, built at startup when an OpenAI key is set
+    agent_model: str = "gpt-4o-mini"  # "fake" runs an offline stand-in model
+    agent_temperature: float = 0.1
+    agent_request_timeout: float = 60.0  # seconds per model request
+    agent_max_retries: int = 2
+    agent_http_max_connections: int = 20  # pooled connections to the model provider
+    agent_max_concurrency: int = 8  # model calls in flight across all conversations
+    agent_queue_size: int = 64  # model calls allowed to wait for a slot
+    agent_queue_timeout: float = 30.0  # seconds a model call may wait before the turn fails
+    
+    # Agent conversation memory: SQLite file storing message deltas; empty = in memory only.
+    # One file per host: workers of a host share it, other hosts keep their own conversations
+    agent_memory_path: str = str(BASE_DIR / "data" / "agent_memory.db")
+    agent_memory_ttl: int = 7 * 24 * 3600  # seconds a conversation is kept after its last message
+    agent_memory_gc_interval: int = 3600  # seconds between sweeps for expired conversations
+    agent_history_max_tokens: int = 4000  # older turns are dropped once a conversation passes this
+    agent_history_target_tokens: int = 2000  # ...down to this size
     model_config = SettingsConfigDict(
         env_file=".env",
         env_file_encoding="utf-8",
@@ -65,6 +189,17 @@ class Settings(BaseSettings):
         """Get async MySQL database URL"""
         return f"mysql+aiomysql://{self.mysql_user}:{self.mysql_password}@{self.mysql_host}:{self.mysql_port}/{self.mysql_database}"
     
+    @property
+    def read_database_urls(self) -> List[str]:
+        """Get async MySQL URLs of the read replicas"""
+        urls = []
+        for host in self.mysql_read_hosts:
+            host, _, port = host.partition(":")
+            urls.append(
+                f"mysql+aiomysql://{self.mysql_user}:{self.mysql_password}@{host}:{port or self.mysql_port}/{self.mysql_database}"
+            )
+        return urls
+    
     @property
     def redis_url(self) -> str:
         """Get Redis connection URL"""
@@ -2,25 +2,45 @@
 FastAPI application with MCP integration
 """
 
+import math
 import tomllib
 import uvicorn
 from pathlib import Path
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
+from fastapi.responses import JSONResponse
 
 from fastapi_pagination import add_pagination
 
 from config import settings
-from app.db.database import init_db_async
+from app.core.logging import LoggingMiddleware, setup_logging
+from app.core.metrics import MetricsMiddleware, record_rate_limit_rejection, render_metrics
+from app.core.rate_limit import RateLimitExceeded
+from app.core.tracing import TracingMiddleware
+from app.db.database import close_db_async, init_db_async
+from app.db.pool_metrics import create_pool_tuner
 from app.db.redis_cache import redis_cache
+from app.mcp import mcp_app
+from app.repository.aws_repository import s3_client
 from app.routes.expenses import router as expenses_router
 from app.routes.upload_router import router as upload_file_to_s3
+from app.routes.metrics_router import require_scrape_access, router as metrics_router
+from app.routes.agent_router import router as agent_router
+from app.agents.fake_model import FAKE_MODEL
+from app.agents.runtime import agent_runtime
+from app.services.thumbnail_service import thumbnail_worker
+
+
+# Structured logs go through a queue to a batching writer thread
+setup_logging(
+    settings.log_level,
+    json_logs=settings.log_json,
+    batch_size=settings.log_batch_size,
+    flush_interval=settings.log_flush_interval,
+    queue_size=settings.log_queue_size,
+)
 
 
 # -------------------------------------------------------------------
@@ -36,17 +56,38 @@ async def lifespan(app: FastAPI):
     # Connect to Redis
     await redis_cache.connect()
     
-    yield
+    # One S3 client (and connection pool) per worker
+    await s3_client.start()
+    
+    # Thumbnails are rendered in the background, on first request
+    thumbnail_worker.start()
+    
+    # Tune pool overflow from observed checkout waits
+    pool_tuner = create_pool_tuner()
+    if settings.database_pool_adaptive:
+        pool_tuner.start()
+    
+    # The mounted MCP app's session manager runs inside the API's lifespan
+    async with mcp_app.lifespan(app):
+        # Build the agent before the first user pays for it (retried on first use if this fails)
+        if settings.openai_api_key.get_secret_value() or settings.agent_model == FAKE_MODEL:
+            try:
+                await agent_runtime.start()
+            except Exception as e:
+                print(f"⚠️ Agent initialization failed: {e}")
+        
+        yield
+        
+        await agent_runtime.stop()
     
     # Shutdown
+    await pool_tuner.stop()
+    await thumbnail_worker.stop()
+    await s3_client.stop()
     await redis_cache.disconnect()
+    await close_db_async()
 
 
-# -------------------------------------------------------------------
-# Rate limiter
-# -------------------------------------------------------------------
-limiter = Limiter(key_func=get_remote_address)
-
 # -------------------------------------------------------------------
 # FastAPI App
 # -------------------------------------------------------------------
@@ -57,9 +98,17 @@ app = FastAPI(
     lifespan=lifespan
 )
 
-# Add rate limiting handler
-app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+# Add rate limiting handler (limits are enforced in Redis by app.core.rate_limit)
+async def rate_limit_exceeded_handler(request: Request, exc: RateLimitExceeded) -> Response:
+    """Count the rejection, then answer 429 with Retry-After"""
+    record_rate_limit_rejection(request.scope)
+    return JSONResponse(
+        {"error": f"Rate limit exceeded: {exc.limit}"},
+        status_code=429,
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))},
+    )
+
+app.add_exception_handler(RateLimitExceeded, rate_limit_exceeded_handler)
 
 # CORS Middleware
 app.add_middleware(
@@ -70,14 +119,42 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Access log (inside tracing, so request/trace ids are already bound)
+app.add_middleware(
+    LoggingMiddleware,
+    sample_rate=settings.access_log_sample_rate,
+    slow_ms=settings.access_log_slow_ms,
+)
+
+# Trace context, x-request-id and Server-Timing for every request
+app.add_middleware(TracingMiddleware)
+
+# Request latency per route template (outermost, so it times everything below)
+app.add_middleware(MetricsMiddleware)
+
 # Include API Routers
 app.include_router(expenses_router, prefix=settings.api_v1_str)
 app.include_router(upload_file_to_s3, prefix=settings.api_v1_str)
+app.include_router(metrics_router, prefix=settings.api_v1_str)
+app.include_router(agent_router, prefix=settings.api_v1_str)
+
+# MCP tools over streamable HTTP (same process, services and pools as the API)
+app.mount(settings.mcp_path, mcp_app)
 
 # Add Pagination
 add_pagination(app)
 
 
+# -------------------------------------------------------------------
+# Prometheus scrape endpoint
+# -------------------------------------------------------------------
+@app.get("/metrics", include_in_schema=False, dependencies=[Depends(require_scrape_access)])
+async def metrics():
+    """Prometheus/OpenMetrics exposition, aggregated across workers"""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
 # -------------------------------------------------------------------
 # Read PyProject Settings + Run Uvicorn
 # -------------------------------------------------------------------
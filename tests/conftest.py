@@ -0,0 +1,102 @@
+"""
+Shared fixtures: settings that need no real AWS/MySQL, and Redis replaced by fakeredis
+"""
+import os
+
+# Required settings without defaults; the tests never talk to AWS
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+os.environ.setdefault("AWS_REGION", "eu-north-1")
+os.environ.setdefault("AWS_S3_BUCKET_NAME", "expense-tests")
+
+import datetime
+import uuid
+from decimal import Decimal
+import fakeredis
+import pytest
+from app.db.local_cache import LocalCache
+from app.db.redis_cache import redis_cache
+from config import settings
+
+
+@pytest.fixture
+async def cache(monkeypatch):
+    """The global redis_cache on an empty fakeredis server, with fresh L1 and counters"""
+    client = fakeredis.FakeAsyncRedis()
+    monkeypatch.setattr(redis_cache, "_redis", client)
+    monkeypatch.setattr(redis_cache, "_local", LocalCache(
+        max_entries=settings.cache_l1_max_entries,
+        max_bytes=settings.cache_l1_max_bytes,
+        default_ttl=settings.cache_l1_ttl,
+    ))
+    monkeypatch.setattr(redis_cache, "_inflight", {})
+    monkeypatch.setattr(redis_cache, "_stats", dict.fromkeys(redis_cache._stats, 0))
+    yield redis_cache
+    await client.aclose()
+
+
+@pytest.fixture
+def app(monkeypatch):
+    """The expense routes, without rate limiting"""
+    from fastapi import FastAPI
+    from app.routes.expenses import router
+
+    monkeypatch.setattr(settings, "rate_limit_enabled", False)
+    app = FastAPI()
+    app.include_router(router)
+    return app
+
+
+@pytest.fixture
+async def http(app):
+    """HTTP client calling the app in-process"""
+    import httpx
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+@pytest.fixture(scope="session")
+def moto_server():
+    """An in-process S3 fake (moto server) shared by the session"""
+    from moto.server import ThreadedMotoServer
+
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=0, verbose=False)
+    server.start()
+    host, port = server.get_host_and_port()
+    yield f"http://{host}:{port}"
+    server.stop()
+
+
+@pytest.fixture
+async def s3(moto_server, monkeypatch):
+    """A client on an empty bucket of the S3 fake; the app's S3 helpers use the same bucket"""
+    from app.repository.aws_repository import _create_client
+
+    monkeypatch.setattr(settings, "aws_s3_endpoint_url", moto_server)
+    monkeypatch.setattr(settings, "aws_s3_bucket_name", f"expense-tests-{uuid.uuid4().hex[:12]}")
+    async with _create_client() as client:
+        await client.create_bucket(
+            Bucket=settings.aws_s3_bucket_name,
+            CreateBucketConfiguration={"LocationConstraint": settings.aws_region},
+        )
+        yield client
+
+
+@pytest.fixture
+async def sqlite_primary(tmp_path):
+    """A SQLite database with every table, holding expenses 1 and 2"""
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from sqlmodel import SQLModel
+    from app.models.expense import Expense
+    from app.models.expense_attachment import ExpenseAttachment  # noqa: F401  (created with the other tables)
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'primary.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    async with AsyncSession(engine) as session:
+        for amount in ("12.50", "40.00"):
+            session.add(Expense(date=datetime.date(2025, 1, 10), amount=Decimal(amount), category="Food"))
+        await session.commit()
+    yield engine
+    await engine.dispose()
@@ -0,0 +1,115 @@
+"""
+Agent streaming with the offline fake model: events, disconnects and interrupted tool calls
+"""
+import asyncio
+import json
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.tools import tool
+from langgraph.checkpoint.memory import InMemorySaver
+from starlette.requests import Request
+from app.agents.expense_agent import ExpenseTrackerAgent
+from app.agents.fake_model import FAKE_MODEL, FakeExpenseChatModel
+from app.agents.history import RepairToolCalls
+from app.routes.agent_router import stream_events
+from config import settings
+
+PAGE = json.dumps({"items": [{"id": 1, "amount": 12.5, "category": "Food"}], "next_cursor": None})
+
+
+@pytest.fixture
+def tool_gate():
+    """Set to let list_expenses return; unset, the tool hangs like a slow database"""
+    gate = asyncio.Event()
+    gate.set()
+    return gate
+
+
+@pytest.fixture
+async def agent(tool_gate, monkeypatch):
+    """ExpenseTrackerAgent on the fake model, with a local list_expenses tool instead of MCP"""
+    @tool
+    async def list_expenses(size: int = 20) -> str:
+        """List recent expenses"""
+        await tool_gate.wait()
+        return PAGE
+
+    async def load_tools(self):
+        return [list_expenses]
+
+    monkeypatch.setattr(settings, "agent_model", FAKE_MODEL)
+    monkeypatch.setattr(settings, "agent_tool_cache_enabled", False)
+    monkeypatch.setattr(ExpenseTrackerAgent, "load_tools", load_tools)
+    agent = ExpenseTrackerAgent(middleware=[RepairToolCalls()], checkpointer=InMemorySaver())
+    agent.model = FakeExpenseChatModel(token_delay=0)
+    await agent.initialize()
+    yield agent
+    await agent.close()
+
+
+def disconnecting_request(disconnect: asyncio.Event) -> Request:
+    async def receive():
+        await disconnect.wait()
+        return {"type": "http.disconnect"}
+
+    return Request({"type": "http", "method": "POST", "headers": []}, receive)
+
+
+async def messages_of(agent, thread_id):
+    return (await agent.agent.aget_state({"configurable": {"thread_id": thread_id}})).values["messages"]
+
+
+async def test_stream_reports_tools_tokens_and_the_answer(agent):
+    events = [event async for event in agent.stream("show my latest expenses", "t1")]
+    kinds = [event["event"] for event in events]
+
+    assert kinds[:2] == ["tool_start", "tool_end"] and kinds[-1] == "done"
+    assert set(kinds[2:-1]) == {"token"}
+    assert events[0]["data"]["name"] == events[1]["data"]["name"] == "list_expenses"
+    assert events[1]["data"]["duration_ms"] >= 0
+
+    done = events[-1]["data"]
+    assert done["response"] == "".join(event["data"]["text"] for event in events[2:-1])
+    assert done["response"].startswith("Here is what the list_expenses tool returned")
+    assert done["ttft_ms"] is not None and done["total_ms"] >= done["ttft_ms"]
+
+
+async def test_disconnect_cancels_the_run_and_the_next_turn_is_repaired(agent, tool_gate):
+    tool_gate.clear()
+    disconnect = asyncio.Event()
+    frames = []
+
+    async def client():
+        async for frame in stream_events(disconnecting_request(disconnect), "t2", agent.stream("show my expenses", "t2")):
+            frames.append(frame)
+            if frame.startswith("event: tool_start"):
+                # The tool is running: the client goes away
+                disconnect.set()
+
+    await asyncio.wait_for(client(), timeout=10)
+    assert [frame.split("\n")[0] for frame in frames] == ["event: start", "event: tool_start"]
+
+    # The checkpoint ends on the model's tool call, without a result
+    history = await messages_of(agent, "t2")
+    assert history[-1].type == "ai" and history[-1].tool_calls
+
+    tool_gate.set()
+    events = [event async for event in agent.stream("and now?", "t2")]
+    assert events[-1]["event"] == "done"
+
+    history = await messages_of(agent, "t2")
+    interrupted = history[2]
+    assert interrupted.type == "tool" and interrupted.status == "error"
+    assert interrupted.tool_call_id == history[1].tool_calls[0]["id"]
+    assert history[3].type == "human" and history[3].content == "and now?"
+
+
+def test_repair_leaves_answered_calls_alone():
+    repair = RepairToolCalls()
+    call = {"name": "list_expenses", "args": {}, "id": "call_1"}
+    messages = [HumanMessage("hi"), AIMessage("", tool_calls=[call]), HumanMessage("again")]
+
+    repaired = repair.repair(messages)
+    assert [message.type for message in repaired] == ["human", "ai", "tool", "human"]
+    assert repair.repair(repaired) is None
+    assert repair.repaired == 1
@@ -0,0 +1,122 @@
+"""
+Bulk ingestion keeps the cache consistent with the chunks it committed, isolates
+bad rows and bounds what it buffers
+"""
+import datetime
+import json
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.redis_cache import get_expense_summary_key, get_range_tags
+from app.models.expense import Expense
+from app.routes.dependencies import get_expense_service
+from app.services.expense_service import ExpenseService
+from app.services.rollup_service import RollupService
+from config import settings
+
+
+class FailingExpenseService(ExpenseService):
+    """Commits chunks in memory; the database goes away after `fail_after` chunks"""
+
+    def __init__(self, fail_after: int):
+        super().__init__(None)
+        self.fail_after = fail_after
+        self.committed = []
+
+    async def _insert_chunk(self, chunk, errors, touched):
+        if len(self.committed) == self.fail_after:
+            raise RuntimeError("Lost connection to MySQL server during query")
+        self.committed.append(chunk)
+        for _, row in chunk:
+            touched.setdefault((str(row["date"])[:7], row["category"]), row)
+        return len(chunk)
+
+
+def ndjson(rows):
+    return "\n".join(json.dumps(row) for row in rows).encode()
+
+
+async def test_failed_request_still_invalidates_committed_chunks(cache, app, http):
+    january = get_expense_summary_key("2025-01-01", "2025-01-31")
+    march = get_expense_summary_key("2025-03-01", "2025-03-31")
+    await cache.set(january, [{"category": "Food"}], 60, tags=get_range_tags("2025-01-01", "2025-01-31"))
+    await cache.set(march, [{"category": "Food"}], 60, tags=get_range_tags("2025-03-01", "2025-03-31"))
+
+    rows = [
+        {"date": "2025-01-05", "amount": 10, "category": "Food"},
+        {"date": "2025-01-06", "amount": 11, "category": "Food"},
+        {"date": "2025-03-07", "amount": 12, "category": "Food"},
+    ]
+    app.dependency_overrides[get_expense_service] = lambda: FailingExpenseService(fail_after=1)
+    response = await http.post(
+        "/expenses/bulk?chunk_size=2",
+        content=ndjson(rows),
+        headers={"content-type": "application/x-ndjson"},
+    )
+
+    assert response.status_code == 500
+    assert response.json()["detail"]["inserted"] == 2
+    # The committed January chunk is visible; March was never written
+    assert await cache.get(january) is None
+    assert await cache.get(march) is not None
+
+
+async def test_successful_request_reports_row_errors(cache, app, http):
+    rows = [
+        {"date": "2025-01-05", "amount": 10, "category": "Food"},
+        {"date": "not a date", "amount": 11, "category": "Food"},
+    ]
+    app.dependency_overrides[get_expense_service] = lambda: FailingExpenseService(fail_after=10)
+    response = await http.post("/expenses/bulk", json=rows)
+
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["inserted"], body["failed"]) == (1, 1)
+    assert body["errors"][0]["index"] == 1
+
+
+async def test_bad_row_fails_alone(sqlite_primary, monkeypatch):
+    # The rollup upsert is MySQL-only
+    async def no_rollup(self, added=(), removed=()):
+        return 0
+    monkeypatch.setattr(RollupService, "apply_changes", no_rollup)
+
+    async def rows():
+        yield 0, {"date": datetime.date(2025, 2, 1), "amount": 10, "category": "Food", "subcategory": "", "note": ""}
+        # NOT NULL violation: fails the multi-row INSERT, then only its own retry
+        yield 1, {"date": datetime.date(2025, 2, 2), "amount": 11, "category": None, "subcategory": "", "note": ""}
+        yield 2, {"date": datetime.date(2025, 3, 3), "amount": 12, "category": "Rent", "subcategory": "", "note": ""}
+
+    async with AsyncSession(sqlite_primary) as session:
+        result = await ExpenseService(session).bulk_create_expenses(rows(), chunk_size=10)
+        assert result["inserted"] == 2
+        assert [error["index"] for error in result["errors"]] == [1]
+        assert [row["category"] for row in result["touched"]] == ["Food", "Rent"]
+        assert await session.scalar(select(func.count()).select_from(Expense)) == 4
+
+
+async def test_json_array_body_is_capped(cache, app, http, monkeypatch):
+    monkeypatch.setattr(settings, "bulk_max_json_bytes", 100)
+    app.dependency_overrides[get_expense_service] = lambda: FailingExpenseService(fail_after=10)
+    rows = [{"date": "2025-01-05", "amount": 10, "category": "Food"}] * 5
+    response = await http.post("/expenses/bulk", json=rows)
+
+    assert response.status_code == 413
+    assert response.json()["detail"]["inserted"] == 0
+
+
+async def test_ndjson_line_is_capped(cache, app, http, monkeypatch):
+    monkeypatch.setattr(settings, "bulk_max_line_bytes", 200)
+    service = FailingExpenseService(fail_after=10)
+    app.dependency_overrides[get_expense_service] = lambda: service
+    rows = [
+        {"date": "2025-01-05", "amount": 10, "category": "Food"},
+        {"date": "2025-01-06", "amount": 11, "category": "Food", "note": "x" * 500},
+    ]
+    response = await http.post(
+        "/expenses/bulk?chunk_size=1",
+        content=ndjson(rows),
+        headers={"content-type": "application/x-ndjson"},
+    )
+
+    assert response.status_code == 413
+    assert response.json()["detail"]["inserted"] == 1
@@ -0,0 +1,102 @@
+"""
+Tag-based invalidation: a write drops only the cached entries that depend on it
+"""
+from app.db.redis_cache import get_expense_key, get_expense_summary_key, get_range_tags
+from app.services.expense_service import ExpenseService
+
+# (start, end, category) of the cached summaries
+SUMMARIES = [
+    ("2025-01-01", "2025-01-31", None),
+    ("2025-01-01", "2025-01-31", "Food"),
+    ("2025-01-01", "2025-01-31", "Travel"),
+    ("2025-02-01", "2025-02-28", None),
+    ("2025-02-01", "2025-02-28", "Food"),
+    ("2025-03-01", "2025-03-31", None),
+    ("2025-03-01", "2025-03-31", "Travel"),
+    ("2024-12-01", "2025-01-31", None),
+]
+
+
+async def read_all(cache, loads):
+    """Read every summary as the summary route does, recording which ones hit the database"""
+    for start, end, category in SUMMARIES:
+        key = get_expense_summary_key(start, end, category)
+
+        async def load(key=key):
+            loads.append(key)
+            return [{"category": category or "Food", "total_amount": 10.0, "count": 1}]
+
+        await cache.get_or_set(key, load, 60, tags=get_range_tags(start, end, category))
+
+
+async def test_write_keeps_unrelated_summaries(cache):
+    loads = []
+    await read_all(cache, loads)
+    assert len(loads) == len(SUMMARIES)
+
+    # A Food expense in January changes
+    expense = {"id": 7, "date": "2025-01-15", "amount": 12.5, "category": "Food", "subcategory": "", "note": ""}
+    await ExpenseService(None).invalidate_cache(7, [expense])
+
+    loads.clear()
+    await read_all(cache, loads)
+    assert sorted(loads) == sorted([
+        get_expense_summary_key("2025-01-01", "2025-01-31"),
+        get_expense_summary_key("2025-01-01", "2025-01-31", "Food"),
+        get_expense_summary_key("2024-12-01", "2025-01-31"),
+    ])
+    hit_ratio = 1 - len(loads) / len(SUMMARIES)
+    assert hit_ratio == 5 / 8
+
+
+async def test_invalidation_reaches_redis_not_just_l1(cache):
+    loads = []
+    await read_all(cache, loads)
+
+    expense = {"date": "2025-02-03", "category": "Food"}
+    await ExpenseService(None).invalidate_cache(touched=[expense])
+
+    # Another worker, with an empty L1, sees the same result in Redis
+    cache._local.clear()
+    assert await cache.get(get_expense_summary_key("2025-02-01", "2025-02-28")) is None
+    assert await cache.get(get_expense_summary_key("2025-02-01", "2025-02-28", "Food")) is None
+    assert await cache.get(get_expense_summary_key("2025-03-01", "2025-03-31")) is not None
+    assert await cache.get(get_expense_summary_key("2025-01-01", "2025-01-31", "Food")) is not None
+
+
+async def test_write_through_refreshes_the_expense_entry(cache):
+    await cache.set(get_expense_key(7), {"id": 7, "amount": 1.0}, 60)
+
+    updated = {"id": 7, "date": "2025-03-02", "amount": 2.0, "category": "Travel", "subcategory": "", "note": ""}
+    await ExpenseService(None).invalidate_cache(7, [updated], write_through=updated)
+
+    cache._local.clear()
+    assert (await cache.get(get_expense_key(7)))["amount"] == 2.0
+    assert cache.stats()["l2"]["hits"] == 1
+
+
+async def test_peers_are_notified_after_the_keys_are_gone(cache, monkeypatch):
+    commands = []
+    pipeline = cache._redis.pipeline
+
+    def recording_pipeline(*args, **kwargs):
+        pipe = pipeline(*args, **kwargs)
+        execute = pipe.execute
+
+        async def record(*execute_args, **execute_kwargs):
+            commands.extend(str(command_args[0]).upper() for command_args, _ in pipe.command_stack)
+            return await execute(*execute_args, **execute_kwargs)
+
+        pipe.execute = record
+        return pipe
+
+    monkeypatch.setattr(cache._redis, "pipeline", recording_pipeline)
+    summary = get_expense_summary_key("2025-01-01", "2025-01-31")
+    await cache.set(summary, [], 60, tags=get_range_tags("2025-01-01", "2025-01-31"))
+    await cache.set(get_expense_key(7), {"id": 7}, 60)
+    commands.clear()
+
+    removed = await cache.invalidate_tags(get_range_tags("2025-01-15", "2025-01-15"), keys=[get_expense_key(7)])
+    assert commands[-3:] == ["UNLINK", "EVAL", "PUBLISH"]
+    assert removed == 2
+    assert await cache.get(summary) is None and await cache.get(get_expense_key(7)) is None
@@ -0,0 +1,148 @@
+"""
+ConversationStore: message deltas, history trimming, thread maintenance on its own
+schema, and where it lives by default
+"""
+import os
+import pytest
+from langchain.agents import create_agent
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.tools import tool
+from app.agents.checkpointer import ConversationStore
+from app.agents.fake_model import FakeExpenseChatModel
+from app.agents.history import HistoryBudget
+from config import BASE_DIR, settings
+
+
+@tool
+def list_expenses(size: int = 20) -> str:
+    """List recent expenses"""
+    return '{"items": [], "next_cursor": null}'
+
+
+@pytest.fixture
+async def store(tmp_path):
+    store = await ConversationStore.open(str(tmp_path / "memory" / "agent_memory.db"))
+    yield store
+    await store.close()
+
+
+@pytest.fixture
+def agent(store):
+    return create_agent(FakeExpenseChatModel(token_delay=0), [list_expenses], checkpointer=store)
+
+
+async def turn(agent, thread_id, text, run_id=None):
+    configurable = {"thread_id": thread_id, **({"run_id": run_id} if run_id else {})}
+    await agent.ainvoke({"messages": [{"role": "user", "content": text}]}, {"configurable": configurable})
+
+
+async def history(agent, thread_id):
+    state = await agent.aget_state({"configurable": {"thread_id": thread_id}})
+    return [message.content for message in state.values.get("messages", [])]
+
+
+async def stored_messages(store, thread_id):
+    async with store.conn.execute("SELECT COUNT(*) FROM thread_messages WHERE thread_id = ?", (thread_id,)) as cur:
+        return (await cur.fetchone())[0]
+
+
+def exchange(text):
+    """One turn: question, tool call, tool result, answer"""
+    call = {"name": "list_expenses", "args": {}, "id": f"call-{text}"}
+    return [
+        HumanMessage(text),
+        AIMessage("", tool_calls=[call]),
+        ToolMessage("[]", tool_call_id=call["id"]),
+        AIMessage(f"answer to {text}"),
+    ]
+
+
+async def test_put_writes_only_new_messages(agent, store):
+    await turn(agent, "a", "show my expenses")
+    first = len(await history(agent, "a"))
+    assert store.messages_written == first == await stored_messages(store, "a")
+
+    await turn(agent, "a", "and again")
+    second = len(await history(agent, "a"))
+    # The second turn's checkpoints reference the first turn's rows instead of rewriting them
+    assert store.messages_written == second == await stored_messages(store, "a")
+
+
+async def test_trimmed_messages_are_deleted(store):
+    budget = HistoryBudget(max_tokens=6, target_tokens=5, token_counter=len)
+    agent = create_agent(FakeExpenseChatModel(token_delay=0), [list_expenses], checkpointer=store, middleware=[budget])
+    for text in ("first", "second", "third"):
+        await turn(agent, "a", text)
+
+    messages = await history(agent, "a")
+    assert budget.trims == 1 and messages[0] == "second"
+    assert await stored_messages(store, "a") == len(messages)
+
+
+def test_trim_drops_whole_older_turns_and_keeps_the_current_one():
+    budget = HistoryBudget(max_tokens=9, target_tokens=6, token_counter=len)
+    messages = exchange("first") + exchange("second") + exchange("third")[:3]
+
+    assert budget.trim(messages[:8]) is None
+    kept = budget.trim(messages)
+    assert [message.content for message in kept if message.type == "human"] == ["third"]
+    assert kept == messages[8:]
+
+    # Room for one earlier turn: it is kept whole, the one before it is not
+    budget = HistoryBudget(max_tokens=9, target_tokens=7, token_counter=len)
+    assert budget.trim(messages) == messages[4:]
+
+
+async def test_gc_deletes_idle_threads(agent, store):
+    await turn(agent, "idle", "show my expenses")
+    await turn(agent, "active", "show my expenses")
+    await store.conn.execute("UPDATE thread_checkpoints SET updated_at = updated_at - 3600 WHERE thread_id = 'idle'")
+    await store.conn.commit()
+
+    assert await store.gc(ttl=600) == 1
+    assert await history(agent, "idle") == []
+    assert await stored_messages(store, "idle") == 0
+    assert await history(agent, "active") != []
+    assert store.stats()["threads_collected"] == 1
+    assert await store.gc(ttl=600) == 0
+
+
+async def test_copied_thread_continues_independently(agent, store):
+    await turn(agent, "a", "show my expenses")
+    await store.acopy_thread("a", "b")
+    assert await history(agent, "b") == await history(agent, "a")
+
+    await turn(agent, "b", "and again")
+    assert len(await history(agent, "b")) == len(await history(agent, "a")) + 4
+    await store.adelete_thread("a")
+    assert await history(agent, "a") == []
+    assert (await history(agent, "b"))[0] == "show my expenses"
+
+
+async def test_prune(agent, store):
+    await turn(agent, "a", "show my expenses")
+    await turn(agent, "b", "show my expenses")
+    before = await history(agent, "a")
+
+    await store.aprune(["a"])
+    assert await history(agent, "a") == before
+    await store.aprune(["a"], strategy="delete")
+    assert await history(agent, "a") == []
+    assert await history(agent, "b") != []
+    with pytest.raises(ValueError):
+        await store.aprune(["b"], strategy="oldest")
+
+
+async def test_delete_for_runs_removes_threads_last_written_by_them(agent, store):
+    await turn(agent, "a", "show my expenses", run_id="run-1")
+    await turn(agent, "b", "show my expenses", run_id="run-2")
+
+    await store.adelete_for_runs(["run-1"])
+    assert await history(agent, "a") == []
+    assert await history(agent, "b") != []
+
+
+def test_default_memory_path_is_absolute():
+    default = type(settings).model_fields["agent_memory_path"].default
+    assert os.path.isabs(default)
+    assert default == str(BASE_DIR / "data" / "agent_memory.db")
@@ -0,0 +1,59 @@
+"""
+Queued log writer: batching, bounded queue and shutdown flush
+"""
+import io
+import logging
+import threading
+import time
+import pytest
+from app.core import logging as app_logging
+from app.core.logging import BatchedLogWriter, setup_logging, shutdown_logging
+
+
+@pytest.fixture
+def restore_logging():
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    yield
+    shutdown_logging()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(level)
+
+
+def test_writer_flushes_a_full_batch_without_waiting(restore_logging):
+    stream = io.StringIO()
+    setup_logging("INFO", json_logs=True, stream=stream, batch_size=5, flush_interval=30)
+    for i in range(5):
+        logging.getLogger("test").info("record %d", i)
+
+    deadline = time.monotonic() + 5
+    while app_logging._writer.written < 5 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert app_logging._writer.written == 5
+    assert len(stream.getvalue().splitlines()) == 5
+
+
+def test_records_beyond_the_queue_are_dropped_and_counted(restore_logging, monkeypatch):
+    release = threading.Event()
+    original_write = BatchedLogWriter._write
+
+    def blocked_write(self, records):
+        release.wait()
+        original_write(self, records)
+
+    monkeypatch.setattr(BatchedLogWriter, "_write", blocked_write)
+    stream = io.StringIO()
+    setup_logging("INFO", json_logs=True, stream=stream, batch_size=1, flush_interval=0, queue_size=3)
+    writer = app_logging._writer
+    for i in range(20):
+        # Never blocks the caller, even with the writer stuck
+        logging.getLogger("test").info("record %d", i)
+    release.set()
+    shutdown_logging()
+
+    assert writer.dropped >= 20 - 4
+    assert writer.written + writer.dropped == 20
+    assert len(stream.getvalue().splitlines()) == writer.written
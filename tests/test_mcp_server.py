@@ -0,0 +1,83 @@
+"""
+MCP tools: read-your-writes per client, with a lagging SQLite replica, and write rate limits
+"""
+import json
+import pytest
+from fastmcp import Client
+from fastmcp.exceptions import ToolError
+from starlette.requests import Request
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db import database
+from app.mcp import server
+from app.models.expense import Expense
+from app.services.rollup_service import RollupService
+from config import settings
+
+
+@pytest.fixture
+async def replicas(cache, sqlite_primary, tmp_path, monkeypatch):
+    """The primary for tool writes and one replica holding only expense 1"""
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlmodel import SQLModel
+
+    replica = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'replica.db'}")
+    async with replica.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    async with AsyncSession(sqlite_primary) as session:
+        expenses = [dict(row._mapping) for row in await session.execute(Expense.__table__.select())]
+    async with replica.begin() as conn:
+        await conn.execute(Expense.__table__.insert(), expenses)
+        await conn.execute(delete(Expense).where(Expense.id == 2))
+
+    async def no_rollup(self, added=(), removed=()):
+        # The rollup upsert is MySQL-only (ON DUPLICATE KEY UPDATE)
+        return 0
+
+    monkeypatch.setattr(RollupService, "apply_changes", no_rollup)
+    monkeypatch.setattr(server, "async_engine", sqlite_primary)
+    monkeypatch.setattr(database.read_router, "primary", sqlite_primary)
+    monkeypatch.setattr(database.read_router, "replicas", [replica])
+    monkeypatch.setattr(database.read_router, "_unhealthy_until", {})
+    yield
+    await replica.dispose()
+
+
+async def listed_amounts(client):
+    result = await client.call_tool("list_expenses", {"size": 10})
+    return sorted(item["amount"] for item in json.loads(result.content[0].text)["items"])
+
+
+async def test_only_the_writing_client_reads_the_primary(replicas):
+    async with Client(server.mcp) as writer, Client(server.mcp) as other:
+        assert await listed_amounts(writer) == [12.5]
+
+        await writer.call_tool("add_expense", {"date": "2025-01-11", "amount": "7.25", "category": "Food"})
+
+        # Another client keeps reading the (lagging) replica, uncached; the writer sees its write
+        assert await listed_amounts(other) == [12.5]
+        assert await listed_amounts(writer) == [7.25, 12.5, 40.0]
+
+
+def http_request(session_id):
+    """A streamable HTTP request from a remote client"""
+    return Request({
+        "type": "http", "method": "POST", "path": "/mcp/", "query_string": b"",
+        "headers": [(b"mcp-session-id", session_id.encode())], "client": ("203.0.113.7", 40000),
+    })
+
+
+async def test_remote_writes_are_rate_limited_per_client(replicas, monkeypatch):
+    monkeypatch.setattr(settings, "rate_limit_routes", {"add_expense": "2/minute"})
+    expense = {"date": "2025-01-11", "amount": "7.25", "category": "Food"}
+    async with Client(server.mcp) as client:
+        monkeypatch.setattr(server, "get_http_request", lambda: http_request("first"))
+        for _ in range(2):
+            await client.call_tool("add_expense", expense)
+        with pytest.raises(ToolError, match="Rate limit exceeded"):
+            await client.call_tool("add_expense", expense)
+        # Reads are not limited
+        await listed_amounts(client)
+
+        monkeypatch.setattr(server, "get_http_request", lambda: http_request("second"))
+        await client.call_tool("add_expense", expense)
@@ -0,0 +1,35 @@
+"""
+The Prometheus endpoint answers scrapers only: a bearer token or an allowed network
+"""
+import httpx
+import pytest
+from fastapi import Depends, FastAPI, Response
+from pydantic import SecretStr
+from app.routes.metrics_router import require_scrape_access
+from config import settings
+
+
+@pytest.fixture
+async def scrape():
+    app = FastAPI()
+
+    @app.get("/metrics", dependencies=[Depends(require_scrape_access)])
+    async def metrics():
+        return Response("up 1\n", media_type="text/plain")
+
+    # ASGITransport connects from 127.0.0.1
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+async def test_loopback_scrapes_by_default(scrape):
+    assert (await scrape.get("/metrics")).status_code == 200
+
+
+async def test_other_clients_need_the_token(scrape, monkeypatch):
+    monkeypatch.setattr(settings, "metrics_allowed_networks", ["10.0.0.0/8"])
+    assert (await scrape.get("/metrics")).status_code == 403
+
+    monkeypatch.setattr(settings, "metrics_token", SecretStr("s3cret"))
+    assert (await scrape.get("/metrics", headers={"authorization": "Bearer wrong"})).status_code == 403
+    assert (await scrape.get("/metrics", headers={"authorization": "Bearer s3cret"})).status_code == 200
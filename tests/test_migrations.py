@@ -0,0 +1,98 @@
+"""
+Columns added to a model after its table shipped, and the online DATE/DECIMAL migration
+
+The migration test needs MySQL (triggers, information_schema): point TEST_MYSQL_URL
+at a scratch database. Its expense table is dropped.
+"""
+import asyncio
+import datetime
+import os
+from decimal import Decimal
+import pytest
+from sqlalchemy import inspect, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from app.db import migrations
+
+MYSQL_URL = os.environ.get("TEST_MYSQL_URL")
+
+
+async def attachment_columns(engine):
+    async with engine.connect() as conn:
+        return await conn.run_sync(
+            lambda sync_conn: {column["name"] for column in inspect(sync_conn).get_columns("expense_attachment")}
+        )
+
+
+async def test_added_columns_are_created_once(tmp_path, monkeypatch):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'old.db'}")
+    async with engine.begin() as conn:
+        # expense_attachment as the first release created it
+        await conn.execute(text(
+            "CREATE TABLE expense_attachment (id INTEGER PRIMARY KEY, expense_id INTEGER NOT NULL, "
+            "object_key VARCHAR(512) NOT NULL, filename VARCHAR(255) NOT NULL, content_type VARCHAR(255) NOT NULL, "
+            "size INTEGER NOT NULL, etag VARCHAR(128) NOT NULL, created_at DATETIME, updated_at DATETIME)"
+        ))
+    monkeypatch.setattr(migrations, "async_engine", engine)
+
+    assert await migrations.add_missing_columns() == [
+        "expense_attachment.checksum", "expense_attachment.thumbnail_key"
+    ]
+    assert {"checksum", "thumbnail_key"} <= await attachment_columns(engine)
+    assert await migrations.add_missing_columns() == []
+    await engine.dispose()
+
+
+@pytest.mark.skipif(not MYSQL_URL, reason="TEST_MYSQL_URL not set")
+async def test_online_migration_keeps_writes_made_during_backfill(monkeypatch):
+    engine = create_async_engine(MYSQL_URL)
+    async with engine.begin() as conn:
+        await conn.execute(text("DROP TABLE IF EXISTS expense"))
+        # expense as the first release created it
+        await conn.execute(text(
+            "CREATE TABLE expense (id INTEGER NOT NULL AUTO_INCREMENT PRIMARY KEY, "
+            "date VARCHAR(255) NOT NULL, amount FLOAT NOT NULL, category VARCHAR(255) NOT NULL, "
+            "subcategory VARCHAR(255) NOT NULL, note VARCHAR(255) NOT NULL, "
+            "created_at DATETIME NULL, updated_at DATETIME NULL, "
+            "INDEX ix_expense_date (date), INDEX ix_expense_amount (amount), INDEX ix_expense_category (category))"
+        ))
+        await conn.execute(text(
+            "INSERT INTO expense (date, amount, category, subcategory, note) VALUES "
+            + ", ".join(f"('2025-01-{day:02d}', {day}.25, 'Food', '', '')" for day in range(1, 21))
+        ))
+    monkeypatch.setattr(migrations, "async_engine", engine)
+
+    async def write_during_backfill():
+        for day in range(21, 26):
+            async with engine.begin() as conn:
+                await conn.execute(text(
+                    f"INSERT INTO expense (date, amount, category, subcategory, note) "
+                    f"VALUES ('2025-02-{day:02d}', {day}.5, 'Travel', '', '')"
+                ))
+                await conn.execute(text(f"UPDATE expense SET amount = 99.75 WHERE id = {day - 20}"))
+            await asyncio.sleep(0.01)
+
+    await migrations.prepare()
+    await asyncio.gather(migrations.backfill(batch_size=2, pause=0.01), write_during_backfill())
+    assert await migrations.verify() == []
+    await migrations.build_indexes()
+    await migrations.swap()
+
+    async with engine.connect() as conn:
+        columns = await migrations._column_definitions(conn, "expense")
+        rows = {row.id: row for row in await conn.execute(text("SELECT id, date, amount FROM expense"))}
+    assert columns["date"][0] == "date" and columns["amount"][0] == "decimal(10,2)"
+    # The old columns were renamed, not converted
+    assert columns["date_old"][0] == "varchar(255)" and columns["amount_old"][0] == "float"
+
+    assert len(rows) == 25
+    assert rows[1].amount == Decimal("99.75") and rows[1].date == datetime.date(2025, 1, 1)
+    assert rows[10].amount == Decimal("10.25")
+    assert rows[25].date == datetime.date(2025, 2, 25) and rows[25].amount == Decimal("25.50")
+
+    await migrations.cleanup()
+    async with engine.connect() as conn:
+        columns = await migrations._column_definitions(conn, "expense")
+    assert "amount_old" not in columns and columns["amount"] == ("decimal(10,2)", False)
+    async with engine.begin() as conn:
+        await conn.execute(text("DROP TABLE expense"))
+    await engine.dispose()
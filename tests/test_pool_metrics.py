@@ -0,0 +1,72 @@
+"""
+Checkout wait measurement and adaptive overflow of InstrumentedAsyncPool
+"""
+import asyncio
+import aiosqlite
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from app.db.pool_metrics import InstrumentedAsyncPool, PoolMetrics, PoolTuner
+
+CONNECT_SECONDS = 0.2
+
+
+@pytest.fixture
+async def engine(tmp_path):
+    """One-connection pool whose connections take CONNECT_SECONDS to open"""
+    async def slow_connect():
+        await asyncio.sleep(CONNECT_SECONDS)
+        return await aiosqlite.connect(tmp_path / "pool.db")
+
+    engine = create_async_engine(
+        "sqlite+aiosqlite://",
+        async_creator=slow_connect,
+        poolclass=InstrumentedAsyncPool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=5,
+    )
+    engine.sync_engine.pool.metrics = PoolMetrics("test")
+    yield engine
+    await engine.dispose()
+
+
+async def test_opening_a_connection_is_not_counted_as_waiting(engine):
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+    metrics = engine.sync_engine.pool.metrics
+    assert metrics.checkouts == 1
+    assert metrics.recent_waits(1)[0] < CONNECT_SECONDS / 4
+
+
+async def test_waiting_for_a_returned_connection_is_counted(engine):
+    hold = 0.15
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+    async def holder():
+        async with engine.connect():
+            await asyncio.sleep(hold)
+
+    async def waiter():
+        await asyncio.sleep(0.01)
+        async with engine.connect():
+            pass
+
+    await asyncio.gather(holder(), waiter())
+    assert max(engine.sync_engine.pool.metrics.recent_waits(2)) >= hold / 2
+
+
+async def test_tuner_raises_overflow_through_the_accessor(engine):
+    pool = engine.sync_engine.pool
+    tuner = PoolTuner([engine], interval=1, wait_target_ms=10, min_overflow=0, max_overflow=4)
+    pool.metrics.record_wait(0.5)
+
+    assert tuner.tune(engine) == 2
+    assert pool.max_overflow == 2
+    assert pool.metrics.snapshot(pool)["max_overflow"] == 2
+
+    # Nothing waited since: shrink back
+    pool.metrics.record_wait(0.0)
+    assert tuner.tune(engine) == 0
@@ -0,0 +1,152 @@
+"""
+Direct-to-S3 uploads: intents, presigned PUTs and parts against an S3 fake, completion
+"""
+import hashlib
+import os
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select
+from app.db.database import get_async_session
+from app.models.expense_attachment import ExpenseAttachment
+from app.repository.aws_repository import MIN_PART_SIZE, get_object_bytes, head_object
+from app.routes.upload_router import router as upload_router
+from config import settings
+
+RECEIPT = b"\x89PNG\r\n\x1a\n" + b"receipt" * 100
+
+
+@pytest.fixture
+async def api(cache, s3, sqlite_primary):
+    """The upload routes on the SQLite primary"""
+    async def session():
+        async with AsyncSession(sqlite_primary) as session:
+            yield session
+
+    app = FastAPI()
+    app.include_router(upload_router)
+    app.dependency_overrides[get_async_session] = session
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+@pytest.fixture
+async def storage():
+    """Plain HTTP client for the presigned S3 URLs, as a browser would use them"""
+    async with httpx.AsyncClient() as client:
+        yield client
+
+
+def checksum_headers(intent):
+    """The presigned PUT's headers; moto records the checksum only next to the SDK's algorithm header
+    (and, unlike S3, never verifies it)"""
+    return {**intent["put_headers"], "x-amz-sdk-checksum-algorithm": "SHA256"}
+
+
+async def attachments(engine):
+    async with AsyncSession(engine) as session:
+        return (await session.execute(select(ExpenseAttachment))).scalars().all()
+
+
+async def test_single_put_upload_is_verified_and_recorded(api, storage, sqlite_primary):
+    sha256 = hashlib.sha256(RECEIPT).hexdigest()
+    intent = (await api.post("/upload_files/intents", json={
+        "expense_id": 1, "filename": "lunch.png", "content_type": "image/png", "size": len(RECEIPT), "sha256": sha256,
+    })).json()
+    assert intent["object_key"].startswith("receipts/1/") and intent["parts"] == []
+
+    put = await storage.put(intent["put_url"], content=RECEIPT, headers=checksum_headers(intent))
+    assert put.status_code == 200
+
+    response = await api.post("/upload_files/complete", json={"intent_id": intent["intent_id"]})
+    assert response.status_code == 200
+    attachment = response.json()
+    assert attachment["checksum"] == sha256
+    assert attachment["size"] == len(RECEIPT) and attachment["duplicate"] is False
+    assert attachment["thumbnail_url"].endswith(f"/attachments/{attachment['id']}/thumbnail")
+    assert [row.object_key for row in await attachments(sqlite_primary)] == [intent["object_key"]]
+
+    # The intent is used up
+    again = await api.post("/upload_files/complete", json={"intent_id": intent["intent_id"]})
+    assert again.status_code == 404
+
+
+async def test_post_form_upload_is_recorded(api, storage):
+    intent = (await api.post("/upload_files/intents", json={
+        "expense_id": 1, "filename": "lunch.png", "content_type": "image/png", "size": len(RECEIPT),
+    })).json()
+
+    post = intent["post"]
+    form = await storage.post(post["url"], data=post["fields"], files={"file": ("lunch.png", RECEIPT, "image/png")})
+    assert form.status_code in (200, 204)
+
+    response = await api.post("/upload_files/complete", json={"intent_id": intent["intent_id"]})
+    assert response.status_code == 200
+    # No checksum S3 verified: recorded, but not a deduplication candidate
+    assert response.json()["checksum"] is None
+    assert response.json()["content_type"] == "image/png"
+
+
+async def test_known_content_is_attached_without_an_upload(api, storage, sqlite_primary):
+    sha256 = hashlib.sha256(RECEIPT).hexdigest()
+    first = (await api.post("/upload_files/intents", json={
+        "expense_id": 1, "filename": "lunch.png", "content_type": "image/png", "size": len(RECEIPT), "sha256": sha256,
+    })).json()
+    await storage.put(first["put_url"], content=RECEIPT, headers=checksum_headers(first))
+    await api.post("/upload_files/complete", json={"intent_id": first["intent_id"]})
+
+    second = (await api.post("/upload_files/intents", json={
+        "expense_id": 2, "filename": "copy.png", "content_type": "image/png", "size": len(RECEIPT), "sha256": sha256,
+    })).json()
+
+    assert second.get("put_url") is None and second["parts"] == []
+    assert second["attachment"]["duplicate"] is True
+    assert second["attachment"]["expense_id"] == 2
+    assert second["object_key"] == first["object_key"]
+    assert [(row.expense_id, row.object_key) for row in await attachments(sqlite_primary)] == [
+        (1, first["object_key"]), (2, first["object_key"])
+    ]
+
+
+async def test_multipart_upload_is_completed_from_the_part_etags(api, storage, monkeypatch):
+    monkeypatch.setattr(settings, "s3_presign_multipart_threshold", MIN_PART_SIZE)
+    monkeypatch.setattr(settings, "s3_part_size", MIN_PART_SIZE)
+    data = os.urandom(MIN_PART_SIZE + 4096)
+    intent = (await api.post("/upload_files/intents", json={
+        "expense_id": 1, "filename": "statement.pdf", "content_type": "application/pdf", "size": len(data),
+    })).json()
+    assert intent["upload_id"] and [part["part_number"] for part in intent["parts"]] == [1, 2]
+
+    parts = []
+    for part in intent["parts"]:
+        start = (part["part_number"] - 1) * intent["part_size"]
+        put = await storage.put(part["url"], content=data[start:start + intent["part_size"]])
+        assert put.status_code == 200
+        parts.append({"part_number": part["part_number"], "etag": put.headers["etag"]})
+
+    missing = await api.post("/upload_files/complete", json={"intent_id": intent["intent_id"]})
+    assert missing.status_code == 400
+
+    response = await api.post("/upload_files/complete", json={"intent_id": intent["intent_id"], "parts": parts})
+    assert response.status_code == 200
+    assert response.json()["size"] == len(data)
+    assert await get_object_bytes(settings.aws_s3_bucket_name, intent["object_key"]) == data
+
+
+async def test_object_larger_than_declared_is_deleted(api, storage, sqlite_primary):
+    intent = (await api.post("/upload_files/intents", json={
+        "expense_id": 1, "filename": "lunch.png", "size": 10,
+    })).json()
+    await storage.put(intent["put_url"], content=RECEIPT, headers=intent["put_headers"])
+
+    response = await api.post("/upload_files/complete", json={"intent_id": intent["intent_id"]})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Uploaded object is larger than declared"
+    assert await head_object(settings.aws_s3_bucket_name, intent["object_key"]) is None
+    assert await attachments(sqlite_primary) == []
+
+
+async def test_intent_for_a_missing_expense_is_not_presigned(api):
+    response = await api.post("/upload_files/intents", json={"expense_id": 99, "filename": "a.png", "size": 10})
+    assert response.status_code == 404
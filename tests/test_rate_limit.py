@@ -0,0 +1,37 @@
+"""
+Rate limit identity behind trusted proxies
+"""
+import pytest
+from starlette.requests import Request
+from app.core.rate_limit import client_address
+from config import settings
+
+
+def request_from(peer, *forwarded):
+    headers = [(b"x-forwarded-for", value.encode()) for value in forwarded]
+    return Request({"type": "http", "headers": headers, "client": (peer, 50000)})
+
+
+@pytest.fixture
+def trusted(monkeypatch):
+    monkeypatch.setattr(settings, "rate_limit_trusted_proxies", ["10.0.0.0/8", "192.0.2.7"])
+
+
+def test_header_is_ignored_without_trusted_proxies(monkeypatch):
+    monkeypatch.setattr(settings, "rate_limit_trusted_proxies", [])
+    assert client_address(request_from("10.1.2.3", "203.0.113.9")) == "10.1.2.3"
+
+
+def test_header_is_ignored_from_an_untrusted_peer(trusted):
+    assert client_address(request_from("198.51.100.4", "203.0.113.9")) == "198.51.100.4"
+
+
+def test_rightmost_untrusted_hop_is_the_client(trusted):
+    # The client prepended a forged hop; the proxies appended the real one
+    request = request_from("10.1.2.3", "1.1.1.1, 203.0.113.9", "192.0.2.7")
+    assert client_address(request) == "203.0.113.9"
+
+
+def test_peer_is_kept_when_every_hop_is_trusted(trusted):
+    assert client_address(request_from("10.1.2.3", "10.9.9.9")) == "10.1.2.3"
+    assert client_address(request_from("10.1.2.3")) == "10.1.2.3"
@@ -0,0 +1,105 @@
+"""
+Replica routing, failover and read-your-writes, with two SQLite files standing
+in for the primary and a lagging replica
+"""
+import datetime
+import time
+from decimal import Decimal
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlmodel import SQLModel
+from app.db import database
+from app.db.database import client_wrote_recently, mark_client_write, read_session
+from app.db.redis_cache import get_expense_summary_key, get_recent_write_key
+from app.models.expense import Expense
+from app.models.expense_attachment import ExpenseAttachment  # noqa: F401  (created with the other tables)
+from app.services.expense_service import ExpenseService
+from config import settings
+
+SUMMARY = "/expenses/summary/?start_date=2025-01-01&end_date=2025-01-31"
+
+
+async def sqlite_engine(path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    return engine
+
+
+async def add_expense(engine, amount):
+    async with AsyncSession(engine) as session:
+        session.add(Expense(date=datetime.date(2025, 1, 10), amount=Decimal(amount), category="Food"))
+        await session.commit()
+
+
+@pytest.fixture
+async def engines(tmp_path, monkeypatch):
+    """(primary, replica) routed by the global read_router; the replica starts in sync"""
+    primary = await sqlite_engine(tmp_path / "primary.db")
+    replica = await sqlite_engine(tmp_path / "replica.db")
+    for engine in (primary, replica):
+        await add_expense(engine, "10.00")
+    monkeypatch.setattr(database.read_router, "primary", primary)
+    monkeypatch.setattr(database.read_router, "replicas", [replica])
+    monkeypatch.setattr(database.read_router, "_unhealthy_until", {})
+    yield primary, replica
+    for engine in (primary, replica):
+        await engine.dispose()
+
+
+async def test_reads_go_to_the_replica_unless_pinned(engines):
+    primary, replica = engines
+    async with read_session() as session:
+        assert session.bind is replica
+    async with read_session(use_primary=True) as session:
+        assert session.bind is primary
+
+
+async def test_unreachable_replica_fails_over_to_the_primary(engines, tmp_path, monkeypatch):
+    primary, _ = engines
+    dead = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'missing' / 'replica.db'}")
+    monkeypatch.setattr(database.read_router, "replicas", [dead])
+
+    async with read_session() as session:
+        assert session.bind is primary
+    assert database.read_router.healthy_replicas() == []
+
+
+async def test_writer_reads_its_write_while_the_replica_lags(cache, engines, http):
+    primary, _ = engines
+    # Written to the primary only: the replica hasn't replayed it yet
+    await add_expense(primary, "5.00")
+    await ExpenseService(None).invalidate_cache(touched=[{"date": "2025-01-10", "category": "Food"}])
+
+    # Another client reads the lagging replica first: served, but not cached
+    response = await http.get(SUMMARY)
+    assert response.json()[0]["total_amount"] == 10.0
+    assert cache.stats()["single_flight"]["replica_skips"] == 1
+    assert await cache.get(get_expense_summary_key("2025-01-01", "2025-01-31")) is None
+
+    # The writer carries the cookie the write set and reads the primary
+    pinned_until = str(int(time.time()) + settings.read_your_writes_seconds)
+    http.cookies.set(settings.read_your_writes_cookie, pinned_until)
+    response = await http.get(SUMMARY)
+    assert response.json()[0]["total_amount"] == 15.0
+
+    # ...and what it loaded is what everyone is served from the cache
+    http.cookies.clear()
+    response = await http.get(SUMMARY)
+    assert response.json()[0]["total_amount"] == 15.0
+
+
+async def test_replica_reads_fill_the_cache_once_the_window_has_passed(cache, engines, http):
+    await ExpenseService(None).invalidate_cache(touched=[{"date": "2025-01-10", "category": "Food"}])
+    await cache.client.delete(get_recent_write_key())
+
+    await http.get(SUMMARY)
+    assert cache.stats()["single_flight"]["replica_skips"] == 0
+    assert await cache.get(get_expense_summary_key("2025-01-01", "2025-01-31")) is not None
+
+
+async def test_clients_without_the_cookie_are_pinned_by_key(cache):
+    await mark_client_write("mcp:session-a")
+    assert await client_wrote_recently("mcp:session-a")
+    assert not await client_wrote_recently("mcp:session-b")
+    assert 0 < await cache.client.ttl("read_your_writes:mcp:session-a") <= settings.read_your_writes_seconds
@@ -0,0 +1,66 @@
+"""
+L1 tier and single-flight loads of RedisCache
+"""
+import asyncio
+import pytest
+
+
+async def test_l1_hits_do_not_share_mutable_values(cache):
+    await cache.set("expenses:summary:a", [{"category": "Food", "total_amount": 10.0}], 60)
+
+    first = await cache.get("expenses:summary:a")
+    first[0]["total_amount"] = 0
+    first.append({"category": "Travel"})
+
+    assert await cache.get("expenses:summary:a") == [{"category": "Food", "total_amount": 10.0}]
+    assert cache.stats()["l1"]["hits"] == 2
+
+
+async def test_l1_keeps_rendered_pages_as_they_are(cache):
+    page = '{"items":[],"next_cursor":null}'
+    await cache.set("expenses:cursor:all:v1:first:s50:t0", page, 60)
+    assert await cache.get("expenses:cursor:all:v1:first:s50:t0") is page
+
+
+async def test_concurrent_misses_share_one_load(cache):
+    loads = 0
+    release = asyncio.Event()
+
+    async def load():
+        nonlocal loads
+        loads += 1
+        await release.wait()
+        return {"id": 1, "attachments": []}
+
+    callers = [asyncio.create_task(cache.get_or_set("expense:1", load, 60)) for _ in range(10)]
+    await asyncio.sleep(0)
+    release.set()
+    values = await asyncio.gather(*callers)
+
+    assert loads == 1
+    assert cache.stats()["single_flight"] == {"loads": 1, "coalesced": 9, "replica_skips": 0}
+    assert all(value == {"id": 1, "attachments": []} for value in values)
+    # Every caller owns its value
+    assert len({id(value) for value in values}) == len(values)
+
+
+async def test_cancelled_caller_does_not_cancel_the_shared_load(cache):
+    release = asyncio.Event()
+
+    async def load():
+        await release.wait()
+        return ["loaded"]
+
+    starter = asyncio.create_task(cache.get_or_set("expense:2", load, 60))
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(cache.get_or_set("expense:2", load, 60))
+    await asyncio.sleep(0)
+
+    starter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await starter
+    release.set()
+
+    assert await waiter == ["loaded"]
+    cache._local.clear()
+    assert await cache.get("expense:2") == ["loaded"]
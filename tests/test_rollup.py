@@ -0,0 +1,101 @@
+"""
+expense_daily_rollup: deltas from writes, rebuild/check, and summaries answered from it
+
+The write tests need MySQL (deltas are applied with INSERT ... ON DUPLICATE KEY UPDATE):
+point TEST_MYSQL_URL at a scratch database. Its tables are dropped.
+"""
+import os
+from decimal import Decimal
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlmodel import SQLModel, select
+from app.models.expense_rollup import ExpenseDailyRollup
+from app.services.expense_service import ExpenseService
+from app.services.rollup_service import rollup_deltas
+from config import settings
+
+MYSQL_URL = os.environ.get("TEST_MYSQL_URL")
+mysql = pytest.mark.skipif(not MYSQL_URL, reason="set TEST_MYSQL_URL to a scratch MySQL database")
+
+
+def test_deltas_net_out_per_bucket():
+    old = {"date": "2025-01-10", "amount": 12.5, "category": "Food", "subcategory": ""}
+    moved = {**old, "date": "2025-01-11"}
+    assert rollup_deltas(added=[moved], removed=[old]) == {
+        ("2025-01-11", "Food", ""): [Decimal("12.5"), 1],
+        ("2025-01-10", "Food", ""): [Decimal("-12.5"), -1],
+    }
+    # Only the note changed
+    assert rollup_deltas(added=[{**old, "note": "x"}], removed=[old]) == {}
+
+
+@pytest.fixture
+async def service():
+    engine = create_async_engine(MYSQL_URL)
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.drop_all)
+        await conn.run_sync(SQLModel.metadata.create_all)
+    async with AsyncSession(engine) as session:
+        yield ExpenseService(session)
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.drop_all)
+    await engine.dispose()
+
+
+async def buckets(service):
+    rows = (await service.db.execute(select(ExpenseDailyRollup))).scalars()
+    return {(str(row.date), row.category): (row.total, row.count) for row in rows}
+
+
+async def add_expenses(service):
+    food = await service.create_expense("2025-01-10", 12.50, "Food")
+    await service.create_expense("2025-01-10", 40.00, "Food")
+    await service.create_expense("2025-01-11", 900.00, "Rent")
+    return food["id"]
+
+
+@mysql
+async def test_writes_apply_their_deltas(service):
+    food_id = await add_expenses(service)
+    assert await buckets(service) == {
+        ("2025-01-10", "Food"): (Decimal("52.50"), 2),
+        ("2025-01-11", "Rent"): (Decimal("900.00"), 1),
+    }
+
+    await service.update_expense(food_id, "2025-01-11", 15.25, "Food")
+    assert await buckets(service) == {
+        ("2025-01-10", "Food"): (Decimal("40.00"), 1),
+        ("2025-01-11", "Food"): (Decimal("15.25"), 1),
+        ("2025-01-11", "Rent"): (Decimal("900.00"), 1),
+    }
+
+    await service.delete_expense(food_id)
+    # The emptied bucket stays with a zero count
+    assert (await buckets(service))[("2025-01-11", "Food")] == (Decimal("0.00"), 0)
+    assert await service.rollup.check() == []
+
+
+@mysql
+async def test_rebuild_matches_the_expense_table(service):
+    await add_expenses(service)
+    await service.db.execute(ExpenseDailyRollup.__table__.delete())
+    await service.db.commit()
+    assert len(await service.rollup.check()) == 2
+
+    assert await service.rollup.rebuild() == 2
+    assert await service.rollup.check() == []
+
+
+@mysql
+@pytest.mark.parametrize("group_by", [None, ["subcategory"], ["day"], ["month"]])
+async def test_summary_is_the_same_with_and_without_the_rollup(service, monkeypatch, group_by):
+    food_id = await add_expenses(service)
+    await service.update_expense(food_id, "2025-01-12", 20.00, "Food")
+    await service.create_expense("2025-02-01", 5.00, "Food", "Snacks")
+
+    summaries = {}
+    for use_rollup in (False, True):
+        monkeypatch.setattr(settings, "summary_use_rollup", use_rollup)
+        summaries[use_rollup] = await service.summarize_expenses("2025-01-01", "2025-02-28", group_by=group_by)
+    assert summaries[True] == summaries[False]
+    assert summaries[False]
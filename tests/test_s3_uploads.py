@@ -0,0 +1,139 @@
+"""
+Streaming uploads against an S3 fake: multipart parts, limits, deduplication and the upload routes
+"""
+import hashlib
+import os
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db import database
+from app.db.database import get_async_session
+from app.repository.aws_repository import MIN_PART_SIZE, get_object_bytes, head_object, stream_upload_to_s3
+from app.routes.upload_router import router as upload_router
+from config import settings
+
+
+async def chunked(data: bytes, size: int = 64 * 1024):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+@pytest.fixture
+async def upload_http(cache, s3, sqlite_primary, monkeypatch):
+    async def session():
+        async with AsyncSession(sqlite_primary) as session:
+            yield session
+
+    # Upload routes open their primary session only when attaching
+    monkeypatch.setattr(database, "async_engine", sqlite_primary)
+    app = FastAPI()
+    app.include_router(upload_router)
+    app.dependency_overrides[get_async_session] = session
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+async def test_large_stream_is_uploaded_in_parts(s3):
+    data = os.urandom(2 * MIN_PART_SIZE + 12345)
+    details = await stream_upload_to_s3(
+        chunked(data), settings.aws_s3_bucket_name, "receipts/large.bin", part_size=MIN_PART_SIZE, concurrency=2
+    )
+
+    assert details["parts"] == 3
+    assert details["size"] == len(data)
+    assert details["sha256"] == hashlib.sha256(data).hexdigest()
+    assert (await head_object(settings.aws_s3_bucket_name, "receipts/large.bin"))["size"] == len(data)
+    assert await get_object_bytes(settings.aws_s3_bucket_name, "receipts/large.bin") == data
+
+
+async def test_small_stream_is_a_single_put(s3):
+    details = await stream_upload_to_s3(chunked(b"receipt"), settings.aws_s3_bucket_name, "receipts/small.txt")
+
+    assert details["parts"] == 1
+    assert await get_object_bytes(settings.aws_s3_bucket_name, "receipts/small.txt") == b"receipt"
+
+
+async def test_oversized_stream_aborts_its_multipart_upload(s3):
+    data = os.urandom(MIN_PART_SIZE + 1024)
+    with pytest.raises(ValueError):
+        await stream_upload_to_s3(
+            chunked(data), settings.aws_s3_bucket_name, "receipts/huge.bin",
+            part_size=MIN_PART_SIZE, max_bytes=MIN_PART_SIZE + 512
+        )
+
+    uploads = await s3.list_multipart_uploads(Bucket=settings.aws_s3_bucket_name)
+    assert uploads.get("Uploads", []) == []
+    assert await head_object(settings.aws_s3_bucket_name, "receipts/huge.bin") is None
+
+
+async def test_stream_route_uploads_a_large_body(upload_http, monkeypatch):
+    monkeypatch.setattr(settings, "s3_part_size", MIN_PART_SIZE)
+    data = os.urandom(MIN_PART_SIZE + 4096)
+    response = await upload_http.post(
+        "/upload_files/stream", params={"filename": "scan.pdf"}, content=data,
+        headers={"content-type": "application/pdf"}
+    )
+
+    assert response.status_code == 200
+    s3_object = response.json()["s3_object"]
+    assert s3_object["parts"] == 2 and s3_object["size"] == len(data)
+    assert await get_object_bytes(settings.aws_s3_bucket_name, s3_object["key"]) == data
+
+
+@pytest.mark.parametrize("content_length", ["abc", "-1", "12.5"])
+async def test_stream_route_rejects_a_malformed_content_length(upload_http, content_length):
+    response = await upload_http.post(
+        "/upload_files/stream", params={"filename": "scan.pdf"}, content=b"x",
+        headers={"content-length": content_length}
+    )
+    assert response.status_code == 400
+
+
+async def test_stream_route_rejects_a_declared_size_over_the_limit(upload_http, monkeypatch):
+    monkeypatch.setattr(settings, "s3_upload_max_bytes", 10)
+    response = await upload_http.post(
+        "/upload_files/stream", params={"filename": "scan.pdf"}, content=b"x" * 11
+    )
+    assert response.status_code == 413
+
+
+async def test_only_attached_uploads_pin_reads_to_the_primary(upload_http):
+    plain = await upload_http.post("/upload_files/stream", params={"filename": "a.txt"}, content=b"a")
+    attached = await upload_http.post(
+        "/upload_files/stream", params={"filename": "b.txt", "expense_id": 1}, content=b"b"
+    )
+
+    assert plain.status_code == attached.status_code == 200
+    assert settings.read_your_writes_cookie not in plain.cookies
+    assert settings.read_your_writes_cookie in attached.cookies
+
+
+async def test_duplicate_upload_points_at_the_stored_object(upload_http, s3):
+    first = (await upload_http.post(
+        "/upload_files/stream", params={"filename": "lunch.png", "expense_id": 1}, content=b"receipt",
+    )).json()
+    second = (await upload_http.post(
+        "/upload_files/stream", params={"filename": "copy.png", "expense_id": 2}, content=b"receipt",
+    )).json()
+
+    stored = first["attachment"]["object_key"]
+    assert second["attachment"]["duplicate"] is True
+    assert second["attachment"]["object_key"] == stored
+    # The response names the object that is kept, not the upload that was deleted
+    assert second["s3_object"]["key"] == stored
+    assert second["s3_object"]["url"] == first["s3_object"]["url"]
+    listed = await s3.list_objects_v2(Bucket=settings.aws_s3_bucket_name)
+    assert [item["Key"] for item in listed["Contents"]] == [stored]
+
+
+async def test_duplicate_form_upload_points_at_the_stored_object(upload_http):
+    first = (await upload_http.post(
+        "/upload_files", params={"expense_id": 1}, files={"file": ("lunch.png", b"receipt", "image/png")},
+    )).json()
+    second = (await upload_http.post(
+        "/upload_files", params={"expense_id": 2}, files={"file": ("copy.png", b"receipt", "image/png")},
+    )).json()
+
+    assert second["attachment"]["duplicate"] is True
+    assert second["s3_object"] == first["s3_object"] == first["attachment"]["url"]
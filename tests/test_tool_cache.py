@@ -0,0 +1,53 @@
+"""
+Agent tool result cache: results are shared until a write, but never filled while a write is recent
+"""
+from langchain_core.tools import StructuredTool
+from app.agents.tool_cache import ToolResultCache
+from app.db.redis_cache import get_global_version_key, get_recent_write_key
+
+
+def counting_tool(calls):
+    async def list_expenses(category: str = "") -> tuple:
+        calls.append(category)
+        return f"{len(calls)} page(s) read", None
+
+    return StructuredTool.from_function(
+        coroutine=list_expenses,
+        name="list_expenses",
+        description="List expenses",
+        response_format="content_and_artifact",
+        metadata={"readOnlyHint": True},
+    )
+
+
+async def test_read_results_are_cached_until_a_write(cache):
+    calls = []
+    [tool] = ToolResultCache(ttl=60).wrap([counting_tool(calls)])
+
+    assert await tool.ainvoke({"category": "Food"}) == "1 page(s) read"
+    assert await tool.ainvoke({"category": " Food "}) == "1 page(s) read"
+    assert len(calls) == 1
+
+    await cache.invalidate_tags([], versions=[get_global_version_key()])
+    assert await tool.ainvoke({"category": "Food"}) == "2 page(s) read"
+
+
+async def test_results_are_not_cached_while_a_write_is_recent(cache):
+    calls = []
+    tool_cache = ToolResultCache(ttl=60)
+    [tool] = tool_cache.wrap([counting_tool(calls)])
+
+    # The write lands on the primary; the tool's server may still read a lagging replica
+    await cache.invalidate_tags([], versions=[get_global_version_key()], recent_write_ttl=5)
+    assert await cache.exists(get_recent_write_key())
+
+    await tool.ainvoke({"category": "Food"})
+    await tool.ainvoke({"category": "Food"})
+    assert len(calls) == 2
+    assert cache._stats["replica_skips"] == 2
+
+    await cache._redis.delete(get_recent_write_key())
+    await tool.ainvoke({"category": "Food"})
+    await tool.ainvoke({"category": "Food"})
+    assert len(calls) == 3
+    assert tool_cache.stats()["list_expenses"]["executed"] == 3
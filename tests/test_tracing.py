@@ -0,0 +1,77 @@
+"""
+Trace export off the event loop and exposure of recorded spans
+"""
+import json
+import threading
+import httpx
+from fastapi import FastAPI
+from app.core import tracing
+from app.core.tracing import FileExporter, InMemoryExporter, Span, redact_sql
+from app.routes.metrics_router import router as metrics_router
+from config import settings
+
+
+def finished_span(name="GET /expenses/"):
+    span = Span("0" * 31 + "1", None, name, {})
+    span.end_ns = span.start_ns + 1000
+    return span
+
+
+def test_file_exporter_writes_on_its_own_thread(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    exporter = FileExporter(str(path))
+    exporter.export([finished_span(), finished_span("db.query")])
+    exporter.stop()
+
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [line["name"] for line in lines] == ["GET /expenses/", "db.query"]
+    assert exporter.exported == 1 and exporter.dropped == 0
+
+
+def test_file_exporter_drops_traces_when_its_queue_is_full(tmp_path, monkeypatch):
+    release = threading.Event()
+    original_write = FileExporter._write
+
+    def blocked_write(self, traces):
+        release.wait()
+        original_write(self, traces)
+
+    monkeypatch.setattr(FileExporter, "_write", blocked_write)
+    exporter = FileExporter(str(tmp_path / "traces.jsonl"), queue_size=2, batch_size=1)
+    for _ in range(10):
+        # Never blocks, whatever the writer is doing
+        exporter.export([finished_span()])
+    release.set()
+    exporter.stop()
+
+    assert exporter.dropped >= 10 - 3
+    assert exporter.exported + exporter.dropped == 10
+
+
+def test_sql_literals_are_redacted():
+    statement = (
+        "SELECT * FROM expense WHERE category = 'Rent' AND note = 'it''s 5' "
+        "AND amount > 12.50 AND id = %s LIMIT 51"
+    )
+    assert redact_sql(statement) == (
+        "SELECT * FROM expense WHERE category = ? AND note = ? "
+        "AND amount > ? AND id = %s LIMIT ?"
+    )
+    assert redact_sql("ALTER TABLE expense_attachment ADD INDEX ix_a1 (expense_id)") == (
+        "ALTER TABLE expense_attachment ADD INDEX ix_a1 (expense_id)"
+    )
+
+
+async def test_traces_endpoint_is_off_unless_enabled(monkeypatch):
+    memory = InMemoryExporter()
+    memory.export([finished_span()])
+    monkeypatch.setattr(tracing, "exporter", memory)
+    app = FastAPI()
+    app.include_router(metrics_router)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as http:
+        assert (await http.get("/metrics/traces")).status_code == 404
+        monkeypatch.setattr(settings, "tracing_traces_endpoint", True)
+        response = await http.get("/metrics/traces")
+    assert response.status_code == 200
+    assert response.json()[0]["name"] == "GET /expenses/"